@@ -3,6 +3,13 @@ ASGI config for echopulse project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through this module switches the events, event detail, album
+catalog and landing pages to their native async views
+(``ECHOPULSE_ASYNC_VIEWS``), so one process can hold many slow clients
+without tying up a thread each. Run it with any ASGI server, e.g.::
+
+    uvicorn echopulse.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -12,5 +19,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "echopulse.settings")
+os.environ.setdefault("ECHOPULSE_ASYNC_VIEWS", "1")
 
 application = get_asgi_application()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
+import dj_database_url
 import django_heroku
 import os
 
@@ -44,12 +45,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "website.instrumentation.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "website.routers.ReplicaPinningMiddleware",
+    "website.middleware.WhiteNoiseMiddleware",
+    "website.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "website.sessions.SessionActivityMiddleware",
+    "website.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -58,7 +64,7 @@ ROOT_URLCONF = "echopulse.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "website.instrumentation.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / 'templates'],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -85,6 +91,50 @@ DATABASES = {
     }
 }
 
+# SQLite production profile (see website/sqlite.py): WAL, tuned pragmas,
+# persistent connections and periodic PRAGMA optimize / checkpoints.
+# Enable with ECHOPULSE_SQLITE_PRODUCTION=1 on single-server deployments.
+
+ECHOPULSE_SQLITE = {
+    "PRODUCTION": os.environ.get("ECHOPULSE_SQLITE_PRODUCTION") == "1",
+    "PRAGMAS": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+    "MAINTENANCE_INTERVAL": 600,
+}
+
+if ECHOPULSE_SQLITE["PRODUCTION"]:
+    DATABASES["default"].update({
+        "CONN_MAX_AGE": None,
+        "CONN_HEALTH_CHECKS": True,
+        # The driver's own lock wait, in seconds, matching busy_timeout.
+        "OPTIONS": {"timeout": 5},
+    })
+
+# Read replicas for catalog reads (see website/routers.py), as a
+# comma-separated list of database URLs, e.g.
+# ECHOPULSE_REPLICA_URLS=postgres://replica1/echopulse,postgres://replica2/echopulse
+# Under tests the replicas mirror the default database.
+
+ECHOPULSE_REPLICAS = {
+    "ALIASES": [],
+    "MODELS": ["website.Event", "website.Album"],
+    "PIN_SECONDS": 5,
+    "RETRY_SECONDS": 30,
+}
+
+for index, url in enumerate(filter(None, os.environ.get("ECHOPULSE_REPLICA_URLS", "").split(","))):
+    alias = f"replica_{index}"
+    DATABASES[alias] = {**dj_database_url.parse(url.strip(), conn_max_age=600, conn_health_checks=True), "TEST": {"MIRROR": "default"}}
+    ECHOPULSE_REPLICAS["ALIASES"].append(alias)
+
+DATABASE_ROUTERS = ["website.routers.PrimaryReplicaRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -124,6 +174,216 @@ LOGIN_REDIRECT_URL = '/home/'  # or the correct path to your authenticated home
 
 
 
+# Page cache for anonymous public pages (see website/cache.py).
+# Set ECHOPULSE_PAGE_CACHE_ALIAS to a shared cache in CACHES (e.g. Redis)
+# when running more than one worker process.
+
+ECHOPULSE_PAGE_CACHE = {
+    "MAX_ENTRIES": 512,
+    "TIMEOUT": 300,
+    "SHARED_ALIAS": os.environ.get("ECHOPULSE_PAGE_CACHE_ALIAS"),
+}
+
+
+# Cached sessions and user lookups (see website/sessions.py). Without a
+# shared cache, entries are per process and kept for LOCAL_TIMEOUT only.
+
+SESSION_ENGINE = "website.sessions"
+
+AUTHENTICATION_BACKENDS = ["website.sessions.CachedModelBackend"]
+
+ECHOPULSE_SESSIONS = {
+    "SHARED_ALIAS": os.environ.get("ECHOPULSE_PAGE_CACHE_ALIAS"),
+    "TIMEOUT": 300,
+    "LOCAL_TIMEOUT": 30,
+    "WRITE_BEHIND_KEYS": ["last_activity"],
+    "WRITE_BEHIND_SECONDS": 300,
+    "ACTIVITY_INTERVAL": 60,
+}
+
+
+# Login and registration throttling (see website/throttling.py). Behind a
+# proxy that appends the client address to X-Forwarded-For (e.g. Heroku),
+# set ECHOPULSE_CLIENT_IP_HEADER=HTTP_X_FORWARDED_FOR.
+
+ECHOPULSE_THROTTLING = {
+    "ENABLED": True,
+    "SHARED_ALIAS": os.environ.get("ECHOPULSE_PAGE_CACHE_ALIAS"),
+    "RATES": {
+        "ip": {"capacity": 20, "per_minute": 10},
+        "username": {"capacity": 5, "per_minute": 1},
+    },
+    "MAX_DELAY": 0.5,
+    "CLIENT_IP_HEADER": os.environ.get("ECHOPULSE_CLIENT_IP_HEADER"),
+}
+
+
+# Per-object cache for the event and album detail pages, including
+# missing IDs (see website/objects.py). Shared through the page cache's
+# SHARED_ALIAS when one is set.
+
+ECHOPULSE_OBJECT_CACHE = {
+    "TIMEOUT": 300,
+    "MISS_TIMEOUT": 60,
+    "MAX_ENTRIES": 4096,
+    "MAX_MISSES": 4096,
+}
+
+
+# Pre-rendered snapshots of the public pages, served by WhiteNoise to
+# anonymous visitors (see website/snapshots.py). Build them with
+# `manage.py render_snapshots`.
+
+ECHOPULSE_SNAPSHOTS = {
+    "ENABLED": os.environ.get("ECHOPULSE_SNAPSHOTS") == "1",
+    "DIRECTORY": os.environ.get("ECHOPULSE_SNAPSHOT_DIR", str(BASE_DIR / "snapshots")),
+    "PAGES": {"landing": 3600, "artists": 3600, "album_list": 300, "events": 60},
+    "DEBOUNCE": 2.0,
+}
+
+
+# "Fans also liked" album recommendations (see website/recommendations.py),
+# precomputed by `manage.py build_recommendations`.
+
+ECHOPULSE_RECOMMENDATIONS = {
+    "TOP_K": 10,
+    "MIN_TOGETHER": 2,
+    "MAX_USER_FAVORITES": 500,
+    "USER_LIMIT": 10,
+}
+
+
+# "Trending now" rankings on the home page (see website/trending.py),
+# refreshed by `manage.py refresh_trending` from cron. Each window counts
+# activity within SECONDS (None: all time), halving its weight every
+# HALF_LIFE seconds (None: no decay).
+
+ECHOPULSE_TRENDING = {
+    "WINDOWS": {
+        "24h": {"SECONDS": 24 * 3600, "HALF_LIFE": 6 * 3600},
+        "7d": {"SECONDS": 7 * 24 * 3600, "HALF_LIFE": 2 * 24 * 3600},
+        "all": {"SECONDS": None, "HALF_LIFE": None},
+    },
+    "WEIGHTS": {"favorite": 1.0, "vote": 1.0, "event_view": 0.1},
+    "HOME_WINDOW": os.environ.get("ECHOPULSE_TRENDING_WINDOW", "7d"),
+    "HOME_LIMIT": 5,
+}
+
+
+# Fan voting write buffer (see website/voting.py).
+
+ECHOPULSE_VOTING = {
+    "FLUSH_INTERVAL": 1.0,
+    "MAX_PENDING": 10000,
+    "BATCH_SIZE": 1000,
+    "MARKER_TIMEOUT": 300,
+}
+
+
+# Outgoing mail. Point ECHOPULSE_EMAIL_HOST/PORT at a local SMTP stand-in
+# (e.g. `python -m aiosmtpd -n -l localhost:1025`) to try deliveries.
+
+EMAIL_HOST = os.environ.get("ECHOPULSE_EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.environ.get("ECHOPULSE_EMAIL_PORT", "25"))
+EMAIL_HOST_USER = os.environ.get("ECHOPULSE_EMAIL_USER", "")
+EMAIL_HOST_PASSWORD = os.environ.get("ECHOPULSE_EMAIL_PASSWORD", "")
+EMAIL_USE_TLS = os.environ.get("ECHOPULSE_EMAIL_TLS") == "1"
+EMAIL_TIMEOUT = 30
+DEFAULT_FROM_EMAIL = os.environ.get("ECHOPULSE_FROM_EMAIL", "EchoPulse <newsletter@localhost>")
+
+
+# Newsletter delivery (see website/newsletter.py): batches of BATCH_SIZE
+# subscribers, at most RATE messages per second across all workers.
+
+ECHOPULSE_NEWSLETTER = {
+    "BATCH_SIZE": 100,
+    "RATE": float(os.environ.get("ECHOPULSE_NEWSLETTER_RATE", "10")),
+    "MAX_RETRIES": 3,
+    "RETRY_DELAY": 5.0,
+    "SITE_URL": os.environ.get("ECHOPULSE_SITE_URL", "http://localhost:8000"),
+}
+
+
+# Server-sent events feed of event changes and vote tallies (see
+# website/live.py), served under ASGI only. With more than one worker
+# process, set ECHOPULSE_LIVE_BACKEND=website.live.CacheBackend and a
+# shared ECHOPULSE_PAGE_CACHE_ALIAS so that one process polls for all.
+
+ECHOPULSE_LIVE = {
+    "POLL_INTERVAL": 1.0,
+    "HEARTBEAT": 15.0,
+    "MAX_AGE": 300.0,
+    "MAX_CLIENTS": 10000,
+    "BACKEND": os.environ.get("ECHOPULSE_LIVE_BACKEND", "website.live.LocalBackend"),
+}
+
+
+# Nearby-event lookups (see website/venues.py): the default and largest
+# search radius in kilometres, and how many events are returned.
+
+ECHOPULSE_VENUES = {
+    "NEARBY_KM": 50.0,
+    "MAX_NEARBY_KM": 500.0,
+    "NEARBY_LIMIT": 20,
+}
+
+
+# Serve the read-heavy pages from native async views (see
+# website/async_views.py). echopulse/asgi.py turns this on.
+
+ECHOPULSE_ASYNC_VIEWS = os.environ.get("ECHOPULSE_ASYNC_VIEWS") == "1"
+
+
+# Request instrumentation (see website/instrumentation.py). Budgets are
+# keyed by URL name; requests over budget are logged and counted, and
+# website/tests.py fails if a request exceeds its query budget. The home
+# page is measured logged in: session and user (on a session cache miss),
+# recommendations, and the album and event trending rankings.
+# Metrics are served at /metrics/ to staff or to ECHOPULSE_METRICS_TOKEN.
+
+ECHOPULSE_INSTRUMENTATION = {
+    "ENABLED": True,
+    "SAMPLE_RATE": float(os.environ.get("ECHOPULSE_SAMPLE_RATE", "1.0")),
+    "SERVER_TIMING": True,
+    "DUPLICATE_THRESHOLD": 3,
+    "BUDGETS": {
+        "landing": {"queries": 2, "ms": 100},
+        "home_authenticated": {"queries": 5},
+        "login": {"queries": 2},
+        "register": {"queries": 2},
+        "subscribe": {"queries": 3},
+        "unsubscribe": {"queries": 1},
+        "artists": {"queries": 1},
+        "events": {"queries": 4, "ms": 200},
+        "event_detail": {"queries": 1, "ms": 150},
+        "album_list": {"queries": 4, "ms": 200},
+        "album_detail": {"queries": 2, "ms": 150},
+        "search": {"queries": 4, "ms": 250},
+        "vote_tallies": {"queries": 1},
+        "api_event_list": {"queries": 2},
+        "api_event_export": {"queries": 2},
+        "api_event_nearby": {"queries": 3},
+        "api_album_list": {"queries": 2},
+        "api_album_export": {"queries": 2},
+        "api_venue_list": {"queries": 2},
+    },
+    "METRICS_TOKEN": os.environ.get("ECHOPULSE_METRICS_TOKEN"),
+}
+
+
+# On-demand request profiling (see website/profiling.py). Captures are
+# written to DIRECTORY; inspect them with `manage.py profiles`.
+
+ECHOPULSE_PROFILING = {
+    "ENABLED": os.environ.get("ECHOPULSE_PROFILING") == "1",
+    "DIRECTORY": os.environ.get("ECHOPULSE_PROFILE_DIR", "profiles"),
+    "PROFILER": "cprofile",
+    "SAMPLE_EVERY": int(os.environ.get("ECHOPULSE_PROFILE_EVERY", "0")),
+    "INTERVAL": 0.005,
+    "MAX_CAPTURES": 200,
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
@@ -137,4 +397,8 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-django_heroku.settings(locals())
+# WhiteNoise is already in MIDDLEWARE, as the ASGI-capable subclass in
+# website/middleware.py, and the static settings are above; letting
+# django_heroku prepend the sync-only stock middleware would put every
+# ASGI request through a thread hop.
+django_heroku.settings(locals(), staticfiles=False)
@@ -0,0 +1,42 @@
+/*
+ * Live updates for the events page.
+ *
+ * Listens to the server-sent events feed (website/live.py) named by the
+ * list's data-live-feed attribute. Events already on the page are
+ * updated in place; anything else that changed (new, moved or deleted
+ * events) shows the refresh notice instead.
+ */
+(function () {
+    "use strict";
+
+    var list = document.querySelector("[data-live-feed]");
+    var notice = document.getElementById("live-notice");
+    if (!list || !notice || !window.EventSource) {
+        return;
+    }
+
+    function stale() {
+        notice.hidden = false;
+    }
+
+    function update(event) {
+        var item = list.querySelector('[data-event-id="' + event.id + '"]');
+        if (!item || new Date(item.dataset.eventDate).getTime() !== new Date(event.date).getTime()) {
+            stale();
+            return;
+        }
+        item.querySelector(".event-title").textContent = event.title;
+        item.querySelector(".event-venue").textContent = event.venue;
+        item.querySelector(".event-description").textContent = event.description;
+    }
+
+    var source = new EventSource(list.dataset.liveFeed);
+    source.addEventListener("events", function (message) {
+        var events = JSON.parse(message.data);
+        if (!events.length) {
+            stale();
+        }
+        events.forEach(update);
+    });
+    source.addEventListener("reload", stale);
+})();
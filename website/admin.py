@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
 from .models import Event
-from website.models import Album, Event, UserFavoriteAlbum
+from website.models import Album, Event, NewsletterIssue, Subscriber, UserFavoriteAlbum, Venue
+from website import newsletter, search
 
 
 @admin.register(Event)
@@ -10,7 +12,85 @@ class EventAdmin(admin.ModelAdmin):
 
     Attributes:
         list_display (tuple): Fields to display in the admin list view.
+        list_select_related (tuple): Relations loaded with the list view.
         search_fields (tuple): Fields searchable in the admin search bar.
+        autocomplete_fields (tuple): Relations picked by searching rather than from a full list.
     """
     list_display = ('title', 'date', 'venue')
-    search_fields = ('title', 'venue')
+    list_select_related = ('venue',)
+    search_fields = ('title', 'venue__name', 'venue__city')
+    autocomplete_fields = ('venue',)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search events through the full-text index when one is available.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            queryset (QuerySet): The changelist queryset.
+            search_term (str): The text entered in the admin search bar.
+
+        Returns:
+            tuple: The filtered queryset and whether it may contain duplicates.
+        """
+        if not search_term or not search.is_available():
+            return super().get_search_results(request, queryset, search_term)
+        ids = search.matching_ids('event', search_term)
+        return queryset.filter(id__in=ids), False
+
+
+@admin.register(Venue)
+class VenueAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the Venue model.
+
+    Attributes:
+        list_display (tuple): Fields to display in the admin list view.
+        search_fields (tuple): Fields searchable in the admin search bar.
+    """
+    list_display = ('name', 'city', 'country', 'latitude', 'longitude')
+    search_fields = ('name', 'city')
+
+
+@admin.register(Subscriber)
+class SubscriberAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the Subscriber model.
+
+    Attributes:
+        list_display (tuple): Fields to display in the admin list view.
+        search_fields (tuple): Fields searchable in the admin search bar.
+    """
+    list_display = ('email', 'subscribed_at', 'unsubscribed_at')
+    search_fields = ('email',)
+
+
+@admin.register(NewsletterIssue)
+class NewsletterIssueAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the NewsletterIssue model.
+
+    Saving a new issue queues it for the background delivery worker.
+
+    Attributes:
+        list_display (tuple): Fields to display in the admin list view.
+        readonly_fields (tuple): Delivery progress, maintained by the worker.
+    """
+    list_display = ('subject', 'status', 'created_at', 'sent_count', 'failed_count')
+    readonly_fields = (
+        'status', 'created_at', 'heartbeat_at', 'sent_at', 'last_subscriber_id', 'sent_count', 'failed_count',
+    )
+
+    def save_model(self, request, obj, form, change):
+        """
+        Save the issue, queueing it for delivery when it is new.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            obj (NewsletterIssue): The issue being saved.
+            form (ModelForm): The bound admin form.
+            change (bool): Whether an existing issue is being edited.
+        """
+        super().save_model(request, obj, form, change)
+        if not change:
+            transaction.on_commit(newsletter.worker.wake)
@@ -0,0 +1,264 @@
+"""Read-only JSON API for the EchoPulse catalog.
+
+Two access modes are offered for events and albums:
+
+* Paginated endpoints (``/api/events/``, ``/api/albums/``) return one
+  keyset page of rows plus a ``next`` cursor, for ordinary clients.
+* Export endpoints (``/api/events/export/``, ``/api/albums/export/``)
+  stream the whole table as NDJSON (or, with ``?format=json``, a single
+  JSON array) for bulk consumers such as partner catalog syncs.
+
+Rows are read with ``.values()`` / ``.values_list()`` so no model
+instances are built, and exports iterate the queryset in chunks so
+memory stays flat however large the table is. Under ASGI exports are
+streamed from an async iterator, since Django would otherwise read a
+sync one to the end before sending anything.
+
+Events can be narrowed with ``?venue=<id>`` and ``?city=<name>``;
+``/api/venues/`` lists the venues and ``/api/events/nearby/`` finds
+upcoming events around a point (see :mod:`website.venues`).
+"""
+
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from website.cache import cache_page_for
+from website import venues
+from website.models import Album, Event, Venue, venue_lookup_key
+from website.pagination import paginate_keyset
+
+
+# Output name -> field lookup.
+EVENT_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "date": "date",
+    "venue": "venue__name",
+    "venue_id": "venue_id",
+    "city": "venue__city",
+    "description": "description",
+    "updated_at": "updated_at",
+}
+ALBUM_FIELDS = {
+    field: field
+    for field in ("id", "title", "artist", "release_date", "genre", "cover_url", "updated_at")
+}
+VENUE_FIELDS = {
+    field: field
+    for field in ("id", "name", "city", "country", "latitude", "longitude")
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _chunked(iterable, size):
+    chunk = list(islice(iterable, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterable, size))
+
+
+def _paginated(request, queryset, fields):
+    page = paginate_keyset(
+        queryset.values(*fields.values()),
+        ("id",),
+        cursor=request.GET.get("cursor"),
+        per_page=_page_size(request),
+    )
+    results = [{name: row[lookup] for name, lookup in fields.items()} for row in page.object_list]
+    return JsonResponse({"results": results, "next": page.next_cursor})
+
+
+async def _achunks(rows, key, size):
+    # Keyset chunks, one query each: QuerySet.aiterator() runs the query
+    # on the event loop for values_list() querysets in Django 4.2.
+    last = None
+    while True:
+        page = rows if last is None else rows.filter(id__gt=last)
+        chunk = await sync_to_async(list)(page[:size])
+        if chunk:
+            yield chunk
+        if len(chunk) < size:
+            return
+        last = chunk[-1][key]
+
+
+def _export_piece(chunk, first, json_array):
+    if json_array:
+        return ("" if first else ",") + ",".join(chunk)
+    return "\n".join(chunk) + "\n"
+
+
+def _export(request, model, fields):
+    rows = model.objects.order_by("id").values_list(*fields.values())
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    json_array = request.GET.get("format") == "json"
+
+    def encode(chunk):
+        return [encoder.encode(dict(zip(fields, row))) for row in chunk]
+
+    # Yield one write per chunk of rows rather than one per row.
+    def stream():
+        if json_array:
+            yield "["
+        for number, chunk in enumerate(_chunked(rows.iterator(chunk_size=EXPORT_CHUNK_SIZE), EXPORT_CHUNK_SIZE)):
+            yield _export_piece(encode(chunk), number == 0, json_array)
+        if json_array:
+            yield "]"
+
+    # Under ASGI a sync iterator is drained into a list before the first
+    # byte is sent, so the rows are fetched chunk by chunk from the loop.
+    async def astream():
+        if json_array:
+            yield "["
+        first = True
+        async for chunk in _achunks(rows, list(fields.values()).index("id"), EXPORT_CHUNK_SIZE):
+            yield _export_piece(encode(chunk), first, json_array)
+            first = False
+        if json_array:
+            yield "]"
+
+    if json_array:
+        content_type, extension = "application/json", "json"
+    else:
+        content_type, extension = "application/x-ndjson", "ndjson"
+    content = astream() if isinstance(request, ASGIRequest) else stream()
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{model._meta.verbose_name_plural}.{extension}"'
+    return response
+
+
+@require_GET
+@cache_page_for(Event)
+def event_list(request):
+    """
+    Return one page of events as JSON, ordered by ID.
+
+    Args:
+        request (HttpRequest): The HTTP request object. Accepts ``cursor``,
+            ``limit``, ``venue`` and ``city`` query parameters.
+
+    Returns:
+        JsonResponse: ``{"results": [...], "next": cursor-or-null}``.
+    """
+    return _paginated(request, Event.objects.filter(**venues.listing_filters(request)), EVENT_FIELDS)
+
+
+@require_GET
+def event_export(request):
+    """
+    Stream every event as NDJSON, or as a JSON array with ``?format=json``.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        StreamingHttpResponse: The streamed export.
+    """
+    return _export(request, Event, EVENT_FIELDS)
+
+
+@require_GET
+@cache_page_for(Album)
+def album_list(request):
+    """
+    Return one page of albums as JSON, ordered by ID.
+
+    Args:
+        request (HttpRequest): The HTTP request object. Accepts ``cursor``
+            and ``limit`` query parameters.
+
+    Returns:
+        JsonResponse: ``{"results": [...], "next": cursor-or-null}``.
+    """
+    return _paginated(request, Album.objects.all(), ALBUM_FIELDS)
+
+
+@require_GET
+def album_export(request):
+    """
+    Stream every album as NDJSON, or as a JSON array with ``?format=json``.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        StreamingHttpResponse: The streamed export.
+    """
+    return _export(request, Album, ALBUM_FIELDS)
+
+
+@require_GET
+@cache_page_for(Venue)
+def venue_list(request):
+    """
+    Return one page of venues as JSON, ordered by ID.
+
+    Args:
+        request (HttpRequest): The HTTP request object. Accepts ``cursor``,
+            ``limit`` and ``city`` query parameters.
+
+    Returns:
+        JsonResponse: ``{"results": [...], "next": cursor-or-null}``.
+    """
+    queryset = Venue.objects.all()
+    city = request.GET.get("city", "").strip()
+    if city:
+        queryset = queryset.filter(city_key=venue_lookup_key(city))
+    return _paginated(request, queryset, VENUE_FIELDS)
+
+
+@require_GET
+@cache_page_for(Event, timeout=60)
+def event_nearby(request):
+    """
+    Return the upcoming events near a point as JSON, soonest first.
+
+    Args:
+        request (HttpRequest): The HTTP request object. Requires ``lat``
+            and ``lon`` (degrees) and accepts ``km`` and ``limit``.
+
+    Returns:
+        JsonResponse: ``{"results": [...]}``, each event with its
+        ``distance_km``, or 400 Bad Request for a missing or invalid point.
+    """
+    try:
+        lat = float(request.GET["lat"])
+        lon = float(request.GET["lon"])
+        km = float(request.GET["km"]) if "km" in request.GET else None
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("'lat' and 'lon' (and 'km', if given) must be numbers.")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (km is not None and not km > 0):
+        return HttpResponseBadRequest("'lat' must be within ±90, 'lon' within ±180 and 'km' positive.")
+
+    events = venues.nearby_events(lat, lon, km, limit=_page_size(request) if "limit" in request.GET else None)
+    results = [
+        {
+            "id": event.id,
+            "title": event.title,
+            "date": event.date,
+            "venue": event.venue.name,
+            "venue_id": event.venue_id,
+            "city": event.venue.city,
+            "description": event.description,
+            "updated_at": event.updated_at,
+            "distance_km": round(event.distance_km, 3),
+        }
+        for event in events
+    ]
+    return JsonResponse({"results": results})
@@ -0,0 +1,130 @@
+"""Native async versions of the read-heavy EchoPulse pages.
+
+Under ASGI a synchronous view costs a thread-pool hop per request, so the
+busiest public pages are also implemented here as ``async def`` views on
+Django's async ORM. They share their query building, templates, page cache
+and conditional GET handling with :mod:`website.views`, and are routed in
+place of the synchronous versions when ``ECHOPULSE_ASYNC_VIEWS`` is on
+(see :mod:`echopulse.asgi`).
+
+For requests without conditional headers, :func:`website.conditional.conditional`
+starts the ETag query and the view together with :func:`asyncio.gather`.
+Django 4.2 still runs async ORM queries on one shared worker thread, so
+the two queries themselves are serialized, but neither holds up the
+event loop while it waits.
+"""
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+
+from website import live, objects, trending
+from website.cache import cache_page_for, is_authenticated_async
+from website.conditional import conditional, event_listing_validators, object_validators, table_validators
+from website.models import Album, Event
+from website.pagination import apaginate_keyset
+from website.views import album_listing, event_listing, event_page_options
+
+
+@conditional(event_listing_validators)
+@cache_page_for(Event, timeout=60)
+async def events(request):
+    """
+    Render one page of upcoming or past events.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: The rendered events page template with event data.
+    """
+    queryset, when, context = event_listing(request)
+    page = await apaginate_keyset(queryset, ("date", "id"), **event_page_options(request, when))
+    return render(request, "events.html", {"events": page, "page": page, "when": when, **context})
+
+
+@trending.counts_interest
+@conditional(object_validators(Event))
+@cache_page_for(Event)
+async def event_detail(request, id):
+    """
+    Render the event detail page.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        id (int): The ID of the event.
+
+    Returns:
+        HttpResponse: The rendered event detail page with the specific event.
+
+    Raises:
+        Http404: If no event exists with the given ID.
+    """
+    event = await objects.aget_object_or_404(Event, id)
+    return render(request, "event_detail.html", {"event": event})
+
+
+@conditional(table_validators(Album))
+@cache_page_for(Album)
+async def album_list(request):
+    """
+    Render one page of the album catalog.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: The rendered albums page with the requested page of albums.
+    """
+    queryset, options, context = album_listing(request)
+    page = await apaginate_keyset(queryset, **options)
+    return render(request, "albums.html", {"albums": page, "page": page, **context})
+
+
+@cache_page_for()
+async def echo_pulse_landing(request):
+    """
+    Render the public landing page.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponseRedirect or HttpResponse: Redirects authenticated users to home, others see landing page.
+    """
+    if await is_authenticated_async(request):
+        return redirect('home_authenticated')
+    return render(request, "landing.html")
+
+
+async def live_feed(request):
+    """
+    Stream event changes and live vote tallies as server-sent events.
+
+    Args:
+        request (HttpRequest): The HTTP request object. A reconnecting
+            ``EventSource`` sends the ID it last received in ``Last-Event-ID``.
+
+    Returns:
+        StreamingHttpResponse or HttpResponse: The ``text/event-stream``
+        stream; a stream that only asks the browser to retry later when
+        the worker already holds ``MAX_CLIENTS`` streams; or
+        ``204 No Content`` outside ASGI, which stops the browser from
+        reconnecting.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    config = live.get_config()
+    if live.broadcaster.clients >= config["MAX_CLIENTS"]:
+        content = f"retry: {config['RETRY'] * 10}\n\n"
+        return HttpResponse(content, content_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    try:
+        last_event_id = int(request.headers["Last-Event-ID"])
+    except (KeyError, ValueError):
+        last_event_id = None
+    return StreamingHttpResponse(
+        live.broadcaster.stream(last_event_id),
+        content_type="text/event-stream",
+        # Keep proxies such as nginx from buffering the stream.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
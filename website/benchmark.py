@@ -0,0 +1,295 @@
+"""Load and latency benchmarks for every route in :mod:`website.urls`.
+
+:func:`discover_routes` turns the URL configuration into concrete GET
+paths, filling ``<int:id>`` with IDs from the database, and
+:func:`run` drives each path from a pool of client threads and reports
+throughput, latency percentiles and response sizes. ``manage.py
+run_bench`` serves the site from a local WSGI or ASGI server for the
+duration of a run, writes the report as JSON and fails if a route went
+over its budget (see :func:`budget_violations`); seed data first with
+``manage.py seed_bench``.
+"""
+
+import math
+import re
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from website.models import Album, Event
+
+
+# URL name -> model whose IDs fill the route's <int:id>.
+ROUTE_OBJECTS = {
+    "album_detail": Album,
+    "event_detail": Event,
+}
+
+# Routes that cannot be measured with anonymous GETs, and why.
+SKIPPED_ROUTES = {
+    "favorite_albums": "POST only, login required",
+    "vote_album": "POST only, login required",
+    "logout": "changes session state",
+    "metrics": "staff only",
+    "live_feed": "server-sent event stream, never completes",
+}
+
+# Extra query strings worth measuring for some routes.
+ROUTE_VARIANTS = {
+    "events": ("", "?when=past", "?venue=1", "?city=Bench+City+1"),
+    "api_event_list": ("", "?city=Bench+City+1"),
+    "api_event_nearby": ("?lat=0&lon=0&km=100",),
+    "album_list": ("", "?sort=popular", "?sort=title", "?genre=Rock"),
+    "search": ("?q=bench", "?q=rock+event"),
+}
+
+# Sent as a browser would, so that response sizes are what goes over the wire.
+REQUEST_HEADERS = {"Accept-Encoding": "br, gzip"}
+
+# The query count in the Server-Timing header added by InstrumentationMiddleware.
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(values, fraction):
+    """
+    Return a percentile by the nearest-rank method.
+
+    Args:
+        values (list): Sorted observations.
+        fraction (float): The percentile, from 0 to 1.
+
+    Returns:
+        float: The observation at that rank, or 0.0 if there are none.
+    """
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(values)))
+    return values[rank - 1]
+
+
+def _walk(patterns, prefix="/"):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.app_name != "admin":
+                yield from _walk(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name, prefix + str(pattern.pattern)
+
+
+def discover_routes(names=None, samples=10):
+    """
+    Return the GET paths to benchmark for each named route.
+
+    Args:
+        names (iterable): Only these URL names. All routes if omitted.
+        samples (int): Number of distinct IDs used for ``<int:id>`` routes.
+
+    Returns:
+        tuple: ``(routes, skipped)``, where ``routes`` maps URL name to a
+        list of paths and ``skipped`` maps URL name to the reason it is
+        not measured.
+    """
+    routes, skipped = {}, {}
+    for name, template in _walk(get_resolver().url_patterns):
+        if names is not None and name not in names:
+            continue
+        if name in SKIPPED_ROUTES:
+            skipped[name] = SKIPPED_ROUTES[name]
+            continue
+        variants = ROUTE_VARIANTS.get(name, ("",))
+        if "<int:id>" in template:
+            model = ROUTE_OBJECTS.get(name)
+            ids = list(model.objects.order_by("pk").values_list("pk", flat=True)[:samples]) if model else []
+            if not ids:
+                skipped[name] = "no objects to request"
+                continue
+            routes[name] = [template.replace("<int:id>", str(pk)) + variant for pk in ids for variant in variants]
+        elif "<" in template:
+            skipped[name] = "unsupported URL parameter"
+        else:
+            routes[name] = [template + variant for variant in variants]
+    return routes, skipped
+
+
+def _queries(headers):
+    match = SERVER_TIMING_QUERIES.search(headers.get("Server-Timing", ""))
+    return int(match.group(1)) if match else None
+
+
+def _fetch(url):
+    started = time.perf_counter()
+    size = 0
+    queries = None
+    try:
+        request = urllib.request.Request(url, headers=REQUEST_HEADERS)
+        with urllib.request.urlopen(request, timeout=60) as response:
+            size = len(response.read())
+            status = response.status
+            queries = _queries(response.headers)
+    except urllib.error.HTTPError as exc:
+        status = exc.code
+    except OSError:
+        # Connection refused, reset or timed out.
+        status = 0
+    return time.perf_counter() - started, status, size, queries
+
+
+def measure(base_url, paths, requests, concurrency):
+    """
+    Request ``paths`` round-robin and summarize the latencies.
+
+    Args:
+        base_url (str): Server root, e.g. ``http://127.0.0.1:8765``.
+        paths (list): Paths to request.
+        requests (int): Total number of requests.
+        concurrency (int): Number of client threads.
+
+    Returns:
+        dict: Request count, errors, status codes, throughput in
+        requests per second, latency percentiles in milliseconds, the
+        mean response body size in bytes and the most queries a request
+        ran (from ``Server-Timing``; None if the server sent none).
+    """
+    urls = [base_url + paths[i % len(paths)] for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(_fetch, urls))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency * 1000 for latency, _status, _size, _queries in results)
+    statuses = {}
+    for _latency, status, _size, _queries in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    queries = [count for _latency, _status, _size, count in results if count is not None]
+    return {
+        "requests": requests,
+        "errors": sum(count for status, count in statuses.items() if int(status) >= 500 or status == "0"),
+        "statuses": statuses,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(latencies[-1], 2),
+        "mean_bytes": round(sum(size for _latency, _status, size, _queries in results) / requests),
+        "max_queries": max(queries, default=None),
+    }
+
+
+def run(base_url, routes, requests=200, concurrency=8, warmup=10):
+    """
+    Benchmark every route against a running server.
+
+    Args:
+        base_url (str): Server root.
+        routes (dict): URL name to paths, from :func:`discover_routes`.
+        requests (int): Measured requests per route.
+        concurrency (int): Number of client threads.
+        warmup (int): Unmeasured requests per route sent first.
+
+    Returns:
+        dict: URL name to the results of :func:`measure`.
+    """
+    report = {}
+    for name, paths in routes.items():
+        if warmup:
+            measure(base_url, paths, warmup, concurrency)
+        report[name] = measure(base_url, paths, requests, concurrency)
+    return report
+
+
+def budget_violations(results, budgets):
+    """
+    Compare benchmark results with the routes' budgets.
+
+    A route is over its query budget if any measured request ran more
+    queries, and over its latency budget if its p95 latency is higher.
+
+    Args:
+        results (dict): URL name to the results of :func:`measure`.
+        budgets (dict): ``ECHOPULSE_INSTRUMENTATION["BUDGETS"]``.
+
+    Returns:
+        list: One message per exceeded budget; empty if all were met.
+    """
+    violations = []
+    for name, result in results.items():
+        budget = budgets.get(name, {})
+        queries = result.get("max_queries")
+        if "queries" in budget and queries is not None and queries > budget["queries"]:
+            violations.append(f"{name} ran {queries} queries (budget {budget['queries']}).")
+        if "ms" in budget and result["p95_ms"] > budget["ms"]:
+            violations.append(f"{name} p95 was {result['p95_ms']}ms (budget {budget['ms']}ms).")
+    return violations
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class WSGIBenchServer:
+    """
+    Serves a WSGI application from a background thread.
+
+    Attributes:
+        base_url (str): The server root, once started.
+    """
+
+    def __init__(self, application, host="127.0.0.1", port=0):
+        self._server = make_server(host, port, application, _ThreadingWSGIServer, _QuietHandler)
+        self.base_url = f"http://{host}:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class ASGIBenchServer:
+    """
+    Serves an ASGI application with uvicorn from a background thread.
+
+    Attributes:
+        base_url (str): The server root, once started.
+
+    Raises:
+        ImportError: If uvicorn is not installed.
+    """
+
+    def __init__(self, application, host="127.0.0.1", port=0):
+        import uvicorn
+
+        if not port:
+            with socket.socket() as probe:
+                probe.bind((host, 0))
+                port = probe.getsockname()[1]
+        config = uvicorn.Config(application, host=host, port=port, lifespan="off", log_level="warning")
+        self._server = uvicorn.Server(config)
+        self.base_url = f"http://{host}:{port}"
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("The ASGI server failed to start.")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.should_exit = True
+        self._thread.join()
@@ -0,0 +1,318 @@
+"""Version-keyed page cache for the EchoPulse public pages.
+
+Every cached page is keyed on the request path plus the current *data
+version* of each model the page is built from. Saving or deleting an
+``Event`` or ``Album`` bumps that model's version (see
+:mod:`website.signals`), so the very next request builds a new key and
+misses; stale entries are never served and simply age out of the LRU.
+
+Rendered pages live in a bounded in-process LRU. When
+``ECHOPULSE_PAGE_CACHE["SHARED_ALIAS"]`` names a Django cache (Redis,
+Memcached, ...) the data versions are kept there so that every worker
+sees an edit immediately, and rendered pages are shared through it as a
+second-level cache behind the local LRU.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from website.routers import use_primary
+
+
+DEFAULTS = {
+    "MAX_ENTRIES": 512,
+    "TIMEOUT": 300,
+    "SHARED_ALIAS": None,
+}
+
+VERSION_KEY_PREFIX = "echopulse:version:"
+PAGE_KEY_PREFIX = "echopulse:page:"
+
+
+def get_config():
+    """
+    Return the page cache configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_PAGE_CACHE`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_PAGE_CACHE", {})}
+
+
+def shared_cache():
+    """
+    Return the configured shared cache backend, if any.
+
+    Returns:
+        BaseCache: The Django cache named by ``SHARED_ALIAS``, or None.
+    """
+    alias = get_config()["SHARED_ALIAS"]
+    return caches[alias] if alias else None
+
+
+class LRUCache:
+    """
+    A thread-safe, bounded, in-process LRU cache with per-entry expiry.
+
+    Attributes:
+        max_entries (int): Maximum number of entries kept before eviction.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the value stored under ``key``, or None if absent or expired.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            object: The cached value, or None.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        """
+        Store ``value`` under ``key`` for ``timeout`` seconds.
+
+        Args:
+            key (str): The cache key.
+            value (object): The value to store.
+            timeout (int): Lifetime of the entry in seconds.
+        """
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Remove the entry stored under ``key``, if any.
+
+        Args:
+            key (str): The cache key.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DataVersions:
+    """
+    Per-model data version counters used to build page cache keys.
+
+    Versions are process-local unless a shared cache is configured, in
+    which case they are read from and bumped in the shared cache.
+    """
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, labels):
+        """
+        Return the current version of each model label.
+
+        Args:
+            labels (iterable): Model labels such as ``"website.Event"``.
+
+        Returns:
+            list: The versions, in the same order as ``labels``.
+        """
+        labels = list(labels)
+        shared = shared_cache()
+        if shared is None:
+            with self._lock:
+                return [self._local.get(label, 0) for label in labels]
+        keys = [VERSION_KEY_PREFIX + label for label in labels]
+        found = shared.get_many(keys)
+        missing = {key: time.time_ns() for key in keys if key not in found}
+        if missing:
+            # Seed from the clock so an evicted counter never reuses a
+            # version that older page entries may still be keyed on.
+            for key, value in missing.items():
+                shared.add(key, value, timeout=None)
+            found.update(shared.get_many(list(missing)))
+        return [found.get(key, 0) for key in keys]
+
+    def bump(self, label):
+        """
+        Advance the version of ``label`` so pages built from it miss.
+
+        Args:
+            label (str): The model label, e.g. ``"website.Album"``.
+        """
+        with self._lock:
+            self._local[label] = self._local.get(label, 0) + 1
+        shared = shared_cache()
+        if shared is not None:
+            key = VERSION_KEY_PREFIX + label
+            try:
+                shared.incr(key)
+            except ValueError:
+                shared.add(key, time.time_ns(), timeout=None)
+
+
+data_versions = DataVersions()
+page_cache = LRUCache(get_config()["MAX_ENTRIES"])
+
+
+def _page_key(request, labels):
+    versions = data_versions.get_many(labels)
+    stamp = ",".join(f"{label}={version}" for label, version in zip(labels, versions))
+    query = request.GET.urlencode()
+    return f"{PAGE_KEY_PREFIX}{request.path}?{query}|{stamp}"
+
+
+def _is_cacheable(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+    )
+
+
+def _freeze(response):
+    return (response.status_code, list(response.items()), response.content)
+
+
+def _thaw(entry):
+    status, headers, content = entry
+    response = HttpResponse(content, status=status)
+    for header, value in headers:
+        response[header] = value
+    return response
+
+
+def _lookup(request, labels, lifetime):
+    key = _page_key(request, labels)
+    entry = page_cache.get(key)
+    shared = shared_cache()
+    if entry is None and shared is not None:
+        entry = shared.get(key)
+        if entry is not None:
+            page_cache.set(key, entry, lifetime)
+    if entry is None:
+        return key, None
+    response = _thaw(entry)
+    response["X-Page-Cache"] = "hit"
+    return key, response
+
+
+def _store(request, key, response, lifetime):
+    if _is_cacheable(request, response):
+        entry = _freeze(response)
+        page_cache.set(key, entry, lifetime)
+        shared = shared_cache()
+        if shared is not None:
+            shared.set(key, entry, lifetime)
+        response["X-Page-Cache"] = "miss"
+
+
+async def is_authenticated_async(request):
+    """
+    Return whether the request's user is logged in, from async code.
+
+    Without a session cookie the user is anonymous and no session lookup
+    is needed, so the common anonymous case never leaves the event loop.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        bool: Whether the user is authenticated.
+    """
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return False
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+def cache_page_for(*models, timeout=None):
+    """
+    Cache a view's anonymous GET responses against the given models.
+
+    The page is served from cache until one of ``models`` is saved or
+    deleted. Authenticated users and non-GET requests always reach the
+    view, as do responses that set cookies or use a CSRF token. Both
+    regular and ``async def`` views can be decorated.
+
+    Args:
+        *models (Model): The models whose data the page is rendered from.
+        timeout (int): Maximum lifetime in seconds. Defaults to the
+            configured ``TIMEOUT``; use a short value for pages that also
+            depend on the clock.
+
+    Returns:
+        callable: The view decorator.
+    """
+    labels = sorted(model._meta.label for model in models)
+
+    def lifetime():
+        return get_config()["TIMEOUT"] if timeout is None else timeout
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapped(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD") or await is_authenticated_async(request):
+                    return await view(request, *args, **kwargs)
+                # Only a shared backend can block; the local LRU never does.
+                run = sync_to_async if shared_cache() is not None else _immediate
+                key, response = await run(_lookup)(request, labels, lifetime())
+                if response is None:
+                    with use_primary():
+                        response = await view(request, *args, **kwargs)
+                    await run(_store)(request, key, response, lifetime())
+                return response
+
+            return async_wrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            key, response = _lookup(request, labels, lifetime())
+            if response is None:
+                with use_primary():
+                    response = view(request, *args, **kwargs)
+                _store(request, key, response, lifetime())
+            return response
+
+        return wrapped
+
+    return decorator
+
+
+def _immediate(func):
+    async def call(*args, **kwargs):
+        return func(*args, **kwargs)
+    return call
@@ -0,0 +1,192 @@
+"""Conditional GET (ETag / Last-Modified) support for catalog pages.
+
+Validators are derived from ``updated_at`` with a single aggregate query
+and memoized against the model's data version (see :mod:`website.cache`),
+so a revalidating client usually costs no query at all and a matching
+``If-None-Match`` is answered with ``304 Not Modified`` before the view
+renders anything.
+
+The ETag includes the row count, so deleting a row changes it even
+though ``Max(updated_at)`` does not move. Django evaluates
+``If-None-Match`` before ``If-Modified-Since``, so clients sending both
+always revalidate against the ETag.
+"""
+
+import asyncio
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from website import objects
+from website.cache import data_versions, page_cache
+from website.models import Event
+from website.routers import use_primary
+
+
+VALIDATOR_KEY_PREFIX = "echopulse:validators:"
+VALIDATOR_TIMEOUT = 300
+
+
+def _memoize(key, model, compute, timeout=VALIDATOR_TIMEOUT):
+    (version,) = data_versions.get_many([model._meta.label])
+    full_key = f"{VALIDATOR_KEY_PREFIX}{key}|{version}"
+    validators = page_cache.get(full_key)
+    if validators is None:
+        # Stored under the new version, so never computed from a lagging replica.
+        with use_primary():
+            validators = compute()
+        page_cache.set(full_key, validators, timeout)
+    return validators
+
+
+def _stamp(value):
+    return f"{value.timestamp():.6f}" if value else "0"
+
+
+def table_validators(model):
+    """
+    Build a validator function covering every row of ``model``.
+
+    Args:
+        model (Model): A model with an ``updated_at`` field.
+
+    Returns:
+        callable: ``validators(request, *args, **kwargs)`` returning an
+        ``(etag, last_modified)`` tuple.
+    """
+    def compute():
+        totals = model.objects.aggregate(count=Count("id"), latest=Max("updated_at"))
+        etag = f"{model._meta.model_name}-{totals['count']}-{_stamp(totals['latest'])}"
+        return etag, totals["latest"]
+
+    def validators(request, *args, **kwargs):
+        return _memoize(model._meta.label, model, compute)
+
+    return validators
+
+
+def object_validators(model):
+    """
+    Build a validator function for a single row looked up by ``id``.
+
+    Args:
+        model (Model): A model with an ``updated_at`` field.
+
+    Returns:
+        callable: ``validators(request, id)`` returning an
+        ``(etag, last_modified)`` tuple, or ``(None, None)`` if the row
+        does not exist.
+    """
+    def validators(request, id, *args, **kwargs):
+        def compute():
+            # The view loads the same row, so read it through the object cache.
+            obj = objects.object_cache.get(model, id)
+            if obj is None:
+                return None, None
+            return f"{model._meta.model_name}-{id}-{_stamp(obj.updated_at)}", obj.updated_at
+
+        return _memoize(f"{model._meta.label}:{id}", model, compute)
+
+    return validators
+
+
+def event_listing_validators(request, *args, **kwargs):
+    """
+    Validators for the events listing.
+
+    The listing also changes when an upcoming event moves into the past,
+    so the start of the next upcoming event is folded into the ETag and
+    the memoized value is only kept for a minute.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        tuple: ``(etag, last_modified)``.
+    """
+    def compute():
+        totals = Event.objects.aggregate(
+            count=Count("id"),
+            latest=Max("updated_at"),
+            next_start=Min("date", filter=Q(date__gte=timezone.now())),
+        )
+        etag = f"events-{totals['count']}-{_stamp(totals['latest'])}-{_stamp(totals['next_start'])}"
+        return etag, totals["latest"]
+
+    return _memoize("events", Event, compute, timeout=60)
+
+
+def _conditional_headers(request):
+    return any(
+        header in request.META
+        for header in ("HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE", "HTTP_IF_MATCH", "HTTP_IF_UNMODIFIED_SINCE")
+    )
+
+
+def _apply(request, response, etag, last_modified):
+    # Mirrors django.views.decorators.http.condition().
+    if request.method in ("GET", "HEAD"):
+        if last_modified and not response.has_header("Last-Modified"):
+            response.headers["Last-Modified"] = http_date(last_modified)
+        if etag:
+            response.headers.setdefault("ETag", etag)
+    return response
+
+
+def _normalize(validators):
+    etag, last_modified = validators
+    return (
+        quote_etag(etag) if etag is not None else None,
+        int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def conditional(validators):
+    """
+    Decorate a view so it answers conditional GETs from ``validators``.
+
+    Regular views use Django's :func:`~django.views.decorators.http.condition`.
+    For ``async def`` views the validators run in a worker thread, and when
+    the request carries no conditional headers (so no 304 is possible)
+    they are computed concurrently with the view.
+
+    Args:
+        validators (callable): Returns ``(etag, last_modified)`` for the
+            view's arguments.
+
+    Returns:
+        callable: The view decorator.
+    """
+    sync_decorator = condition(
+        etag_func=lambda request, *args, **kwargs: validators(request, *args, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: validators(request, *args, **kwargs)[1],
+    )
+
+    def decorator(view):
+        if not iscoroutinefunction(view):
+            return sync_decorator(view)
+
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            compute = sync_to_async(validators)
+            if not _conditional_headers(request):
+                found, response = await asyncio.gather(
+                    compute(request, *args, **kwargs),
+                    view(request, *args, **kwargs),
+                )
+                return _apply(request, response, *_normalize(found))
+
+            etag, last_modified = _normalize(await compute(request, *args, **kwargs))
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            return _apply(request, response, etag, last_modified)
+
+        return wrapped
+
+    return decorator
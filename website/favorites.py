@@ -0,0 +1,144 @@
+"""Adding and removing favorite albums.
+
+``Album.favorite_count`` is a denormalized copy of the number of
+``UserFavoriteAlbum`` rows for each album, so leaderboards can be read
+from the ``(favorite_count, id)`` index instead of counting a join.
+Every write path goes through this module and adjusts the counters with
+``F()`` expressions in the same transaction as the favorites themselves.
+
+Two concurrent requests toggling the same favorite for the same user can
+still leave a counter off by one; ``manage.py reconcile_favorite_counts``
+recomputes the counters from the favorites table and repairs any drift.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from website.cache import data_versions
+from website.models import Album, UserFavoriteAlbum
+
+
+MAX_ALBUMS_PER_REQUEST = 500
+
+
+def _adjust_counts(album_ids, delta):
+    # Moving the count also changes every page that shows it, so touch
+    # updated_at for the ETags and bump the data version for the page cache.
+    count = F("favorite_count") + delta
+    if delta < 0:
+        # Never push a drifted counter below zero.
+        count = Greatest(count, 0)
+    Album.objects.filter(id__in=album_ids).update(favorite_count=count, updated_at=timezone.now())
+    transaction.on_commit(lambda: data_versions.bump(Album._meta.label))
+
+
+def add_favorites(user, album_ids):
+    """
+    Favorite several albums for a user at once.
+
+    Unknown album IDs and albums the user already favorites are ignored.
+
+    Args:
+        user (User): The user favoriting the albums.
+        album_ids (iterable): IDs of the albums to favorite.
+
+    Returns:
+        list: IDs of the albums that were newly favorited.
+    """
+    album_ids = set(album_ids)
+    with transaction.atomic():
+        existing = set(
+            UserFavoriteAlbum.objects.filter(user=user, album_id__in=album_ids)
+            .values_list("album_id", flat=True)
+        )
+        new_ids = sorted(
+            Album.objects.filter(id__in=album_ids - existing).values_list("id", flat=True)
+        )
+        if new_ids:
+            UserFavoriteAlbum.objects.bulk_create(
+                [UserFavoriteAlbum(user=user, album_id=album_id) for album_id in new_ids],
+                ignore_conflicts=True,
+            )
+            _adjust_counts(new_ids, 1)
+    return new_ids
+
+
+def remove_favorites(user, album_ids):
+    """
+    Unfavorite several albums for a user at once.
+
+    Args:
+        user (User): The user unfavoriting the albums.
+        album_ids (iterable): IDs of the albums to unfavorite.
+
+    Returns:
+        list: IDs of the albums that were unfavorited.
+    """
+    with transaction.atomic():
+        favorites = UserFavoriteAlbum.objects.filter(user=user, album_id__in=set(album_ids))
+        removed_ids = sorted(favorites.values_list("album_id", flat=True))
+        if removed_ids:
+            favorites.delete()
+            _adjust_counts(removed_ids, -1)
+    return removed_ids
+
+
+def release_user_favorites(user):
+    """
+    Decrement the counters of every album a user favorites.
+
+    Called before the user is deleted, since the cascade removes their
+    favorites without going through :func:`remove_favorites`.
+
+    Args:
+        user (User): The user about to be deleted.
+    """
+    album_ids = list(user.favorite_albums.values_list("album_id", flat=True))
+    if album_ids:
+        _adjust_counts(album_ids, -1)
+
+
+def reconcile_counts(batch_size=1000):
+    """
+    Recompute favorite counters from the favorites table and fix drift.
+
+    Albums are processed in primary key order, ``batch_size`` at a time,
+    so memory use does not grow with the size of the catalog.
+
+    Args:
+        batch_size (int): Number of albums checked per batch.
+
+    Returns:
+        int: The number of albums whose counter was corrected.
+    """
+    repaired = 0
+    last_id = 0
+    while True:
+        stored = dict(
+            Album.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "favorite_count")[:batch_size]
+        )
+        if not stored:
+            return repaired
+        actual = dict(
+            UserFavoriteAlbum.objects.filter(album_id__in=list(stored))
+            .order_by()
+            .values("album_id")
+            .annotate(total=Count("id"))
+            .values_list("album_id", "total")
+        )
+        now = timezone.now()
+        drifted = [
+            Album(id=album_id, favorite_count=actual.get(album_id, 0), updated_at=now)
+            for album_id, count in stored.items()
+            if count != actual.get(album_id, 0)
+        ]
+        if drifted:
+            with transaction.atomic():
+                Album.objects.bulk_update(drifted, ["favorite_count", "updated_at"])
+            data_versions.bump(Album._meta.label)
+        repaired += len(drifted)
+        last_id = max(stored)
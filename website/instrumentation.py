@@ -0,0 +1,396 @@
+"""Per-request performance instrumentation.
+
+:class:`InstrumentationMiddleware` measures a sample of requests:
+
+* SQL query count and time, through an execute wrapper installed on
+  every database connection (see :func:`install_query_recorder`),
+* repeated identical queries, the usual sign of an N+1 loop,
+* template render time, through the :class:`TimedDjangoTemplates`
+  backend, and
+* total latency.
+
+Each measured response gets a ``Server-Timing`` header, the numbers are
+added to in-process histograms labelled by URL name, and requests that
+exceed their configured budget are logged. :func:`render_metrics`
+writes the histograms in the Prometheus text format for the
+``metrics/`` endpoint.
+
+Histograms are kept per process. With several workers, scrape each one
+or aggregate them in Prometheus.
+"""
+
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "SAMPLE_RATE": 1.0,
+    "SERVER_TIMING": True,
+    "DUPLICATE_THRESHOLD": 3,
+    "BUDGETS": {},
+    "METRICS_TOKEN": None,
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def get_config():
+    """
+    Return the instrumentation configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_INSTRUMENTATION`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_INSTRUMENTATION", {})}
+
+
+class RequestStats:
+    """
+    Measurements for one request.
+
+    Attributes:
+        queries (int): Number of SQL queries executed.
+        sql_time (float): Seconds spent executing SQL.
+        template_time (float): Seconds spent rendering templates.
+        statements (Counter): Executions per SQL statement, before
+            parameter substitution.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.statements = Counter()
+
+    def duplicates(self, threshold):
+        """
+        Return the statements executed at least ``threshold`` times.
+
+        Args:
+            threshold (int): Minimum number of executions.
+
+        Returns:
+            list: ``(sql, count)`` tuples, most repeated first.
+        """
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+_current = contextvars.ContextVar("echopulse_request_stats", default=None)
+
+
+def current_stats():
+    """
+    Return the measurements of the request being handled.
+
+    Returns:
+        RequestStats: The stats, or None outside a sampled request.
+    """
+    return _current.get()
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sql_time += time.perf_counter() - started
+        stats.queries += 1
+        stats.statements[sql] += 1
+
+
+def install_query_recorder(connection, **kwargs):
+    """
+    Add the query recorder to a connection's execute wrappers.
+
+    Connected to ``connection_created`` so that every connection, in
+    every thread, reports into the current request's stats.
+
+    Args:
+        connection (BaseDatabaseWrapper): The database connection.
+    """
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class TimedTemplate(Template):
+    """A Django template that adds its render time to the request's stats."""
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None or stats.template_depth:
+            return super().render(context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.template_depth -= 1
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times recorded per request."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class Histogram:
+    """
+    A cumulative histogram in the Prometheus style.
+
+    Attributes:
+        buckets (tuple): Upper bounds of the buckets, ascending.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Record one observation."""
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+# metric name -> (help text, buckets)
+HISTOGRAMS = {
+    "echopulse_request_duration_seconds": ("Total request latency.", LATENCY_BUCKETS),
+    "echopulse_db_duration_seconds": ("Time spent executing SQL per request.", LATENCY_BUCKETS),
+    "echopulse_db_queries": ("SQL queries per request.", QUERY_BUCKETS),
+    "echopulse_template_duration_seconds": ("Template render time per request.", LATENCY_BUCKETS),
+}
+
+COUNTERS = {
+    "echopulse_requests_total": "Measured requests.",
+    "echopulse_duplicate_queries_total": "Requests that repeated an identical query.",
+    "echopulse_budget_exceeded_total": "Requests over their view's query or latency budget.",
+    "echopulse_throttled_requests_total": "Password checks rejected or delayed by a throttle.",
+}
+
+
+class Registry:
+    """Thread-safe store of the histograms and counters, keyed by label values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Forget every observation."""
+        with self._lock:
+            self._histograms = {name: {} for name in HISTOGRAMS}
+            self._counters = {name: Counter() for name in COUNTERS}
+
+    def observe(self, name, labels, value):
+        """
+        Add ``value`` to the histogram ``name`` for ``labels``.
+
+        Args:
+            name (str): A key of :data:`HISTOGRAMS`.
+            labels (tuple): ``(label, value)`` pairs.
+            value (float): The observation.
+        """
+        with self._lock:
+            series = self._histograms[name]
+            if labels not in series:
+                series[labels] = Histogram(HISTOGRAMS[name][1])
+            series[labels].observe(value)
+
+    def increment(self, name, labels):
+        """
+        Increment the counter ``name`` for ``labels``.
+
+        Args:
+            name (str): A key of :data:`COUNTERS`.
+            labels (tuple): ``(label, value)`` pairs.
+        """
+        with self._lock:
+            self._counters[name][labels] += 1
+
+    def render(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics page.
+        """
+        lines = []
+        with self._lock:
+            for name, (help_text, _buckets) in HISTOGRAMS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for labels, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+            for name, help_text in COUNTERS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+registry = Registry()
+
+
+def render_metrics():
+    """
+    Return this process's metrics in the Prometheus text format.
+
+    Returns:
+        str: The metrics page.
+    """
+    return registry.render()
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    return match.view_name
+
+
+def _finish(request, response, stats, started, config):
+    total = time.perf_counter() - started
+    view = _view_name(request)
+    labels = (("view", view),)
+    registry.observe("echopulse_request_duration_seconds", labels, total)
+    registry.observe("echopulse_db_duration_seconds", labels, stats.sql_time)
+    registry.observe("echopulse_db_queries", labels, stats.queries)
+    registry.observe("echopulse_template_duration_seconds", labels, stats.template_time)
+    registry.increment("echopulse_requests_total", labels + (("status", response.status_code),))
+
+    duplicates = stats.duplicates(config["DUPLICATE_THRESHOLD"])
+    if duplicates:
+        registry.increment("echopulse_duplicate_queries_total", labels)
+        sql, count = duplicates[0]
+        logger.warning("%s ran the same query %d times (possible N+1): %s", view, count, sql)
+
+    budget = config["BUDGETS"].get(view, {})
+    if "queries" in budget and stats.queries > budget["queries"]:
+        registry.increment("echopulse_budget_exceeded_total", labels + (("budget", "queries"),))
+        logger.warning("%s ran %d queries (budget %d).", view, stats.queries, budget["queries"])
+    if "ms" in budget and total * 1000 > budget["ms"]:
+        registry.increment("echopulse_budget_exceeded_total", labels + (("budget", "ms"),))
+        logger.warning("%s took %.1fms (budget %sms).", view, total * 1000, budget["ms"])
+
+    if config["SERVER_TIMING"]:
+        response["Server-Timing"] = (
+            f'db;dur={stats.sql_time * 1000:.1f};desc="{stats.queries} queries", '
+            f"tpl;dur={stats.template_time * 1000:.1f}, "
+            f"total;dur={total * 1000:.1f}"
+        )
+    return response
+
+
+class InstrumentationMiddleware:
+    """
+    Measure a sample of requests and record them in :data:`registry`.
+
+    Configured by ``ECHOPULSE_INSTRUMENTATION``:
+
+    * ``ENABLED``: turn the middleware off entirely.
+    * ``SAMPLE_RATE``: fraction of requests measured, from 0 to 1.
+    * ``SERVER_TIMING``: add the ``Server-Timing`` header.
+    * ``DUPLICATE_THRESHOLD``: executions of one statement that count as N+1.
+    * ``BUDGETS``: per URL name, ``{"queries": int, "ms": float}``.
+    * ``METRICS_TOKEN``: bearer token for the metrics endpoint.
+
+    Unsampled requests pass straight through. Runs natively under both
+    WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self):
+        config = get_config()
+        if not config["ENABLED"] or random.random() >= config["SAMPLE_RATE"]:
+            return None, None
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        stats = RequestStats()
+        return config, (stats, _current.set(stats), time.perf_counter())
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        config, state = self._start()
+        if state is None:
+            return self.get_response(request)
+        stats, token, started = state
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, stats, started, config)
+
+    async def __acall__(self, request):
+        """
+        Measure a request on the async path.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The downstream response.
+        """
+        config, state = self._start()
+        if state is None:
+            return await self.get_response(request)
+        stats, token, started = state
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, stats, started, config)
@@ -0,0 +1,417 @@
+"""Server-sent events feed of event changes and live vote tallies.
+
+Fans keep the events page open through a show. Rather than reloading
+it, the page opens an ``EventSource`` on :func:`website.async_views.live_feed`
+and is pushed two kinds of messages:
+
+* ``events``: the events saved since the previous message, as a list of
+  ``{"id", "title", "date", "venue", "description"}``. An empty list
+  means events changed in a way that cannot be listed (a deletion, or
+  more than ``MAX_EVENTS`` changes at once) and the page should reload.
+* ``votes``: album ID to live vote count, for the albums voted for
+  since the previous message.
+
+However many clients are connected, each process runs a single
+:class:`Broadcaster` task that polls once every ``POLL_INTERVAL``
+seconds. A poll reads the ``Event`` and ``FanVote`` data versions (see
+:mod:`website.cache`) and only queries the database when one of them
+moved. New messages are formatted once and kept in a short, bounded
+history; every waiting client is woken through one shared future and
+writes the frames it has not sent yet. A client costs a suspended
+coroutine, not a queue or a thread, so an idle connection takes a few
+kilobytes and one worker can hold ``MAX_CLIENTS`` of them.
+
+Message IDs let a reconnecting ``EventSource`` resume from the history
+with ``Last-Event-ID``; a client that missed more than the history
+holds gets a ``reload`` message instead. Streams are closed after
+``MAX_AGE`` seconds and the browser reconnects: Django does not notice
+a client that went away mid-stream, so this bounds how long an
+abandoned stream is kept.
+
+``BACKEND`` picks where the messages come from:
+
+* :class:`LocalBackend` (the default) polls in-process. Each worker
+  polls on its own, so message IDs differ between workers.
+* :class:`CacheBackend` publishes through the shared cache named by
+  ``ECHOPULSE_PAGE_CACHE["SHARED_ALIAS"]``. One process holds a lease
+  and polls the database; every process reads the published messages
+  with one cache read per tick, and message IDs are the same on every
+  worker.
+
+The feed needs the ASGI server (:mod:`echopulse.asgi`). Under WSGI the
+view answers ``204 No Content``, which tells the browser not to retry.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from website import voting
+from website.cache import data_versions, shared_cache
+from website.models import Event, FanVote
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "POLL_INTERVAL": 1.0,
+    "HEARTBEAT": 15.0,
+    "MAX_AGE": 300.0,
+    "RETRY": 3000,
+    "MAX_CLIENTS": 10000,
+    "HISTORY": 256,
+    "MAX_EVENTS": 50,
+    "BACKEND": "website.live.LocalBackend",
+}
+
+KEY_PREFIX = "echopulse:live:"
+LEADER_KEY = KEY_PREFIX + "leader"
+STATE_KEY = KEY_PREFIX + "state"
+SEQ_KEY = KEY_PREFIX + "seq"
+MESSAGE_KEY_PREFIX = KEY_PREFIX + "message:"
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def get_config():
+    """
+    Return the live feed configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_LIVE`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_LIVE", {})}
+
+
+def frame(seq, event, data):
+    """
+    Format one server-sent event.
+
+    Args:
+        seq (int): The message ID, or None for none.
+        event (str): The event name.
+        data (object): The payload, encoded as JSON.
+
+    Returns:
+        bytes: The encoded frame.
+    """
+    head = f"id: {seq}\n" if seq is not None else ""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return f"{head}event: {event}\ndata: {payload}\n\n".encode()
+
+
+class ChangeFeed:
+    """
+    Turns model changes into feed messages.
+
+    Attributes:
+        state (dict): The data versions and watermarks seen so far, or
+            None before the first poll. Plain data, so that
+            :class:`CacheBackend` can hand it to the next lease holder.
+    """
+
+    LABELS = (Event._meta.label, FanVote._meta.label)
+
+    def __init__(self):
+        self.state = None
+
+    def poll(self):
+        """
+        Return the messages for the changes since the previous poll.
+
+        The first poll only records where the feed starts.
+
+        Returns:
+            list: ``(event, data)`` pairs.
+        """
+        event_version, vote_version = data_versions.get_many(self.LABELS)
+        if self.state is None:
+            self.state = {
+                "versions": [event_version, vote_version],
+                "events": Event.objects.count(),
+                "events_since": timezone.now(),
+                "votes_since": FanVote.objects.aggregate(last=Max("id"))["last"] or 0,
+            }
+            return []
+        messages = []
+        if event_version != self.state["versions"][0]:
+            events = self._events()
+            if events is not None:
+                messages.append(("events", events))
+        if vote_version != self.state["versions"][1]:
+            tallies = self._tallies()
+            if tallies:
+                messages.append(("votes", tallies))
+        self.state["versions"] = [event_version, vote_version]
+        return messages
+
+    def _events(self):
+        # A version bump can come before its transaction commits, so only
+        # a later updated_at or a lower count counts as a change.
+        limit = get_config()["MAX_EVENTS"]
+        summary = Event.objects.aggregate(count=Count("id"), last=Max("updated_at"))
+        deleted = summary["count"] < self.state["events"]
+        self.state["events"] = summary["count"]
+        if summary["last"] is None or summary["last"] <= self.state["events_since"]:
+            return [] if deleted else None
+        changed = [
+            {
+                "id": event.id,
+                "title": event.title,
+                "date": event.date,
+                "venue": str(event.venue),
+                "description": event.description,
+            }
+            for event in Event.objects.filter(updated_at__gt=self.state["events_since"])
+            .order_by("updated_at", "id")[:limit + 1]
+        ]
+        self.state["events_since"] = summary["last"]
+        if deleted or len(changed) > limit:
+            return []
+        return changed
+
+    def _tallies(self):
+        # Only albums with votes flushed since the previous tally get one.
+        voted = dict(
+            FanVote.objects.filter(id__gt=self.state["votes_since"])
+            .order_by()
+            .values_list("album_id")
+            .annotate(last=Max("id"))
+        )
+        if not voted:
+            return {}
+        self.state["votes_since"] = max(voted.values())
+        return {str(album_id): votes for album_id, votes in voting.live_tallies(voted).items()}
+
+
+class LocalBackend:
+    """
+    Polls for changes in this process.
+
+    IDs start from the clock, so that a browser resuming from a previous
+    process is told to reload instead of being sent the wrong messages.
+    """
+
+    def __init__(self):
+        self.feed = ChangeFeed()
+        self.seq = int(time.time() * 1000)
+
+    def receive(self):
+        """
+        Poll once.
+
+        Returns:
+            list: New ``(seq, event, data)`` messages.
+        """
+        messages = []
+        for event, data in self.feed.poll():
+            self.seq += 1
+            messages.append((self.seq, event, data))
+        return messages
+
+
+class CacheBackend:
+    """
+    Shares one process's polls with every process through the shared cache.
+
+    The process holding the ``leader`` key polls the database and stores
+    each message under its own key, numbered by an ``incr`` counter. The
+    lease runs out if its holder stops, and the next process to find the
+    key gone takes over with the feed state the previous holder stored.
+
+    Raises:
+        ImproperlyConfigured: If no shared cache is configured.
+    """
+
+    def __init__(self):
+        self.cache = shared_cache()
+        if self.cache is None:
+            raise ImproperlyConfigured("website.live.CacheBackend needs ECHOPULSE_PAGE_CACHE['SHARED_ALIAS'].")
+        self.feed = ChangeFeed()
+        self.token = uuid.uuid4().hex
+        self.seen = None
+
+    def receive(self):
+        """
+        Poll once, publishing first if this process holds the lease.
+
+        Returns:
+            list: New ``(seq, event, data)`` messages.
+        """
+        config = get_config()
+        lease = max(5.0, config["POLL_INTERVAL"] * 5)
+        found = self.cache.get_many([LEADER_KEY, SEQ_KEY])
+        leader = found.get(LEADER_KEY)
+        if leader is None and self.cache.add(LEADER_KEY, self.token, lease):
+            leader = self.token
+            self.feed.state = self.cache.get(STATE_KEY)
+        if leader == self.token:
+            self.cache.set(LEADER_KEY, self.token, lease)
+            found[SEQ_KEY] = self._publish(self.feed.poll(), lease, config["HISTORY"])
+        latest = found.get(SEQ_KEY)
+        if latest is None:
+            return []
+        if self.seen is None or self.seen > latest:
+            self.seen = latest
+            return []
+        first = max(self.seen + 1, latest - config["HISTORY"] + 1)
+        stored = self.cache.get_many([f"{MESSAGE_KEY_PREFIX}{seq}" for seq in range(first, latest + 1)])
+        self.seen = latest
+        messages = []
+        for seq in range(first, latest + 1):
+            message = stored.get(f"{MESSAGE_KEY_PREFIX}{seq}")
+            if message is not None:
+                messages.append((seq, *message))
+        return messages
+
+    def _publish(self, messages, lease, history):
+        self.cache.add(SEQ_KEY, int(time.time() * 1000), timeout=None)
+        for event, data in messages:
+            seq = self.cache.incr(SEQ_KEY)
+            # Kept long enough for every process to read it at least once.
+            self.cache.set(f"{MESSAGE_KEY_PREFIX}{seq}", (event, data), lease * 2)
+        if self.feed.state is not None:
+            self.cache.set(STATE_KEY, self.feed.state, timeout=None)
+        return self.cache.get(SEQ_KEY)
+
+
+class Broadcaster:
+    """
+    Fans one process's feed messages out to its connected clients.
+
+    The poll task runs only while at least one client is connected.
+    State is bound to the running event loop and starts over if a new
+    loop uses the broadcaster (each test runs in its own loop).
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._loop = None
+
+    @property
+    def clients(self):
+        """int: The number of open streams."""
+        return self._clients if self._loop is not None else 0
+
+    def backend(self):
+        """
+        Return this process's backend, creating it on first use.
+
+        Returns:
+            LocalBackend or CacheBackend: The configured ``BACKEND``.
+        """
+        if self._backend is None:
+            self._backend = import_string(get_config()["BACKEND"])()
+        return self._backend
+
+    def reset(self):
+        """Forget the backend and every loop-bound structure."""
+        self._backend = None
+        self._loop = None
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._clients = 0
+            self._task = None
+            self._history = deque(maxlen=get_config()["HISTORY"])
+            self._latest = None
+            self._wakeup = loop.create_future()
+
+    def _receive(self):
+        try:
+            return self.backend().receive()
+        finally:
+            close_old_connections()
+
+    async def _run(self):
+        receive = sync_to_async(self._receive)
+        while self._clients:
+            try:
+                messages = await receive()
+            except Exception:
+                logger.exception("Polling the live feed failed.")
+                messages = []
+            if messages:
+                self.publish(messages)
+            await asyncio.sleep(get_config()["POLL_INTERVAL"])
+        self._task = None
+
+    def publish(self, messages):
+        """
+        Add messages to the history and wake every waiting client.
+
+        Args:
+            messages (list): ``(seq, event, data)`` tuples in ID order.
+        """
+        self._bind()
+        for seq, event, data in messages:
+            self._history.append((seq, frame(seq, event, data)))
+            self._latest = seq
+        wakeup, self._wakeup = self._wakeup, self._loop.create_future()
+        wakeup.set_result(None)
+
+    def _since(self, cursor):
+        # Returns the frames after ``cursor`` and the new cursor. None
+        # means "from when the client connected".
+        if not self._history:
+            return [], cursor
+        first, latest = self._history[0][0], self._latest
+        if cursor is None:
+            return [encoded for _seq, encoded in self._history], latest
+        if cursor == latest:
+            return [], cursor
+        if cursor > latest or cursor < first - 1:
+            return [frame(None, "reload", {})], latest
+        return [encoded for seq, encoded in self._history if seq > cursor], latest
+
+    async def stream(self, last_event_id=None):
+        """
+        Yield one client's stream until ``MAX_AGE`` runs out.
+
+        Args:
+            last_event_id (int): The ID the client last received, if
+                it is reconnecting.
+
+        Yields:
+            bytes: Frames, joined per wake-up, and keepalive comments.
+        """
+        config = get_config()
+        self._bind()
+        self._clients += 1
+        if self._task is None:
+            self._task = self._loop.create_task(self._run())
+        cursor = last_event_id if last_event_id is not None else self._latest
+        deadline = self._loop.time() + config["MAX_AGE"]
+        try:
+            yield f"retry: {config['RETRY']}\n\n".encode()
+            while True:
+                wakeup = self._wakeup
+                frames, cursor = self._since(cursor)
+                if frames:
+                    yield b"".join(frames)
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    return
+                if not frames:
+                    done, _pending = await asyncio.wait([wakeup], timeout=min(config["HEARTBEAT"], remaining))
+                    if not done:
+                        yield KEEPALIVE
+        finally:
+            self._clients -= 1
+
+
+broadcaster = Broadcaster()
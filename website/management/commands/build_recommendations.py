@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from website import recommendations
+
+
+class Command(BaseCommand):
+    """
+    Precompute the "fans also liked" album recommendations.
+
+    Incremental by default: only albums sharing a fan with a favorite
+    added since the previous run are recomputed. Run it every few minutes
+    from cron, and with ``--full`` nightly to pick up removed favorites.
+    """
+
+    help = "Build album recommendations from users' favorites."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rebuild every album, not just the changed ones.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        run = recommendations.build(full=options["full"])
+        kind = "Full" if run.full else "Incremental"
+        self.stdout.write(self.style.SUCCESS(
+            f"{kind} build updated {run.albums_changed} albums in {time.monotonic() - started:.1f}s "
+            f"(favorites up to #{run.last_favorite_id})."
+        ))
@@ -0,0 +1,299 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from website import search, venues
+from website.cache import data_versions
+from website.models import Album, Event
+
+
+# model name -> (model, natural key, importable fields). An event's venue
+# is given as text ("Name, City, Country"), or as a name with optional
+# "city" and "country" columns, and is matched to a Venue row.
+CATALOG = {
+    "event": (Event, ("title", "date", "venue"), ("title", "date", "venue", "description")),
+    "album": (Album, ("title", "artist"), ("title", "artist", "release_date", "genre", "cover_url")),
+}
+
+FORMATS = ("csv", "json", "ndjson")
+
+
+class MalformedRecord(ValueError):
+    """A record that could not be parsed; it is reported and skipped."""
+
+
+def iter_csv(handle):
+    """Yield ``(line, dict)`` for each CSV data row."""
+    reader = csv.DictReader(handle)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_ndjson(handle):
+    """Yield ``(line, dict)`` for each non-blank NDJSON line, or a MalformedRecord for bad JSON."""
+    for number, line in enumerate(handle, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield number, MalformedRecord(f"invalid JSON: {exc.msg} (column {exc.colno})")
+
+
+def _element_end(buffer):
+    # Index of the comma or bracket closing the array element at the
+    # start of buffer, or None if the element continues past the buffer.
+    depth = 0
+    in_string = escaped = False
+    for index, char in enumerate(buffer):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            if depth == 0:
+                return index
+            depth -= 1
+        elif char == "," and depth == 0:
+            return index
+    return None
+
+
+def iter_json_array(handle, chunk_size=1 << 16):
+    """
+    Yield the elements of a top-level JSON array without loading it whole.
+
+    A malformed element is yielded as a MalformedRecord and reading goes
+    on after it; an element that never ends stops the import there.
+
+    Args:
+        handle (file): A text file positioned at the start of the array.
+        chunk_size (int): Number of characters read at a time.
+
+    Yields:
+        tuple: ``(line, element)``, with the line the element starts on.
+    """
+    decoder = json.JSONDecoder()
+    buffer = handle.read(chunk_size)
+    line = 1 + buffer[:len(buffer) - len(buffer.lstrip())].count("\n")
+    buffer = buffer.lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("JSON input must be an array of objects.")
+    buffer = buffer[1:]
+    while True:
+        stripped = buffer.lstrip().lstrip(",").lstrip()
+        line += buffer[:len(buffer) - len(stripped)].count("\n")
+        buffer = stripped
+        if buffer.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as exc:
+            # Only scan for the element's end once decoding failed, so
+            # well-formed input keeps the fast path.
+            end = _element_end(buffer)
+            if end is None:
+                chunk = handle.read(chunk_size)
+                if chunk:
+                    buffer += chunk
+                    continue
+                if not buffer:
+                    raise ValueError("JSON array is not closed.") from exc
+                yield line, MalformedRecord(f"invalid JSON: {exc.msg}; the rest of the file is skipped")
+                return
+            yield line, MalformedRecord(f"invalid JSON: {exc.msg}")
+            line += buffer[:end].count("\n")
+            buffer = buffer[end:]
+            continue
+        yield line, item
+        line += buffer[:end].count("\n")
+        buffer = buffer[end:]
+        if len(buffer) < chunk_size:
+            buffer += handle.read(chunk_size)
+
+
+READERS = {
+    "csv": iter_csv,
+    "json": iter_json_array,
+    "ndjson": iter_ndjson,
+}
+
+
+class Command(BaseCommand):
+    """
+    Stream a CSV, JSON or NDJSON file of events or albums into the catalog.
+
+    Rows are validated field by field, de-duplicated on the model's natural
+    key and upserted in batches with ``bulk_create(update_conflicts=True)``,
+    one transaction per batch. Memory use is bounded by the batch size.
+    Invalid rows, including malformed JSON records, are reported with
+    their line number and skipped. Each distinct event venue is
+    looked up, or created, once per import.
+    """
+
+    help = "Bulk import events or albums from a CSV, JSON or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import.")
+        parser.add_argument("--model", required=True, choices=sorted(CATALOG), help="What the file contains.")
+        parser.add_argument("--format", choices=FORMATS, help="File format. Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per upsert batch.")
+        parser.add_argument(
+            "--skip-search-index",
+            action="store_true",
+            help="Do not update the search index (run rebuild_search_index later).",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        file_format = options["format"] or path.suffix.lstrip(".").lower()
+        if file_format not in FORMATS:
+            raise CommandError(f"Cannot infer the format of {path}; pass --format.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        model, natural_key, fields = CATALOG[options["model"]]
+
+        started = time.monotonic()
+        imported = skipped = 0
+        batch = {}
+        key_attnames = [model._meta.get_field(name).attname for name in natural_key]
+        self.venues = venues.VenueResolver()
+        self.index_search = not options["skip_search_index"] and search.is_available()
+        try:
+            with path.open(newline="", encoding="utf-8") as handle:
+                for number, row in READERS[file_format](handle):
+                    obj = self.build(model, fields, row, number)
+                    if obj is None:
+                        skipped += 1
+                        continue
+                    # Later rows win over earlier rows with the same natural key.
+                    batch[tuple(getattr(obj, name) for name in key_attnames)] = obj
+                    if len(batch) >= options["batch_size"]:
+                        imported += self.flush(model, natural_key, fields, batch)
+                        self.report(imported, started)
+                imported += self.flush(model, natural_key, fields, batch)
+        except (OSError, ValueError, csv.Error) as exc:
+            raise CommandError(f"Could not read {path}: {exc}") from exc
+
+        data_versions.bump(model._meta.label)
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} {model._meta.verbose_name_plural} "
+            f"({skipped} skipped) in {elapsed:.1f}s, {imported / elapsed:.0f} rows/sec."
+        ))
+
+    def build(self, model, fields, row, number):
+        """
+        Validate one input row and return an unsaved model instance.
+
+        Args:
+            model (Model): Event or Album.
+            fields (tuple): The importable field names.
+            row (dict): The raw input row, or the MalformedRecord read in its place.
+            number (int): The line the row starts on, for error messages.
+
+        Returns:
+            Model: The instance, or None if the row is invalid.
+        """
+        if isinstance(row, MalformedRecord):
+            self.stderr.write(f"Line {number}: {row}.")
+            return None
+        if not isinstance(row, dict):
+            self.stderr.write(f"Line {number}: expected an object, got {type(row).__name__}.")
+            return None
+        values = {name: row.get(name) or "" for name in fields}
+        venue = values.pop("venue", None)
+        obj = model(**values)
+        try:
+            # The venue is resolved below rather than validated as a
+            # foreign key, which would cost a query per row.
+            obj.clean_fields(exclude=[f.name for f in model._meta.fields if f.name not in values])
+            if model is Event:
+                obj.venue_id = self.resolve_venue(venue, row)
+        except ValidationError as exc:
+            self.stderr.write(f"Line {number}: {'; '.join(f'{k}: {v[0]}' for k, v in exc.message_dict.items())}")
+            return None
+        if isinstance(obj, Event) and timezone.is_naive(obj.date):
+            obj.date = timezone.make_aware(obj.date)
+        return obj
+
+    def resolve_venue(self, text, row):
+        """
+        Return the ID of an event row's venue, creating the venue if needed.
+
+        Args:
+            text (str): The row's ``venue`` value.
+            row (dict): The raw input row, for its ``city`` and ``country``.
+
+        Returns:
+            int: The venue's primary key.
+
+        Raises:
+            ValidationError: If the row names no venue, or too long a one.
+        """
+        if row.get("city"):
+            name, city, country = (" ".join(str(row.get(key) or "").split()) for key in ("venue", "city", "country"))
+        else:
+            name, city, country = venues.parse(str(text))
+        if not name:
+            raise ValidationError({"venue": ["This field cannot be blank."]})
+        if max(len(name), len(city), len(country)) > 100:
+            raise ValidationError({"venue": ["Venue names, cities and countries have at most 100 characters."]})
+        return self.venues.resolve(name, city, country)
+
+    def flush(self, model, natural_key, fields, batch):
+        """
+        Upsert and clear a batch of instances.
+
+        Args:
+            model (Model): Event or Album.
+            natural_key (tuple): The unique fields identifying a row.
+            fields (tuple): The importable field names.
+            batch (dict): Instances keyed by natural key.
+
+        Returns:
+            int: The number of rows written.
+        """
+        if not batch:
+            return 0
+        update_fields = [name for name in fields if name not in natural_key] + ["updated_at"]
+        started = timezone.now()
+        with transaction.atomic():
+            model.objects.bulk_create(
+                batch.values(),
+                batch_size=len(batch),
+                update_conflicts=True,
+                unique_fields=natural_key,
+                update_fields=update_fields,
+            )
+            if self.index_search:
+                # bulk_create() bypasses the post_save receivers, and does not
+                # return primary keys for upserts, so re-read the batch. Every
+                # row it wrote has just had updated_at set, and the column is
+                # indexed, so the read stays proportional to the batch.
+                key_attnames = [model._meta.get_field(name).attname for name in natural_key]
+                saved = model.objects.filter(updated_at__gte=started)
+                search.index_objects(
+                    obj for obj in saved
+                    if tuple(getattr(obj, name) for name in key_attnames) in batch
+                )
+        written = len(batch)
+        batch.clear()
+        return written
+
+    def report(self, imported, started):
+        """Write a progress line with the running throughput."""
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(f"{imported} rows, {imported / elapsed:.0f} rows/sec")
@@ -0,0 +1,82 @@
+import pstats
+from collections import Counter
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from website import profiling
+
+
+class Command(BaseCommand):
+    """
+    List and summarize request profiles captured by ProfilingMiddleware.
+
+    ``profiles list`` shows the captures, newest first. ``profiles show
+    NAME`` prints the slowest functions from the cProfile stats and the
+    hottest sampled frames. ``profiles token`` prints a signed token that
+    triggers profiling through the ``X-Profile-Token`` header or the
+    ``_profile`` query parameter.
+    """
+
+    help = "List, summarize and trigger request profiles."
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest="action", required=True)
+        listing = actions.add_parser("list", help="List captured profiles.")
+        listing.add_argument("--view", help="Only captures of this URL name.")
+        listing.add_argument("--limit", type=int, default=20, help="Number of captures to show.")
+        show = actions.add_parser("show", help="Summarize one capture.")
+        show.add_argument("name", help="Capture name, as listed or sent in the X-Profile header.")
+        show.add_argument("--top", type=int, default=25, help="Number of functions and frames to show.")
+        show.add_argument("--sort", default="cumulative", help="pstats sort key for the cProfile table.")
+        token = actions.add_parser("token", help="Print a token that triggers profiling.")
+        token.add_argument("--path", help="Only profile requests for this path.")
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def handle_list(self, options):
+        captures = [
+            capture for capture in profiling.list_captures()
+            if options["view"] in (None, capture["view"])
+        ][:options["limit"]]
+        if not captures:
+            self.stdout.write(f"No profiles in {profiling.profile_directory()}.")
+            return
+        for capture in captures:
+            self.stdout.write(
+                f"{capture['name']}  {capture['method']} {capture['path']}  "
+                f"{capture['status']}  {capture['duration_ms']}ms  {capture['profiler']}"
+            )
+
+    def handle_show(self, options):
+        directory = profiling.profile_directory()
+        name = options["name"]
+        if not (directory / f"{name}.json").exists():
+            raise CommandError(f"No profile named {name} in {directory}.")
+
+        prof = directory / f"{name}.prof"
+        if prof.exists():
+            output = StringIO()
+            stats = pstats.Stats(str(prof), stream=output)
+            try:
+                stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["top"])
+            except KeyError as exc:
+                raise CommandError(f"Unknown sort key {options['sort']!r}.") from exc
+            self.stdout.write(output.getvalue())
+
+        self_samples = Counter()
+        total = 0
+        for line in (directory / f"{name}.collapsed").read_text().splitlines():
+            stack, _, count = line.rpartition(" ")
+            self_samples[stack.rsplit(";", 1)[-1]] += int(count)
+            total += int(count)
+        if not total:
+            self.stdout.write("No stack samples; the request finished within one sampling interval.")
+            return
+        self.stdout.write(f"Hottest frames ({total} samples):")
+        for frame, count in self_samples.most_common(options["top"]):
+            self.stdout.write(f"{count / total:7.1%}  {frame}")
+
+    def handle_token(self, options):
+        self.stdout.write(profiling.make_token(options["path"]))
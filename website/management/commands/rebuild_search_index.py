@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from website import search
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the full-text search index from the Event and Album tables.
+
+    Use after bulk loads that bypass model signals, or to repair drift.
+    """
+
+    help = "Rebuild the full-text search index for events and albums."
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError(
+                "This database has no search index. Full-text search needs "
+                "SQLite with FTS5 or PostgreSQL; run migrate first."
+            )
+        with transaction.atomic():
+            total = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} events and albums."))
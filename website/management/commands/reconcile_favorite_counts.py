@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from website.favorites import reconcile_counts
+
+
+class Command(BaseCommand):
+    """
+    Recompute Album.favorite_count from UserFavoriteAlbum and repair drift.
+
+    Safe to run while the site is live, e.g. nightly from cron.
+    """
+
+    help = "Repair drifted album favorite counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Albums checked per batch.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        repaired = reconcile_counts(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} album favorite counters."))
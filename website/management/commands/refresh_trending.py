@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from website import trending
+
+
+class Command(BaseCommand):
+    """
+    Refresh the materialized "trending now" rankings.
+
+    Applies the activity since the previous refresh; run it from cron
+    every minute or so, and with ``--full`` nightly to drop favorites
+    that were removed since.
+    """
+
+    help = "Refresh the trending album and event rankings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rebuild the rankings from scratch.")
+        parser.add_argument("--window", action="append", dest="windows", metavar="NAME", help="Only this window.")
+
+    def handle(self, *args, **options):
+        configured = trending.get_config()["WINDOWS"]
+        unknown = sorted(set(options["windows"] or ()) - set(configured))
+        if unknown:
+            raise CommandError(f"Unknown window(s): {', '.join(unknown)}. Configured: {', '.join(configured)}.")
+        for name, written in trending.refresh(full=options["full"], windows=options["windows"]).items():
+            self.stdout.write(self.style.SUCCESS(f"{name}: {written} rankings updated."))
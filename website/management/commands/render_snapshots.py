@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from website import snapshots
+
+
+class Command(BaseCommand):
+    """
+    Render the public pages to pre-compressed static snapshots.
+
+    Writes a new generation of every page in ``ECHOPULSE_SNAPSHOTS["PAGES"]``
+    and switches the site over to it. Run it after deploys and catalog
+    imports; edits made through the ORM re-render the snapshots by
+    themselves.
+    """
+
+    help = "Render the public pages to static snapshots served by WhiteNoise."
+
+    def handle(self, *args, **options):
+        if not snapshots.get_config()["ENABLED"]:
+            self.stderr.write(self.style.WARNING(
+                "Snapshots are disabled; set ECHOPULSE_SNAPSHOTS=1 to serve them."
+            ))
+        results = snapshots.render()
+        for name, result in results.items():
+            if isinstance(result, int):
+                self.stdout.write(self.style.SUCCESS(f"{name}: {result} bytes."))
+            else:
+                self.stdout.write(f"{name}: skipped, {result}.")
+        self.stdout.write(f"Serving generation {snapshots.current_generation()} from {snapshots.snapshot_directory()}.")
@@ -0,0 +1,103 @@
+import json
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from website import benchmark, instrumentation
+from website.models import Album, Event
+
+
+class Command(BaseCommand):
+    """
+    Measure throughput and latency percentiles of every route.
+
+    Starts a local WSGI server (or, with ``--server asgi``, uvicorn) on
+    a free port, drives each route from ``--concurrency`` client threads
+    and writes a JSON report to stdout or ``--output``. ``--url`` measures
+    an already running server instead. Seed data first with
+    ``manage.py seed_bench``; pages are measured as anonymous users see
+    them, so the page cache is part of what is measured.
+
+    The command fails if a route exceeds its budget in
+    ``ECHOPULSE_INSTRUMENTATION["BUDGETS"]``; the report is written first.
+    Query counts are read from the ``Server-Timing`` header, so a server
+    measured with ``--url`` needs ``SERVER_TIMING`` enabled for them.
+
+    Run ``--server asgi`` with ``ECHOPULSE_ASYNC_VIEWS=1`` to measure the
+    async views.
+    """
+
+    help = "Benchmark every route and report throughput and p50/p95/p99 latency as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi", help="Local server to start.")
+        parser.add_argument("--url", help="Benchmark this running server instead of starting one.")
+        parser.add_argument("--requests", type=int, default=200, help="Measured requests per route.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client threads.")
+        parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per route.")
+        parser.add_argument("--routes", nargs="+", metavar="NAME", help="Only these URL names.")
+        parser.add_argument("--output", help="Write the report to this file.")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1.")
+        routes, skipped = benchmark.discover_routes(options["routes"])
+        if not routes:
+            raise CommandError("No routes to benchmark.")
+
+        if options["url"]:
+            results = self.measure(options["url"].rstrip("/"), routes, options)
+        else:
+            with self.start_server(options["server"]) as server:
+                results = self.measure(server.base_url, routes, options)
+
+        report = {
+            "created": timezone.now().isoformat(),
+            "server": options["url"] or options["server"],
+            "async_views": settings.ECHOPULSE_ASYNC_VIEWS,
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "dataset": {"events": Event.objects.count(), "albums": Album.objects.count()},
+            "requests_per_route": options["requests"],
+            "concurrency": options["concurrency"],
+            "routes": results,
+            "skipped": skipped,
+            "budget_violations": benchmark.budget_violations(results, instrumentation.get_config()["BUDGETS"]),
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                handle.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+        else:
+            self.stdout.write(output)
+        if report["budget_violations"]:
+            raise CommandError("Over budget:\n" + "\n".join(report["budget_violations"]))
+
+    def start_server(self, kind):
+        if kind == "wsgi":
+            from echopulse.wsgi import application
+
+            return benchmark.WSGIBenchServer(application)
+        from django.core.asgi import get_asgi_application
+
+        try:
+            return benchmark.ASGIBenchServer(get_asgi_application())
+        except ImportError as exc:
+            raise CommandError("--server asgi needs uvicorn (pip install uvicorn).") from exc
+
+    def measure(self, base_url, routes, options):
+        results = {}
+        for name, paths in routes.items():
+            result = benchmark.run(
+                base_url, {name: paths}, options["requests"], options["concurrency"], options["warmup"]
+            )[name]
+            results[name] = result
+            self.stderr.write(
+                f"{name}: {result['throughput_rps']} req/s, p50 {result['p50_ms']}ms, "
+                f"p95 {result['p95_ms']}ms, p99 {result['p99_ms']}ms, {result['mean_bytes']} bytes"
+            )
+        return results
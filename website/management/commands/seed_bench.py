@@ -0,0 +1,224 @@
+import datetime
+import random
+import time
+from array import array
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from website import search
+from website.cache import data_versions
+from website.models import Album, Event, FanVote, UserFavoriteAlbum, Venue, venue_lookup_key
+
+
+EVENT_PREFIX = "Bench Event "
+VENUE_PREFIX = "Bench Venue "
+CITY_PREFIX = "Bench City "
+CITIES = 10
+ALBUM_PREFIX = "Bench Album "
+USER_PREFIX = "bench-user-"
+BENCH_PASSWORD = "bench-password"
+
+GENRES = (
+    "Rock", "Pop", "Hip-Hop", "Jazz", "Electronic", "Folk",
+    "Metal", "Classical", "R&B", "Country", "Reggae", "Punk",
+)
+
+
+class Command(BaseCommand):
+    """
+    Generate a deterministic synthetic catalog for benchmarks.
+
+    ``--scale N`` creates N events at N / 50 venues spread over ten cities,
+    N albums, N / 100 users (at least one) and about 2N favorites, skewed so that a few albums are very
+    popular. The same scale, seed and anchor date always produce the same
+    rows. Rows are written in batches and album and user IDs are held in
+    compact arrays, so scales up to 10M fit in memory.
+
+    Seeded rows are recognizable by their title, name and username prefixes;
+    ``--replace`` deletes them before seeding again.
+    """
+
+    help = "Create a deterministic synthetic dataset for benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=int, required=True, help="Events and albums to create.")
+        parser.add_argument("--seed", type=int, default=427, help="Random seed.")
+        parser.add_argument(
+            "--anchor",
+            type=datetime.date.fromisoformat,
+            help="Date events are spread around (YYYY-MM-DD). Defaults to today.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per insert batch.")
+        parser.add_argument("--replace", action="store_true", help="Delete previously seeded rows first.")
+        parser.add_argument(
+            "--skip-search-index",
+            action="store_true",
+            help="Do not rebuild the search index (run rebuild_search_index later).",
+        )
+
+    def handle(self, *args, **options):
+        scale = options["scale"]
+        if scale < 1:
+            raise CommandError("--scale must be at least 1.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        if options["replace"]:
+            self.delete_seeded()
+        elif Album.objects.filter(title__startswith=ALBUM_PREFIX).exists():
+            raise CommandError("Benchmark data already exists; pass --replace to recreate it.")
+
+        self.batch_size = options["batch_size"]
+        anchor = options["anchor"] or timezone.now().date()
+        self.anchor = timezone.make_aware(datetime.datetime.combine(anchor, datetime.time()), datetime.timezone.utc)
+        rng = random.Random(options["seed"])
+        started = time.monotonic()
+
+        self.seed_events(rng, scale)
+        album_ids = self.seed_albums(rng, scale)
+        user_ids = self.seed_users(max(1, scale // 100))
+        favorites = self.seed_favorites(rng, album_ids, user_ids, 2 * scale)
+        self.count_favorites()
+        if not options["skip_search_index"] and search.is_available():
+            search.rebuild()
+        data_versions.bump(Venue._meta.label)
+        data_versions.bump(Event._meta.label)
+        data_versions.bump(Album._meta.label)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {scale} events, {len(album_ids)} albums, {len(user_ids)} users and "
+            f"{favorites} favorites in {time.monotonic() - started:.1f}s."
+        ))
+
+    def delete_seeded(self):
+        """Delete every row created by an earlier run."""
+        users = User.objects.filter(username__startswith=USER_PREFIX)
+        with transaction.atomic():
+            # Remove the dependent rows in bulk, so the per-user counter
+            # release on User deletion has nothing left to do.
+            UserFavoriteAlbum.objects.filter(user__in=users).delete()
+            FanVote.objects.filter(user__in=users).delete()
+            users.delete()
+            Album.objects.filter(title__startswith=ALBUM_PREFIX).delete()
+            Event.objects.filter(title__startswith=EVENT_PREFIX).delete()
+            Venue.objects.filter(name__startswith=VENUE_PREFIX).delete()
+
+    def insert(self, model, rows):
+        """
+        Insert model instances in batches, one transaction per batch.
+
+        Args:
+            model (Model): The model to insert into.
+            rows (iterable): Unsaved instances.
+
+        Returns:
+            int: The number of rows inserted.
+        """
+        total = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                total += self.flush(model, batch)
+        return total + self.flush(model, batch)
+
+    def flush(self, model, batch):
+        """Write and clear one batch."""
+        if not batch:
+            return 0
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        written = len(batch)
+        batch.clear()
+        return written
+
+    def seed_venues(self, rng, count):
+        def rows():
+            for i in range(count):
+                name, city = f"{VENUE_PREFIX}{i}", f"{CITY_PREFIX}{i % CITIES}"
+                # bulk_create() does not call Venue.save(), which sets the keys.
+                yield Venue(
+                    name=name,
+                    city=city,
+                    name_key=venue_lookup_key(name),
+                    city_key=venue_lookup_key(city),
+                    latitude=round(rng.uniform(-60, 70), 6),
+                    longitude=round(rng.uniform(-180, 180), 6),
+                )
+
+        self.insert(Venue, rows())
+        return self.ids(Venue.objects.filter(name__startswith=VENUE_PREFIX))
+
+    def seed_events(self, rng, count):
+        venue_ids = self.seed_venues(rng, max(1, count // 50))
+
+        def rows():
+            for i in range(count):
+                offset = datetime.timedelta(days=rng.randint(-365, 365), hours=rng.randint(12, 23))
+                yield Event(
+                    title=f"{EVENT_PREFIX}{i}",
+                    date=self.anchor + offset,
+                    venue_id=venue_ids[rng.randrange(len(venue_ids))],
+                    description=f"Benchmark event {i} featuring {rng.choice(GENRES)} acts.",
+                )
+
+        self.insert(Event, rows())
+
+    def seed_albums(self, rng, count):
+        artists = max(1, count // 10)
+        anchor = self.anchor.date()
+
+        def rows():
+            for i in range(count):
+                yield Album(
+                    title=f"{ALBUM_PREFIX}{i}",
+                    artist=f"Bench Artist {rng.randrange(artists)}",
+                    release_date=anchor - datetime.timedelta(days=rng.randint(0, 365 * 30)),
+                    genre=rng.choice(GENRES),
+                )
+
+        self.insert(Album, rows())
+        return self.ids(Album.objects.filter(title__startswith=ALBUM_PREFIX))
+
+    def seed_users(self, count):
+        # Hashing is deliberately slow; every benchmark user shares one hash.
+        password = make_password(BENCH_PASSWORD)
+        self.insert(User, (User(username=f"{USER_PREFIX}{i}", password=password) for i in range(count)))
+        return self.ids(User.objects.filter(username__startswith=USER_PREFIX))
+
+    def seed_favorites(self, rng, album_ids, user_ids, count):
+        per_user = max(1, count // len(user_ids))
+
+        def rows():
+            for user_id in user_ids:
+                chosen = set()
+                for _ in range(min(rng.randint(0, 2 * per_user), len(album_ids))):
+                    # Cubing the draw piles favorites onto the low indexes,
+                    # giving a long-tailed popularity curve.
+                    chosen.add(album_ids[int(len(album_ids) * rng.random() ** 3)])
+                for album_id in sorted(chosen):
+                    yield UserFavoriteAlbum(user_id=user_id, album_id=album_id)
+
+        return self.insert(UserFavoriteAlbum, rows())
+
+    def count_favorites(self):
+        """Set the seeded albums' favorite counters with one UPDATE."""
+        totals = (
+            UserFavoriteAlbum.objects.filter(album=OuterRef("pk"))
+            .order_by()
+            .values("album")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        Album.objects.filter(title__startswith=ALBUM_PREFIX).update(
+            favorite_count=Coalesce(Subquery(totals), 0)
+        )
+
+    def ids(self, queryset):
+        """Return the queryset's primary keys, in order, as a compact array."""
+        return array("q", queryset.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=self.batch_size))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from website import newsletter
+from website.models import NewsletterIssue
+
+
+class Command(BaseCommand):
+    """
+    Queue a newsletter issue and deliver the waiting ones.
+
+    Delivery runs in the foreground, so the command also works as a
+    dedicated worker process run from cron. Issues queued from the admin
+    are delivered by the web process's background worker instead, unless
+    this command gets to them first.
+    """
+
+    help = "Queue a newsletter issue and deliver waiting issues to subscribers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subject", help="Queue a new issue with this subject.")
+        parser.add_argument("--body-file", help="File holding the new issue's text.")
+        parser.add_argument("--retry", type=int, metavar="ID", help="Queue a failed issue again.")
+        parser.add_argument("--queue-only", action="store_true", help="Queue, but leave delivery to a worker.")
+
+    def handle(self, *args, **options):
+        if options["subject"]:
+            if not options["body_file"]:
+                raise CommandError("--subject needs --body-file.")
+            with open(options["body_file"], encoding="utf-8") as body:
+                issue = newsletter.queue_issue(options["subject"], body.read())
+            self.stdout.write(f"Queued issue {issue.pk}.")
+        if options["retry"] is not None:
+            retried = NewsletterIssue.objects.filter(pk=options["retry"], status=NewsletterIssue.FAILED).update(
+                status=NewsletterIssue.QUEUED
+            )
+            if not retried:
+                raise CommandError(f"No failed issue with id {options['retry']}.")
+        if options["queue_only"]:
+            return
+        for issue in newsletter.work():
+            issue.refresh_from_db()
+            style = self.style.SUCCESS if issue.status == NewsletterIssue.SENT else self.style.ERROR
+            self.stdout.write(style(
+                f"Issue {issue.pk} {issue.status}: {issue.sent_count} sent, {issue.failed_count} refused."
+            ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from website import sqlite
+
+
+class Command(BaseCommand):
+    """
+    Optimize and checkpoint SQLite databases.
+
+    Runs ``PRAGMA optimize`` and a WAL checkpoint on every SQLite
+    database alias. The default ``TRUNCATE`` checkpoint waits for active
+    writers and then empties the ``-wal`` file, so run it from cron at a
+    quiet time, e.g. hourly.
+    """
+
+    help = "Run PRAGMA optimize and a WAL checkpoint on every SQLite database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode",
+            choices=("PASSIVE", "FULL", "RESTART", "TRUNCATE"),
+            default="TRUNCATE",
+            help="wal_checkpoint mode.",
+        )
+
+    def handle(self, *args, **options):
+        aliases = [alias for alias in connections if connections[alias].vendor == "sqlite"]
+        if not aliases:
+            raise CommandError("No SQLite databases are configured.")
+        for alias in aliases:
+            busy, wal_frames, checkpointed = sqlite.maintain(connections[alias], options["mode"])
+            if wal_frames == -1:
+                self.stdout.write(f"{alias}: optimized (not in WAL mode).")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{alias}: optimized, {checkpointed} of {wal_frames} WAL frames checkpointed"
+                    f"{' (busy)' if busy else ''}."
+                ))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0003_userfavoritealbum'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date', 'id'], name='website_event_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='cover_url',
+            field=models.URLField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['release_date', 'id'], name='website_album_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['title', 'id'], name='website_album_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['artist', 'release_date', 'id'], name='website_album_artist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['genre', 'release_date', 'id'], name='website_album_genre_idx'),
+        ),
+    ]
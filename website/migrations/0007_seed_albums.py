@@ -0,0 +1,45 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:12
+
+import datetime
+
+from django.db import migrations
+
+
+# The albums previously hard-coded in the album_list view.
+ALBUMS = [
+    ('Nevermind', 'Nirvana', datetime.date(1991, 9, 24), 'Grunge',
+     'https://upload.wikimedia.org/wikipedia/en/2/29/NirvanaNevermindalbumcover.jpg'),
+    ('OK Computer', 'Radiohead', datetime.date(1997, 5, 21), 'Alternative Rock',
+     'https://upload.wikimedia.org/wikipedia/en/e/e4/Radiohead.okcomputer.albumart.jpg'),
+    ('AM', 'Arctic Monkeys', datetime.date(2013, 9, 9), 'Indie Rock',
+     'https://upload.wikimedia.org/wikipedia/en/1/17/Arctic_Monkeys_-_AM.png'),
+    ('Absolution', 'Muse', datetime.date(2003, 9, 15), 'Alternative Rock',
+     'https://upload.wikimedia.org/wikipedia/en/e/e0/Muse_-_Absolution_cover.jpg'),
+    ('American Idiot', 'Green Day', datetime.date(2004, 9, 20), 'Punk Rock',
+     'https://upload.wikimedia.org/wikipedia/en/0/07/Green_Day_-_American_Idiot_album_cover.png'),
+    ('Hybrid Theory', 'Linkin Park', datetime.date(2000, 10, 24), 'Nu Metal',
+     'https://upload.wikimedia.org/wikipedia/en/f/fc/Linkin_Park_-_Hybrid_Theory_CD_cover.jpg'),
+]
+
+
+def seed_albums(apps, schema_editor):
+    """Load the starter catalog into an empty Album table."""
+    Album = apps.get_model('website', 'Album')
+    db_alias = schema_editor.connection.alias
+    if Album.objects.using(db_alias).exists():
+        return
+    Album.objects.using(db_alias).bulk_create([
+        Album(title=title, artist=artist, release_date=release_date, genre=genre, cover_url=cover_url)
+        for title, artist, release_date, genre, cover_url in ALBUMS
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0006_album_catalog'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_albums, migrations.RunPython.noop),
+    ]
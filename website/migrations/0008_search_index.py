@@ -0,0 +1,77 @@
+# Generated by Django 4.2.25 on 2026-10-18 09:40
+
+from django.db import migrations
+
+
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE website_search_index USING fts5(
+        kind UNINDEXED,
+        object_id UNINDEXED,
+        title,
+        body,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO website_search_index (rowid, kind, object_id, title, body)
+    SELECT id * 2, 'event', id, title, venue || ' ' || description FROM website_event
+    """,
+    """
+    INSERT INTO website_search_index (rowid, kind, object_id, title, body)
+    SELECT id * 2 + 1, 'album', id, title, artist || ' ' || genre FROM website_album
+    """,
+]
+
+POSTGRESQL_CREATE = [
+    """
+    CREATE TABLE website_search_index (
+        id bigint PRIMARY KEY,
+        kind varchar(10) NOT NULL,
+        object_id bigint NOT NULL,
+        title text NOT NULL,
+        body text NOT NULL,
+        document tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', title), 'A') ||
+            setweight(to_tsvector('simple', body), 'B')
+        ) STORED
+    )
+    """,
+    "CREATE INDEX website_search_index_document_idx ON website_search_index USING GIN (document)",
+    """
+    INSERT INTO website_search_index (id, kind, object_id, title, body)
+    SELECT id * 2, 'event', id, title, venue || ' ' || description FROM website_event
+    """,
+    """
+    INSERT INTO website_search_index (id, kind, object_id, title, body)
+    SELECT id * 2 + 1, 'album', id, title, artist || ' ' || genre FROM website_album
+    """,
+]
+
+
+def create_search_index(apps, schema_editor):
+    """Create and populate the full-text index for the current database."""
+    statements = {
+        'sqlite': SQLITE_CREATE,
+        'postgresql': POSTGRESQL_CREATE,
+    }.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    """Drop the full-text index, if this database has one."""
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS website_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0007_seed_albums'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
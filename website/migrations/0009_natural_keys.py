@@ -0,0 +1,73 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:15
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def _duplicates(model, natural_key):
+    """Yield ``(kept_id, duplicate_ids)`` for each natural key held by several rows."""
+    groups = (
+        model.objects.values(*natural_key)
+        .annotate(rows=Count('id'), kept=Min('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for group in groups.iterator():
+        key = {name: group[name] for name in natural_key}
+        duplicates = list(model.objects.filter(**key).exclude(id=group['kept']).values_list('id', flat=True))
+        yield group['kept'], duplicates
+
+
+def _drop_search_rows(schema_editor, kind, ids):
+    if ids and schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        placeholders = ', '.join(['%s'] * len(ids))
+        schema_editor.execute(
+            f'DELETE FROM website_search_index WHERE kind = %s AND object_id IN ({placeholders})',
+            [kind, *ids],
+        )
+
+
+def merge_duplicates(apps, schema_editor):
+    # The oldest row (lowest ID) of each natural key is kept. Favorites of
+    # the removed albums move to the kept album, unless the fan already
+    # has it as a favorite.
+    Album = apps.get_model('website', 'Album')
+    Event = apps.get_model('website', 'Event')
+    UserFavoriteAlbum = apps.get_model('website', 'UserFavoriteAlbum')
+
+    for kept, duplicates in _duplicates(Album, ('title', 'artist')):
+        fans = UserFavoriteAlbum.objects.filter(album_id=kept).values('user_id')
+        UserFavoriteAlbum.objects.filter(album_id__in=duplicates, user_id__in=fans).delete()
+        for user_id, album_id in (
+            UserFavoriteAlbum.objects.filter(album_id__in=duplicates)
+            .order_by('user_id', 'album_id')
+            .values_list('user_id', 'album_id')
+        ):
+            # A fan may have favorited several of the duplicates.
+            if not UserFavoriteAlbum.objects.filter(user_id=user_id, album_id=kept).exists():
+                UserFavoriteAlbum.objects.filter(user_id=user_id, album_id=album_id).update(album_id=kept)
+        Album.objects.filter(id__in=duplicates).delete()
+        _drop_search_rows(schema_editor, 'album', duplicates)
+
+    for kept, duplicates in _duplicates(Event, ('title', 'date', 'venue')):
+        Event.objects.filter(id__in=duplicates).delete()
+        _drop_search_rows(schema_editor, 'event', duplicates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='album',
+            constraint=models.UniqueConstraint(fields=('title', 'artist'), name='website_album_natural_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(fields=('title', 'date', 'venue'), name='website_event_natural_key'),
+        ),
+    ]
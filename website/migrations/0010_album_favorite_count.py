@@ -0,0 +1,41 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_favorite_counts(apps, schema_editor):
+    """Set each album's favorite_count from its existing favorites."""
+    Album = apps.get_model('website', 'Album')
+    UserFavoriteAlbum = apps.get_model('website', 'UserFavoriteAlbum')
+    db_alias = schema_editor.connection.alias
+    counts = (
+        UserFavoriteAlbum.objects.using(db_alias)
+        .filter(album=OuterRef('pk'))
+        .order_by()
+        .values('album')
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    Album.objects.using(db_alias).update(favorite_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0009_natural_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['favorite_count', 'id'], name='website_album_favorites_idx'),
+        ),
+        migrations.RunPython(backfill_favorite_counts, migrations.RunPython.noop),
+    ]
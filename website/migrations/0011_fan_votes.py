@@ -0,0 +1,46 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('website', '0010_album_favorite_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FanVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['vote_count', 'id'], name='website_album_votes_idx'),
+        ),
+        migrations.AddField(
+            model_name='fanvote',
+            name='album',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='website.album'),
+        ),
+        migrations.AddField(
+            model_name='fanvote',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='fanvote',
+            constraint=models.UniqueConstraint(fields=('user', 'album'), name='website_fanvote_once'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0011_fan_votes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+                ('full', models.BooleanField()),
+                ('last_favorite_id', models.BigIntegerField()),
+                ('albums_changed', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlbumRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('album', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='website.album')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_by', to='website.album')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='albumrecommendation',
+            constraint=models.UniqueConstraint(fields=('album', 'rank'), name='website_albumrecommendation_rank'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0012_album_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventInterest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('views', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrendingWindow',
+            fields=[
+                ('name', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('epoch', models.DateTimeField()),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userfavoritealbum',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='fanvote',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=10)),
+                ('window', models.CharField(max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=100)),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'window', '-score', 'object_id'], name='website_trending_rank_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='trendingscore',
+            constraint=models.UniqueConstraint(fields=('kind', 'window', 'object_id'), name='website_trending_object'),
+        ),
+        migrations.AddField(
+            model_name='eventinterest',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interest', to='website.event'),
+        ),
+    ]
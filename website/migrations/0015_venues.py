@@ -0,0 +1,145 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 500
+
+
+def split_venue(text):
+    """
+    Split a free-text venue into ``(name, city, country)``.
+
+    "Name", "Name, City" and "Name, City, Country" are recognized; with
+    more commas the extra leading parts stay in the name. Whitespace is
+    collapsed.
+    """
+    parts = [" ".join(part.split()) for part in (text or "").split(",")]
+    if len(parts) == 1:
+        return parts[0], "", ""
+    if len(parts) == 2:
+        return parts[0], parts[1], ""
+    return ", ".join(parts[:-2]), parts[-2], parts[-1]
+
+
+def _drop_search_rows(schema_editor, ids):
+    if ids and schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        placeholders = ", ".join(["%s"] * len(ids))
+        schema_editor.execute(
+            f"DELETE FROM website_search_index WHERE kind = 'event' AND object_id IN ({placeholders})", ids
+        )
+
+
+def link_venues(apps, schema_editor):
+    # One Venue per distinct (name, city), compared case-insensitively;
+    # the first spelling seen wins. Events whose venues differ only in
+    # spelling can then share a (title, date, venue) natural key: as in
+    # 0009, the oldest is kept and the others are merged into it.
+    Event = apps.get_model("website", "Event")
+    EventInterest = apps.get_model("website", "EventInterest")
+    Venue = apps.get_model("website", "Venue")
+    venues = {}
+    events_by_venue = defaultdict(list)
+    kept_events = {}
+    duplicates = defaultdict(list)
+    rows = Event.objects.order_by("id").values_list("id", "title", "date", "venue")
+    for event_id, title, date, text in rows.iterator(chunk_size=2000):
+        name, city, country = split_venue(text)
+        key = (name.casefold(), city.casefold())
+        if key not in venues:
+            venues[key] = Venue.objects.create(name=name, city=city, country=country).pk
+        kept = kept_events.setdefault((title, date, venues[key]), event_id)
+        if kept != event_id:
+            duplicates[kept].append(event_id)
+            continue
+        events_by_venue[venues[key]].append(event_id)
+    for kept, event_ids in duplicates.items():
+        EventInterest.objects.filter(event_id__in=event_ids).update(event_id=kept)
+        Event.objects.filter(id__in=event_ids).delete()
+        _drop_search_rows(schema_editor, event_ids)
+    for venue_id, event_ids in events_by_venue.items():
+        for start in range(0, len(event_ids), BATCH_SIZE):
+            Event.objects.filter(id__in=event_ids[start:start + BATCH_SIZE]).update(venue_ref=venue_id)
+
+
+def unlink_venues(apps, schema_editor):
+    Event = apps.get_model("website", "Event")
+    Venue = apps.get_model("website", "Venue")
+    for venue in Venue.objects.iterator():
+        text = ", ".join(part for part in (venue.name, venue.city, venue.country) if part)
+        Event.objects.filter(venue_ref=venue.pk).update(venue=text[:100])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0014_newsletter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Venue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('country', models.CharField(blank=True, max_length=100)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['city', 'name'], name='website_venue_city_idx'),
+                    models.Index(fields=['latitude', 'longitude'], name='website_venue_location_idx'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(fields=('name', 'city'), name='website_venue_name_city'),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='venue_ref',
+            field=models.ForeignKey(
+                db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='website.venue',
+            ),
+        ),
+        migrations.RunPython(link_venues, unlink_venues),
+        migrations.RemoveConstraint(
+            model_name='event',
+            name='website_event_natural_key',
+        ),
+        # Lets the reverse migration re-add the text column to existing
+        # rows (as blanks, filled in by unlink_venues).
+        migrations.AlterField(
+            model_name='event',
+            name='venue',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RemoveField(
+            model_name='event',
+            name='venue',
+        ),
+        migrations.RenameField(
+            model_name='event',
+            old_name='venue_ref',
+            new_name='venue',
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='venue',
+            field=models.ForeignKey(
+                db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='events', to='website.venue',
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(fields=('title', 'date', 'venue'), name='website_event_natural_key'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['venue', 'date', 'id'], name='website_event_venue_date_idx'),
+        ),
+    ]
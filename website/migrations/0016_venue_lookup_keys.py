@@ -0,0 +1,51 @@
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def lookup_key(text):
+    # As website.models.venue_lookup_key, which 0015 also matched on.
+    return " ".join(text.split()).casefold()
+
+
+def fill_lookup_keys(apps, schema_editor):
+    Venue = apps.get_model("website", "Venue")
+    batch = []
+    for venue in Venue.objects.order_by("id").iterator(chunk_size=2000):
+        venue.name_key, venue.city_key = lookup_key(venue.name), lookup_key(venue.city)
+        batch.append(venue)
+        if len(batch) >= BATCH_SIZE:
+            Venue.objects.bulk_update(batch, ["name_key", "city_key"])
+            batch = []
+    Venue.objects.bulk_update(batch, ["name_key", "city_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0015_venues'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venue',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=300),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='city_key',
+            field=models.CharField(blank=True, editable=False, max_length=300),
+        ),
+        migrations.RunPython(fill_lookup_keys, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='venue',
+            name='website_venue_city_idx',
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['city_key', 'name_key'], name='website_venue_city_key_idx'),
+        ),
+    ]
@@ -10,12 +10,40 @@ class Album(models.Model):
         artist (str): The name of the artist.
         release_date (date): The release date of the album.
         genre (str): The genre of the album.
+        cover_url (str): URL of the album cover image.
+        favorite_count (int): Denormalized number of users who favorited the album,
+            maintained by :mod:`website.favorites`.
+        vote_count (int): Denormalized number of fan votes for the album,
+            maintained by :mod:`website.voting`.
+        updated_at (datetime): When the album was last modified.
+
+    Meta:
+        constraints: (title, artist) is the album's natural key, used by catalog imports.
+        indexes: Composite indexes backing the catalog's keyset orderings,
+            alone and combined with the artist and genre filters.
     """
 
     title = models.CharField(max_length=100)
     artist = models.CharField(max_length=100)
     release_date = models.DateField()
     genre = models.CharField(max_length=50)
+    cover_url = models.URLField(blank=True)
+    favorite_count = models.PositiveIntegerField(default=0)
+    vote_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['title', 'artist'], name='website_album_natural_key'),
+        ]
+        indexes = [
+            models.Index(fields=['favorite_count', 'id'], name='website_album_favorites_idx'),
+            models.Index(fields=['vote_count', 'id'], name='website_album_votes_idx'),
+            models.Index(fields=['release_date', 'id'], name='website_album_release_idx'),
+            models.Index(fields=['title', 'id'], name='website_album_title_idx'),
+            models.Index(fields=['artist', 'release_date', 'id'], name='website_album_artist_idx'),
+            models.Index(fields=['genre', 'release_date', 'id'], name='website_album_genre_idx'),
+        ]
 
     def __str__(self):
         """
@@ -27,6 +55,86 @@ class Album(models.Model):
         return self.title
 
 
+def venue_lookup_key(text):
+    """
+    Return the form venue names and cities are matched on.
+
+    Args:
+        text (str): A venue name or city, as entered.
+
+    Returns:
+        str: The text with whitespace collapsed and case folded, so that
+        ``"Opera  House"`` and ``"opera house"`` match.
+    """
+    return " ".join(text.split()).casefold()
+
+
+class Venue(models.Model):
+    """
+    A place where events are held.
+
+    Attributes:
+        name (str): The venue's name.
+        city (str): The city it is in; blank if unknown.
+        country (str): The country it is in; blank if unknown.
+        latitude (float): Latitude in degrees, if known.
+        longitude (float): Longitude in degrees, if known.
+        updated_at (datetime): When the venue was last modified.
+        name_key (str): ``name`` as returned by :func:`venue_lookup_key`.
+        city_key (str): ``city`` as returned by :func:`venue_lookup_key`.
+
+    Meta:
+        constraints: (name, city) identifies a venue; free-text venues are
+            deduplicated on it.
+        indexes: (city_key, name_key) serves case-insensitive lookups by
+            city, or by city and name; (latitude, longitude) serves the
+            bounding box of nearby-event lookups.
+    """
+
+    name = models.CharField(max_length=100)
+    city = models.CharField(max_length=100, blank=True)
+    country = models.CharField(max_length=100, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Case folding can lengthen text, e.g. "ß" becomes "ss".
+    name_key = models.CharField(max_length=300, editable=False)
+    city_key = models.CharField(max_length=300, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'city'], name='website_venue_name_city'),
+        ]
+        indexes = [
+            models.Index(fields=['city_key', 'name_key'], name='website_venue_city_key_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='website_venue_location_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Save the venue, refreshing its lookup keys."""
+        self.name_key = venue_lookup_key(self.name)
+        self.city_key = venue_lookup_key(self.city)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'name_key', 'city_key'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        """
+        Returns the venue name, followed by its city if known.
+
+        Returns:
+            str: E.g. ``"Opera House, Sydney"``.
+        """
+        return f"{self.name}, {self.city}" if self.city else self.name
+
+
+class EventManager(models.Manager):
+    """Loads each event's venue with it: pages never show an event without one."""
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('venue')
+
+
 class Event(models.Model):
     """
     Represents a musical event.
@@ -34,14 +142,33 @@ class Event(models.Model):
     Attributes:
         title (str): The title of the event.
         date (datetime): The date and time of the event.
-        venue (str): The venue where the event is held.
+        venue (Venue): The venue where the event is held.
         description (str): A description of the event.
+        updated_at (datetime): When the event was last modified.
+
+    Meta:
+        constraints: (title, date, venue) is the event's natural key, used by catalog imports.
+        indexes: Composite (date, id) index backing the keyset-paginated event listing,
+            and (venue, date, id) for the same listing filtered by venue.
     """
 
     title = models.CharField(max_length=100)
     date = models.DateTimeField()
-    venue = models.CharField(max_length=100)
+    # Indexed by the (venue, date, id) index, which it leads.
+    venue = models.ForeignKey(Venue, on_delete=models.PROTECT, related_name='events', db_index=False)
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = EventManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['title', 'date', 'venue'], name='website_event_natural_key'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'id'], name='website_event_date_id_idx'),
+            models.Index(fields=['venue', 'date', 'id'], name='website_event_venue_date_idx'),
+        ]
 
     def __str__(self):
         """
@@ -57,9 +184,14 @@ class UserFavoriteAlbum(models.Model):
     """
     Represents a user's favorite album relationship.
 
+    Favorites should be added and removed through :mod:`website.favorites`,
+    which keeps ``Album.favorite_count`` in step.
+
     Attributes:
         user (User): The user who favorited the album.
         album (Album): The album that is favorited by the user.
+        created_at (datetime): When the album was favorited; unknown (None)
+            for favorites added before it was recorded.
 
     Meta:
         unique_together: Ensures a user cannot favorite the same album more than once.
@@ -67,6 +199,224 @@ class UserFavoriteAlbum(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorite_albums')
     album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='favorited_by')
+    created_at = models.DateTimeField(auto_now_add=True, null=True, db_index=True)
 
     class Meta:
         unique_together = ('user', 'album')
+
+
+class FanVote(models.Model):
+    """
+    Represents a fan's vote for an album.
+
+    Votes are buffered in memory and written in batches by
+    :mod:`website.voting`, which also keeps ``Album.vote_count`` in step.
+
+    Attributes:
+        user (User): The user who voted.
+        album (Album): The album voted for.
+        created_at (datetime): When the vote was recorded.
+
+    Meta:
+        constraints: Ensures a user can vote for the same album only once.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='votes')
+    album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='votes')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'album'], name='website_fanvote_once'),
+        ]
+
+
+class AlbumRecommendation(models.Model):
+    """
+    One precomputed "fans also liked" neighbour of an album.
+
+    Rows are written by :mod:`website.recommendations` from the
+    co-occurrence of albums in users' favorites; pages only read them.
+
+    Attributes:
+        album (Album): The album the recommendation is shown for.
+        recommended (Album): The recommended album.
+        score (float): Cosine similarity of the two albums' fans.
+        rank (int): Position in the album's list, starting at 1.
+
+    Meta:
+        constraints: (album, rank) is unique; its index serves an
+            album's list in rank order with a single lookup.
+    """
+
+    # The (album, rank) constraint's index covers lookups by album.
+    album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='recommendations', db_index=False)
+    recommended = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='recommended_by')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['album', 'rank'], name='website_albumrecommendation_rank'),
+        ]
+
+
+class RecommendationRun(models.Model):
+    """
+    A completed build of the album recommendations.
+
+    Attributes:
+        finished_at (datetime): When the build finished.
+        full (bool): Whether every album was rebuilt, or only the albums
+            touched by favorites added since the previous run.
+        last_favorite_id (int): Highest ``UserFavoriteAlbum`` ID the build
+            saw; the next incremental build starts after it.
+        albums_changed (int): Albums whose recommendations changed.
+    """
+
+    finished_at = models.DateTimeField(auto_now_add=True)
+    full = models.BooleanField()
+    last_favorite_id = models.BigIntegerField()
+    albums_changed = models.PositiveIntegerField()
+
+
+class EventInterest(models.Model):
+    """
+    Views of an event's page, as flushed in one batch by :mod:`website.trending`.
+
+    Rows are only ever inserted, so the trending refresh can read new
+    interest by ``created_at`` alone.
+
+    Attributes:
+        event (Event): The event viewed.
+        views (int): Page views in the batch.
+        created_at (datetime): When the batch was written.
+    """
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='interest')
+    views = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class TrendingScore(models.Model):
+    """
+    The trending score of an album or event in one ranking window.
+
+    Maintained by :mod:`website.trending`. Scores are stored relative to
+    the window's ``epoch`` so that decay does not change their order and
+    a refresh only rewrites the rows that gained or lost activity.
+
+    Attributes:
+        kind (str): ``"album"`` or ``"event"``.
+        window (str): The ranking window's name, e.g. ``"7d"``.
+        object_id (int): The album's or event's primary key.
+        title (str): Copy of the object's title, so rankings need no join.
+        score (float): Decayed activity, scaled to the window's epoch.
+
+    Meta:
+        constraints: One row per object and window.
+        indexes: (kind, window, -score, object_id) serves the top N of
+            one kind and window in order, reading only N index entries.
+    """
+
+    kind = models.CharField(max_length=10)
+    window = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=100)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'window', 'object_id'], name='website_trending_object'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'window', '-score', 'object_id'], name='website_trending_rank_idx'),
+        ]
+
+
+class TrendingWindow(models.Model):
+    """
+    Refresh state of one trending window.
+
+    Attributes:
+        name (str): The window's name, a key of ``ECHOPULSE_TRENDING["WINDOWS"]``.
+        epoch (datetime): The time its stored scores are relative to.
+        refreshed_at (datetime): Activity up to this time is included.
+    """
+
+    name = models.CharField(max_length=10, primary_key=True)
+    epoch = models.DateTimeField()
+    refreshed_at = models.DateTimeField()
+
+
+class Subscriber(models.Model):
+    """
+    An email address signed up for the newsletter.
+
+    Addresses are stored normalized by :func:`website.newsletter.normalize_email`.
+    Unsubscribing keeps the row, so signing up again just clears
+    ``unsubscribed_at``.
+
+    Attributes:
+        email (str): The normalized address, unique.
+        subscribed_at (datetime): When the address last subscribed.
+        unsubscribed_at (datetime): When it unsubscribed, or None while subscribed.
+
+    Meta:
+        indexes: A partial index on the ids of active subscribers, which
+            newsletter delivery walks in order.
+    """
+
+    email = models.EmailField(unique=True)
+    subscribed_at = models.DateTimeField(auto_now_add=True)
+    unsubscribed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'], condition=models.Q(unsubscribed_at__isnull=True), name='website_subscriber_active_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.email
+
+
+class NewsletterIssue(models.Model):
+    """
+    A newsletter and the progress of its delivery.
+
+    Delivered by :mod:`website.newsletter` to active subscribers in id
+    order. ``last_subscriber_id`` is advanced as messages go out, so an
+    interrupted delivery resumes where it stopped.
+
+    Attributes:
+        subject (str): The email subject.
+        body (str): The text of the issue.
+        status (str): ``queued``, ``sending``, ``sent`` or ``failed``.
+        created_at (datetime): When the issue was queued.
+        heartbeat_at (datetime): When its worker last made progress.
+        sent_at (datetime): When delivery finished.
+        last_subscriber_id (int): The last subscriber handled.
+        sent_count (int): Messages accepted by the mail server.
+        failed_count (int): Recipients the mail server refused.
+    """
+
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_subscriber_id = models.BigIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.subject
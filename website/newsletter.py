@@ -0,0 +1,418 @@
+"""Newsletter subscriptions and batched, throttled delivery.
+
+:func:`subscribe` and :func:`unsubscribe` are idempotent: addresses are
+normalized, stored once, and unsubscribing only stamps the row.
+
+Sending an issue never happens on a request thread. :func:`queue_issue`
+stores a :class:`~website.models.NewsletterIssue` and wakes the
+in-process :class:`DeliveryWorker` once the transaction commits;
+``manage.py send_newsletter`` does the same work in the foreground. For
+each issue, :func:`deliver`
+
+* walks the active subscribers in id order with ``.iterator()``, so the
+  list is never loaded whole, in batches of ``BATCH_SIZE``;
+* renders the text and HTML templates once per batch, leaving a
+  placeholder for each recipient's unsubscribe link;
+* sends over one SMTP connection, opened once and reused for the whole
+  issue;
+* spaces messages to ``RATE`` per second with a token bucket shared
+  through the throttling cache (see :mod:`website.throttling`), so the
+  rate holds across worker processes;
+* retries connection and server errors ``MAX_RETRIES`` times on a fresh
+  connection, waiting ``RETRY_DELAY`` seconds and doubling each time,
+  and counts recipients the server refuses as failed without retrying;
+* records its progress after every batch, so an issue that fails or
+  whose worker stops is resumed from the last recorded subscriber
+  rather than starting over. An issue whose worker stopped
+  mid-delivery is picked up again once it has made no progress for
+  ``STALE_AFTER`` seconds.
+"""
+
+import atexit
+import datetime
+import logging
+import smtplib
+import threading
+import time
+from itertools import islice
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.validators import validate_email
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from website import throttling
+from website.models import Event, NewsletterIssue, Subscriber
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BATCH_SIZE": 100,
+    "RATE": 10.0,
+    "MAX_RETRIES": 3,
+    "RETRY_DELAY": 5.0,
+    "POLL_INTERVAL": 60.0,
+    "STALE_AFTER": 600,
+    "TEMPLATE": "newsletter/issue",
+    "SITE_URL": "http://localhost:8000",
+    "FROM_EMAIL": None,
+}
+
+UNSUBSCRIBE_SALT = "website.newsletter.unsubscribe"
+UNSUBSCRIBE_PLACEHOLDER = "__ECHOPULSE_UNSUBSCRIBE_URL__"
+THROTTLE_KEY = "echopulse:newsletter:smtp"
+UPCOMING_EVENTS = 5
+
+
+def get_config():
+    """
+    Return the newsletter configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_NEWSLETTER`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_NEWSLETTER", {})}
+
+
+def normalize_email(email):
+    """
+    Return the form an address is stored and looked up in.
+
+    Args:
+        email (str): The address as entered.
+
+    Returns:
+        str: The address trimmed and lowercased.
+
+    Raises:
+        ValidationError: If it is not a valid address.
+    """
+    email = (email or "").strip().lower()
+    validate_email(email)
+    return email
+
+
+def subscribe(email):
+    """
+    Subscribe an address, or do nothing if it already is subscribed.
+
+    Two statements and no read: the insert is skipped for a known
+    address, and the update only touches one that had unsubscribed.
+
+    Args:
+        email (str): The address as entered.
+
+    Raises:
+        ValidationError: If it is not a valid address.
+    """
+    email = normalize_email(email)
+    Subscriber.objects.bulk_create([Subscriber(email=email)], ignore_conflicts=True)
+    Subscriber.objects.filter(email=email, unsubscribed_at__isnull=False).update(
+        unsubscribed_at=None, subscribed_at=timezone.now()
+    )
+
+
+def unsubscribe(email):
+    """
+    Unsubscribe an address, or do nothing if it is not subscribed.
+
+    Args:
+        email (str): The address as entered.
+
+    Returns:
+        bool: Whether the address was subscribed until now.
+
+    Raises:
+        ValidationError: If it is not a valid address.
+    """
+    return bool(
+        Subscriber.objects.filter(email=normalize_email(email), unsubscribed_at__isnull=True)
+        .update(unsubscribed_at=timezone.now())
+    )
+
+
+def unsubscribe_token(email):
+    """
+    Return a signed token naming ``email``, for one-click unsubscribe links.
+
+    Args:
+        email (str): The normalized address.
+
+    Returns:
+        str: The token.
+    """
+    return signing.dumps(email, salt=UNSUBSCRIBE_SALT)
+
+
+def email_from_token(token):
+    """
+    Return the address named by an unsubscribe token.
+
+    Args:
+        token (str): A token from :func:`unsubscribe_token`.
+
+    Returns:
+        str: The address, or None if the token is not valid.
+    """
+    try:
+        return signing.loads(token, salt=UNSUBSCRIBE_SALT)
+    except signing.BadSignature:
+        return None
+
+
+def unsubscribe_url(email):
+    """
+    Return the absolute one-click unsubscribe link for ``email``.
+
+    Args:
+        email (str): The normalized address.
+
+    Returns:
+        str: The URL.
+    """
+    base = get_config()["SITE_URL"].rstrip("/")
+    return f"{base}{reverse('unsubscribe')}?token={quote(unsubscribe_token(email))}"
+
+
+def queue_issue(subject, body):
+    """
+    Queue a newsletter issue for delivery by the background worker.
+
+    Args:
+        subject (str): The email subject.
+        body (str): The text of the issue.
+
+    Returns:
+        NewsletterIssue: The queued issue.
+    """
+    issue = NewsletterIssue.objects.create(subject=subject, body=body)
+    transaction.on_commit(worker.wake)
+    return issue
+
+
+class DeliveryError(Exception):
+    """Raised when the mail server keeps failing after every retry."""
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _render(issue, events, config):
+    context = {
+        "issue": issue,
+        "events": events,
+        "site_url": config["SITE_URL"].rstrip("/"),
+        "unsubscribe_url": UNSUBSCRIBE_PLACEHOLDER,
+    }
+    return (
+        render_to_string(f"{config['TEMPLATE']}.txt", context),
+        render_to_string(f"{config['TEMPLATE']}.html", context),
+    )
+
+
+def _message(issue, text, html, email, connection, config):
+    link = unsubscribe_url(email)
+    message = EmailMultiAlternatives(
+        issue.subject,
+        text.replace(UNSUBSCRIBE_PLACEHOLDER, link),
+        config["FROM_EMAIL"] or settings.DEFAULT_FROM_EMAIL,
+        [email],
+        connection=connection,
+        headers={"List-Unsubscribe": f"<{link}>", "List-Unsubscribe-Post": "List-Unsubscribe=One-Click"},
+    )
+    message.attach_alternative(html.replace(UNSUBSCRIBE_PLACEHOLDER, link), "text/html")
+    return message
+
+
+def _throttle(rate):
+    _allowed, wait = throttling.buckets.take(THROTTLE_KEY, max(rate, 1), rate * 60, max_delay=float("inf"))
+    if wait:
+        time.sleep(wait)
+
+
+def _send(connection, message, config):
+    # Returns True if sent, False if the server refused the recipient.
+    for attempt in range(config["MAX_RETRIES"] + 1):
+        try:
+            connection.open()
+            connection.send_messages([message])
+            return True
+        except smtplib.SMTPRecipientsRefused:
+            return False
+        except (smtplib.SMTPException, OSError) as exc:
+            if attempt == config["MAX_RETRIES"]:
+                raise DeliveryError(f"Sending to {message.to[0]} failed {attempt + 1} times: {exc}") from exc
+            logger.warning("Newsletter send failed (%s); retrying on a new connection.", exc)
+            connection.close()
+            time.sleep(config["RETRY_DELAY"] * 2 ** attempt)
+
+
+def _record(issue, last_subscriber_id, sent, failed):
+    NewsletterIssue.objects.filter(pk=issue.pk).update(
+        last_subscriber_id=last_subscriber_id,
+        sent_count=F("sent_count") + sent,
+        failed_count=F("failed_count") + failed,
+        heartbeat_at=timezone.now(),
+    )
+    issue.last_subscriber_id = last_subscriber_id
+
+
+def deliver(issue, connection=None, stop=None):
+    """
+    Send an issue to every active subscriber it has not reached yet.
+
+    Args:
+        issue (NewsletterIssue): The issue, claimed by the caller.
+        connection: The mail backend to send through; a new connection
+            to ``EMAIL_BACKEND`` if omitted.
+        stop (callable): Checked between messages; when it returns True
+            the progress so far is recorded and delivery stops, leaving
+            the issue ``sending``.
+
+    Returns:
+        bool: Whether the issue was delivered to the end of the list.
+
+    Raises:
+        DeliveryError: If the mail server kept failing. The issue is
+            marked ``failed``, with its progress recorded.
+    """
+    config = get_config()
+    connection = connection or get_connection()
+    events = list(Event.objects.filter(date__gte=timezone.now()).order_by("date", "id")[:UPCOMING_EVENTS])
+    recipients = (
+        Subscriber.objects.filter(unsubscribed_at__isnull=True, id__gt=issue.last_subscriber_id)
+        .order_by("id")
+        .values_list("id", "email")
+        .iterator(chunk_size=config["BATCH_SIZE"])
+    )
+    try:
+        for batch in _batches(recipients, config["BATCH_SIZE"]):
+            text, html = _render(issue, events, config)
+            last_id = issue.last_subscriber_id
+            sent = failed = 0
+            try:
+                for subscriber_id, email in batch:
+                    if stop is not None and stop():
+                        return False
+                    _throttle(config["RATE"])
+                    if _send(connection, _message(issue, text, html, email, connection, config), config):
+                        sent += 1
+                    else:
+                        failed += 1
+                    last_id = subscriber_id
+            except DeliveryError:
+                NewsletterIssue.objects.filter(pk=issue.pk).update(status=NewsletterIssue.FAILED)
+                raise
+            finally:
+                _record(issue, last_id, sent, failed)
+    finally:
+        connection.close()
+    NewsletterIssue.objects.filter(pk=issue.pk).update(status=NewsletterIssue.SENT, sent_at=timezone.now())
+    return True
+
+
+def claim_next():
+    """
+    Claim the oldest issue waiting for delivery.
+
+    Issues are queued ones, and ``sending`` ones whose worker has made no
+    progress for ``STALE_AFTER`` seconds. The claim is a compare-and-set
+    update, so two workers never deliver the same issue.
+
+    Returns:
+        NewsletterIssue: The claimed issue, or None if nothing is waiting.
+    """
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=get_config()["STALE_AFTER"])
+    waiting = (
+        NewsletterIssue.objects.filter(
+            Q(status=NewsletterIssue.QUEUED) | Q(status=NewsletterIssue.SENDING, heartbeat_at__lt=stale)
+        )
+        .order_by("id")
+        .values_list("id", "status", "heartbeat_at")
+    )
+    for issue_id, status, heartbeat_at in waiting[:10]:
+        claimed = NewsletterIssue.objects.filter(id=issue_id, status=status, heartbeat_at=heartbeat_at).update(
+            status=NewsletterIssue.SENDING, heartbeat_at=now
+        )
+        if claimed:
+            return NewsletterIssue.objects.get(id=issue_id)
+    return None
+
+
+def work(stop=None):
+    """
+    Deliver waiting issues until none is left.
+
+    Args:
+        stop (callable): Passed on to :func:`deliver`.
+
+    Returns:
+        list: The issues handled, whether delivered, failed or stopped.
+    """
+    handled = []
+    while (stop is None or not stop()) and (issue := claim_next()) is not None:
+        handled.append(issue)
+        try:
+            deliver(issue, stop=stop)
+        except DeliveryError:
+            logger.exception("Delivering newsletter issue %s failed.", issue.pk)
+    return handled
+
+
+class DeliveryWorker:
+    """
+    Background thread that delivers queued newsletter issues.
+
+    Started by the first :meth:`wake`, it then also checks for waiting
+    issues every ``POLL_INTERVAL`` seconds.
+    """
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        """Start the worker if needed and have it look for waiting issues."""
+        if self._stopping.is_set():
+            return
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="newsletter-worker", daemon=True)
+                    self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(get_config()["POLL_INTERVAL"])
+            self._wake.clear()
+            try:
+                work(stop=self._stopping.is_set)
+            except Exception:
+                logger.exception("Newsletter worker failed.")
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        """Stop after the message being sent; unfinished issues resume later."""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+worker = DeliveryWorker()
+atexit.register(worker.stop)
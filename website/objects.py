@@ -0,0 +1,217 @@
+"""Read-through cache of single ``Event`` and ``Album`` rows.
+
+Detail pages look their object up by ID through :func:`get_object_or_404`
+instead of querying directly:
+
+* Found rows are cached for ``TIMEOUT`` seconds.
+* Missing IDs are cached too, for ``MISS_TIMEOUT`` seconds, in a
+  separate LRU so that a scraper walking ``/event/<id>/`` gets its 404s
+  without a query and cannot push real objects out of the cache.
+* Entries are keyed on the model's data version, like cached pages (see
+  :mod:`website.cache`). Saving, creating or deleting a row, and the
+  bulk counter updates that bump the version, therefore invalidate
+  them; an entry loaded while a write was in flight is stored under the
+  old version and never read.
+* Concurrent misses for the same ID in one process are coalesced: one
+  thread queries and the others wait for its result.
+
+Entries are stored pickled, so every caller gets its own instance. With
+``ECHOPULSE_PAGE_CACHE["SHARED_ALIAS"]`` set they are also shared with
+the other workers through that cache.
+"""
+
+import pickle
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404
+
+from website.cache import LRUCache, data_versions, shared_cache
+from website.routers import use_primary
+
+
+DEFAULTS = {
+    "TIMEOUT": 300,
+    "MISS_TIMEOUT": 60,
+    "MAX_ENTRIES": 4096,
+    "MAX_MISSES": 4096,
+    "WAIT_SECONDS": 5,
+}
+
+OBJECT_KEY_PREFIX = "echopulse:object:"
+
+# Stored in place of the pickled row for an ID that does not exist.
+MISSING = "missing"
+
+
+def get_config():
+    """
+    Return the object cache configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_OBJECT_CACHE`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_OBJECT_CACHE", {})}
+
+
+def _key(model, pk):
+    (version,) = data_versions.get_many([model._meta.label])
+    return f"{OBJECT_KEY_PREFIX}{model._meta.label}:{pk}|{version}"
+
+
+class ObjectCache:
+    """
+    Caches rows and missing IDs, loading each key once at a time.
+
+    Attributes:
+        hits (LRUCache): Pickled rows.
+        misses (LRUCache): Markers for IDs that do not exist.
+    """
+
+    def __init__(self, max_entries, max_misses):
+        self.hits = LRUCache(max_entries)
+        self.misses = LRUCache(max_misses)
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def peek(self, key):
+        """
+        Return the entry stored in this process's cache.
+
+        Args:
+            key (str): The entry's cache key.
+
+        Returns:
+            object: A fresh instance, :data:`MISSING`, or None if the
+            entry is not in this process's cache.
+        """
+        if self.misses.get(key) is not None:
+            return MISSING
+        blob = self.hits.get(key)
+        return None if blob is None else pickle.loads(blob)
+
+    def get(self, model, pk):
+        """
+        Return a row, reading through to the database on a miss.
+
+        Args:
+            model (Model): ``Event`` or ``Album``.
+            pk (int): The row's primary key.
+
+        Returns:
+            Model: A fresh instance, or None if no such row exists.
+        """
+        key = _key(model, pk)
+        entry = self.peek(key)
+        if entry is None:
+            entry = self._shared_get(key)
+        if entry is None:
+            entry = self._load(model, pk, key)
+        return None if entry is MISSING else entry
+
+    def _shared_get(self, key):
+        shared = shared_cache()
+        if shared is None:
+            return None
+        value = shared.get(key)
+        if value is None:
+            return None
+        self._remember(key, value)
+        return MISSING if value == MISSING else pickle.loads(value)
+
+    def _remember(self, key, value):
+        config = get_config()
+        if value == MISSING:
+            self.misses.set(key, value, config["MISS_TIMEOUT"])
+        else:
+            self.hits.set(key, value, config["TIMEOUT"])
+
+    def _load(self, model, pk, key):
+        with self._lock:
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = threading.Event()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            loading.wait(get_config()["WAIT_SECONDS"])
+            entry = self.peek(key)
+            if entry is not None:
+                return entry
+            # The loader failed or timed out: query directly.
+            return self._query(model, pk, key)
+        try:
+            return self._query(model, pk, key)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def _query(self, model, pk, key):
+        # Stored under the current version, so never read from a lagging replica.
+        with use_primary():
+            obj = model.objects.filter(pk=pk).first()
+        value = MISSING if obj is None else pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        self._remember(key, value)
+        shared = shared_cache()
+        if shared is not None:
+            config = get_config()
+            shared.set(key, value, config["MISS_TIMEOUT"] if obj is None else config["TIMEOUT"])
+        return MISSING if obj is None else obj
+
+    def clear(self):
+        """Empty this process's cache."""
+        self.hits.clear()
+        self.misses.clear()
+
+
+object_cache = ObjectCache(get_config()["MAX_ENTRIES"], get_config()["MAX_MISSES"])
+
+
+def get_object_or_404(model, pk):
+    """
+    Return a cached row, or raise a 404 if it does not exist.
+
+    Args:
+        model (Model): ``Event`` or ``Album``.
+        pk (int): The row's primary key.
+
+    Returns:
+        Model: The row.
+
+    Raises:
+        Http404: If no row has that primary key.
+    """
+    obj = object_cache.get(model, pk)
+    if obj is None:
+        raise Http404(f"No {model._meta.verbose_name} matches the given ID.")
+    return obj
+
+
+async def aget_object_or_404(model, pk):
+    """
+    Return a cached row from async code, or raise a 404.
+
+    Without a shared cache, an entry in the local cache is returned
+    without leaving the event loop. Misses are loaded on the
+    thread-sensitive executor, which runs them one at a time, so
+    concurrent misses for one ID still query once.
+
+    Args:
+        model (Model): ``Event`` or ``Album``.
+        pk (int): The row's primary key.
+
+    Returns:
+        Model: The row.
+
+    Raises:
+        Http404: If no row has that primary key.
+    """
+    entry = None if shared_cache() is not None else object_cache.peek(_key(model, pk))
+    if entry is None:
+        return await sync_to_async(get_object_or_404)(model, pk)
+    if entry is MISSING:
+        raise Http404(f"No {model._meta.verbose_name} matches the given ID.")
+    return entry
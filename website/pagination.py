@@ -0,0 +1,193 @@
+"""Keyset (cursor) pagination for the EchoPulse website.
+
+Offset pagination gets slower the deeper a visitor browses, because the
+database still has to walk every skipped row. Keyset pagination instead
+remembers the sort key of the last row shown and seeks straight to it,
+so every page costs one bounded index range scan regardless of depth.
+"""
+
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+class KeysetPage:
+    """
+    A single page of rows from a keyset-paginated queryset.
+
+    Attributes:
+        object_list (list): The rows on this page, in display order.
+        next_cursor (str): Opaque cursor for the following page, or None.
+        previous_cursor (str): Opaque cursor for the preceding page, or None.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        """bool: Whether a following page exists."""
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        """bool: Whether a preceding page exists."""
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(values, direction=NEXT):
+    """
+    Encode sort key values into an opaque, URL-safe cursor.
+
+    Args:
+        values (iterable): The sort key values of the boundary row.
+        direction (str): ``NEXT`` or ``PREVIOUS``.
+
+    Returns:
+        str: The encoded cursor.
+    """
+    payload = [direction] + [
+        value.isoformat() if hasattr(value, "isoformat") else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    """
+    Decode a cursor produced by :func:`encode_cursor`.
+
+    Args:
+        cursor (str): The encoded cursor, typically from a query string.
+        size (int): The number of sort keys the cursor must carry.
+
+    Returns:
+        tuple: ``(direction, values)``, or None if the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if (
+        not isinstance(payload, list)
+        or len(payload) != size + 1
+        or payload[0] not in (NEXT, PREVIOUS)
+    ):
+        return None
+    return payload[0], payload[1:]
+
+
+def _seek_filter(keys, values, lookup):
+    """
+    Build a lexicographic "row after the boundary" filter.
+
+    The condition is expressed as ``k0 >= v0 AND (k0 > v0 OR <rest>)`` so
+    that the leading key always bounds an index range scan, rather than as
+    a flat disjunction that some planners cannot drive from an index.
+
+    Args:
+        keys (tuple): Field names, most significant first.
+        values (list): Boundary values, one per key.
+        lookup (str): ``"gt"`` or ``"lt"``.
+
+    Returns:
+        Q: The seek condition.
+    """
+    key, value = keys[0], values[0]
+    if len(keys) == 1:
+        return Q(**{f"{key}__{lookup}": value})
+    rest = _seek_filter(keys[1:], values[1:], lookup)
+    return Q(**{f"{key}__{lookup}e": value}) & (Q(**{f"{key}__{lookup}": value}) | rest)
+
+
+def _prepare(queryset, keys, cursor, per_page, descending):
+    keys = tuple(keys)
+    decoded = decode_cursor(cursor, len(keys))
+    direction, values = decoded if decoded else (NEXT, None)
+    backwards = direction == PREVIOUS
+
+    # Walking backwards is a forward walk over the reversed ordering.
+    reverse = descending != backwards
+    ordering = [f"-{key}" if reverse else key for key in keys]
+    if values is not None:
+        try:
+            queryset = queryset.filter(_seek_filter(keys, values, "lt" if reverse else "gt"))
+        except (ValidationError, TypeError, ValueError):
+            # A well-formed cursor carrying values of the wrong type.
+            return _prepare(queryset, keys, None, per_page, descending)
+    return queryset.order_by(*ordering)[:per_page + 1], (keys, values, backwards, per_page)
+
+
+def _page(rows, state):
+    keys, values, backwards, per_page = state
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_next, has_previous = values is not None, has_more
+    else:
+        has_next, has_previous = has_more, values is not None
+
+    def boundary(row):
+        if isinstance(row, dict):
+            return [row[key] for key in keys]
+        return [getattr(row, key) for key in keys]
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(boundary(rows[-1]), NEXT) if rows and has_next else None,
+        previous_cursor=encode_cursor(boundary(rows[0]), PREVIOUS) if rows and has_previous else None,
+    )
+
+
+def paginate_keyset(queryset, keys, cursor=None, per_page=20, descending=False):
+    """
+    Return one page of ``queryset`` ordered by ``keys``.
+
+    ``keys`` must end in a unique field (usually ``"id"``) so the ordering
+    is total, and should match a composite index for the seek to be cheap.
+    Both model instances and ``.values()`` dictionaries are supported.
+    A malformed or stale cursor simply yields the first page.
+
+    Args:
+        queryset (QuerySet): The rows to paginate.
+        keys (tuple): Sort key field names, most significant first.
+        cursor (str): Cursor from a previous page, or None for the first page.
+        per_page (int): Maximum number of rows per page.
+        descending (bool): Whether to walk the keys from highest to lowest.
+
+    Returns:
+        KeysetPage: The requested page.
+    """
+    sliced, state = _prepare(queryset, keys, cursor, per_page, descending)
+    return _page(list(sliced), state)
+
+
+async def apaginate_keyset(queryset, keys, cursor=None, per_page=20, descending=False):
+    """
+    Asynchronous version of :func:`paginate_keyset`, for async views.
+
+    Returns:
+        KeysetPage: The requested page.
+    """
+    sliced, state = _prepare(queryset, keys, cursor, per_page, descending)
+    return _page([row async for row in sliced], state)
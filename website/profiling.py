@@ -0,0 +1,304 @@
+"""On-demand profiling of single requests.
+
+:class:`ProfilingMiddleware` profiles a request when
+
+* a staff user adds ``?_profile=1`` to the URL,
+* the request carries a token from :func:`make_token`, in the
+  ``X-Profile-Token`` header or the ``_profile`` query parameter (so
+  scripts and load balancers can trigger it without a session), or
+* it is the ``SAMPLE_EVERY``-th request handled by the process.
+
+The request runs under :mod:`cProfile` (``PROFILER = "cprofile"``), with
+a stack sampler alongside it, or under the stack sampler alone
+(``PROFILER = "sampling"``), which costs far less. Each capture is
+written to ``DIRECTORY`` as:
+
+* ``<name>.prof``: cProfile stats, for ``pstats`` or snakeviz
+  (cProfile only),
+* ``<name>.collapsed``: sampled stacks in the collapsed format read by
+  ``flamegraph.pl`` and speedscope, and
+* ``<name>.json``: what was profiled and how long it took.
+
+The name is returned in the ``X-Profile`` response header.
+``manage.py profiles`` lists and summarizes captures and issues tokens.
+Only one request per process is profiled at a time.
+"""
+
+import cProfile
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.text import slugify
+
+
+DEFAULTS = {
+    "ENABLED": False,
+    "DIRECTORY": "profiles",
+    "PROFILER": "cprofile",
+    "SAMPLE_EVERY": 0,
+    "INTERVAL": 0.005,
+    "MAX_CAPTURES": 200,
+}
+
+TOKEN_SALT = "echopulse.profiling"
+TOKEN_MAX_AGE = 3600
+TRIGGER_PARAMETER = "_profile"
+TRIGGER_HEADER = "X-Profile-Token"
+
+
+def get_config():
+    """
+    Return the profiling configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_PROFILING`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_PROFILING", {})}
+
+
+def profile_directory():
+    """
+    Return the directory captures are written to.
+
+    Returns:
+        Path: The configured ``DIRECTORY``, relative to ``BASE_DIR``
+        unless absolute.
+    """
+    return Path(settings.BASE_DIR) / get_config()["DIRECTORY"]
+
+
+def make_token(path=None):
+    """
+    Create a signed token that triggers profiling.
+
+    Args:
+        path (str): Restrict the token to this request path. Any path
+            if omitted.
+
+    Returns:
+        str: The token. It expires after :data:`TOKEN_MAX_AGE` seconds.
+    """
+    return signing.dumps({"path": path}, salt=TOKEN_SALT)
+
+
+def _token_allows(token, path):
+    try:
+        scope = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return scope.get("path") in (None, path)
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval.
+
+    Attributes:
+        stacks (Counter): Collapsed stack string to sample count.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        """Start sampling."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampler thread."""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def collapsed(self):
+        """
+        Return the samples in the collapsed stack format.
+
+        Returns:
+            str: One ``frame;frame;frame count`` line per distinct stack.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Capture:
+    """One profiled request, from start to the files on disk."""
+
+    def __init__(self, request, config):
+        self.request = request
+        self.config = config
+        self.profile = cProfile.Profile() if config["PROFILER"] == "cprofile" else None
+        self.sampler = StackSampler(threading.get_ident(), config["INTERVAL"])
+
+    def start(self):
+        """Start the profilers on the current thread."""
+        self.started = time.perf_counter()
+        self.sampler.start()
+        if self.profile is not None:
+            self.profile.enable()
+
+    def discard(self):
+        """Stop the profilers without writing anything."""
+        if self.profile is not None:
+            self.profile.disable()
+        self.sampler.stop()
+
+    def stop(self, response):
+        """
+        Stop the profilers, write the capture and name it on the response.
+
+        Args:
+            response (HttpResponse): The profiled request's response.
+
+        Returns:
+            HttpResponse: The response, with an ``X-Profile`` header.
+        """
+        self.discard()
+        duration = time.perf_counter() - self.started
+
+        match = getattr(self.request, "resolver_match", None)
+        view = match.view_name if match else slugify(self.request.path) or "root"
+        stamp = timezone.now().strftime("%Y%m%dT%H%M%S%f")
+        name = f"{stamp}-{slugify(view)}-{duration * 1000:.0f}ms"
+        directory = profile_directory()
+        directory.mkdir(parents=True, exist_ok=True)
+        if self.profile is not None:
+            self.profile.dump_stats(directory / f"{name}.prof")
+        (directory / f"{name}.collapsed").write_text(self.sampler.collapsed())
+        (directory / f"{name}.json").write_text(json.dumps({
+            "name": name,
+            "method": self.request.method,
+            "path": self.request.get_full_path(),
+            "view": view,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 1),
+            "profiler": self.config["PROFILER"],
+            "samples": sum(self.sampler.stacks.values()),
+            "created": timezone.now().isoformat(),
+        }, indent=2))
+        _prune(directory, self.config["MAX_CAPTURES"])
+        response["X-Profile"] = name
+        return response
+
+
+def _prune(directory, keep):
+    captures = sorted(directory.glob("*.json"))
+    for metadata in captures[:-keep]:
+        for suffix in (".json", ".prof", ".collapsed"):
+            metadata.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def list_captures():
+    """
+    Return the metadata of every capture, newest first.
+
+    Returns:
+        list: One dict per capture, as written to its ``.json`` file.
+    """
+    directory = profile_directory()
+    if not directory.is_dir():
+        return []
+    return [json.loads(path.read_text()) for path in sorted(directory.glob("*.json"), reverse=True)]
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests on demand. See the module docstring for triggers.
+
+    Does nothing unless ``ECHOPULSE_PROFILING["ENABLED"]`` is set. Under
+    ASGI the profilers follow the event loop thread, so ORM work that an
+    async view hands to a worker thread does not appear in the capture;
+    profile the synchronous views to see it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._counter = itertools.count(1)
+        self._busy = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _capture(self, request, is_staff):
+        config = get_config()
+        if not config["ENABLED"]:
+            return None
+        token = request.headers.get(TRIGGER_HEADER) or request.GET.get(TRIGGER_PARAMETER)
+        if token == "1":
+            requested = is_staff()
+        elif token:
+            requested = _token_allows(token, request.path)
+        else:
+            every = config["SAMPLE_EVERY"]
+            requested = bool(every) and next(self._counter) % every == 0
+        if not requested or not self._busy.acquire(blocking=False):
+            return None
+        return Capture(request, config)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        capture = self._capture(request, lambda: request.user.is_staff)
+        if capture is None:
+            return self.get_response(request)
+        try:
+            capture.start()
+            try:
+                response = self.get_response(request)
+            except BaseException:
+                capture.discard()
+                raise
+            return capture.stop(response)
+        finally:
+            self._busy.release()
+
+    async def __acall__(self, request):
+        """
+        Profile a request on the async path, if it asks to be.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The downstream response.
+        """
+        staff = False
+        if TRIGGER_PARAMETER in request.GET or TRIGGER_HEADER in request.headers:
+            staff = await sync_to_async(lambda: request.user.is_staff)()
+        capture = self._capture(request, lambda: staff)
+        if capture is None:
+            return await self.get_response(request)
+        try:
+            capture.start()
+            try:
+                response = await self.get_response(request)
+            except BaseException:
+                capture.discard()
+                raise
+            return capture.stop(response)
+        finally:
+            self._busy.release()
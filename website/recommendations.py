@@ -0,0 +1,261 @@
+"""Offline "fans also liked" album recommendations.
+
+Two albums are similar when the same users favorite both. :func:`build`
+reads ``UserFavoriteAlbum`` once, ordered by user, and counts for every
+album how often each other album appears in the same user's favorites
+(a sparse album x album co-occurrence matrix held as one ``Counter`` per
+album). Each count is turned into a cosine similarity,
+
+    together(a, b) / sqrt(fans(a) * fans(b)),
+
+with ``fans`` read from the denormalized ``Album.favorite_count``, and
+the ``TOP_K`` best neighbours of each album are stored in
+``AlbumRecommendation`` with their rank. Users with more than
+``MAX_USER_FAVORITES`` favorites are left out of the counts: they add
+the most pairs and the least signal.
+
+Builds are incremental by default. Only the albums sharing a fan with a
+favorite added since the previous :class:`~website.models.RecommendationRun`
+are recomputed, each from all of its fans. Removed favorites and the
+popularity drift of the other albums are picked up by the next full
+build, so run ``manage.py build_recommendations --full`` now and then
+(e.g. nightly) and the incremental build more often.
+
+Pages read the stored rows: :func:`for_album` is one lookup on the
+``(album, rank)`` index, and :func:`for_user` sums the neighbours of a
+user's favorites in one query. Albums whose list changes get a new
+``updated_at`` and bump the album data version, like favorite count
+changes, so cached pages and ETags move with them.
+"""
+
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from website.cache import data_versions, page_cache
+from website.models import Album, AlbumRecommendation, RecommendationRun, UserFavoriteAlbum
+
+
+DEFAULTS = {
+    "TOP_K": 10,
+    "MIN_TOGETHER": 2,
+    "MAX_USER_FAVORITES": 500,
+    "USER_LIMIT": 10,
+    "USER_TIMEOUT": 300,
+}
+
+USER_KEY_PREFIX = "echopulse:recommendations:user:"
+BATCH_SIZE = 500
+CHUNK_SIZE = 5000
+
+
+def get_config():
+    """
+    Return the recommendation configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_RECOMMENDATIONS`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_RECOMMENDATIONS", {})}
+
+
+def _batches(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def cooccurrence(rows, albums=None, max_basket=None):
+    """
+    Count how often albums are favorited by the same user.
+
+    Args:
+        rows (iterable): ``(user_id, album_id)`` pairs ordered by user.
+        albums (set): Only count rows for these albums; all if None.
+        max_basket (int): Skip users with more favorites than this.
+
+    Returns:
+        dict: Album ID to a ``Counter`` of the album IDs favorited by
+        its fans, including itself.
+    """
+    counts = defaultdict(Counter)
+    for _user_id, group in groupby(rows, key=itemgetter(0)):
+        basket = [album_id for _user_id, album_id in group]
+        if len(basket) < 2 or (max_basket is not None and len(basket) > max_basket):
+            continue
+        for album_id in basket:
+            if albums is None or album_id in albums:
+                # Counter.update() counts a whole list in one C-level pass.
+                counts[album_id].update(basket)
+    return counts
+
+
+def neighbours(album_id, together, fans, top_k, min_together=1):
+    """
+    Rank an album's co-favorited albums by cosine similarity.
+
+    Args:
+        album_id (int): The album.
+        together (Counter): Album ID to the number of shared fans.
+        fans (dict): Album ID to its number of fans.
+        top_k (int): Number of neighbours to keep.
+        min_together (int): Fewest shared fans for a neighbour.
+
+    Returns:
+        list: ``(recommended_id, score)`` pairs, best first.
+    """
+    own = fans.get(album_id, 0)
+    scored = []
+    for other, shared in together.items():
+        if other == album_id or shared < min_together:
+            continue
+        # A drifted counter can be lower than the fans counted here.
+        score = shared / math.sqrt(max(own, shared) * max(fans.get(other, 0), shared))
+        scored.append((score, -other))
+    return [(-negated, score) for score, negated in heapq.nlargest(top_k, scored)]
+
+
+def _rankings(rows, albums, config):
+    fans = dict(Album.objects.filter(favorite_count__gt=0).values_list("id", "favorite_count"))
+    counts = cooccurrence(rows, albums, config["MAX_USER_FAVORITES"])
+    return {
+        album_id: neighbours(album_id, together, fans, config["TOP_K"], config["MIN_TOGETHER"])
+        for album_id, together in counts.items()
+    }
+
+
+def _store(rankings):
+    stored = defaultdict(list)
+    for batch in _batches(rankings):
+        rows = (
+            AlbumRecommendation.objects.filter(album_id__in=batch)
+            .order_by("album_id", "rank")
+            .values_list("album_id", "recommended_id", "score")
+        )
+        for album_id, recommended_id, score in rows:
+            stored[album_id].append((recommended_id, round(score, 6)))
+    changed = [
+        album_id
+        for album_id, ranked in rankings.items()
+        if [(recommended_id, round(score, 6)) for recommended_id, score in ranked] != stored[album_id]
+    ]
+    if not changed:
+        return changed
+    now = timezone.now()
+    with transaction.atomic():
+        for batch in _batches(changed):
+            AlbumRecommendation.objects.filter(album_id__in=batch).delete()
+            AlbumRecommendation.objects.bulk_create(
+                AlbumRecommendation(album_id=album_id, recommended_id=recommended_id, score=score, rank=rank)
+                for album_id in batch
+                for rank, (recommended_id, score) in enumerate(rankings[album_id], start=1)
+            )
+            Album.objects.filter(id__in=batch).update(updated_at=now)
+        transaction.on_commit(lambda: data_versions.bump(Album._meta.label))
+    return changed
+
+
+def build(full=False):
+    """
+    Recompute the stored recommendations.
+
+    Args:
+        full (bool): Rebuild every album. Otherwise only albums sharing a
+            fan with a favorite added since the previous run are rebuilt;
+            the first run is always full.
+
+    Returns:
+        RecommendationRun: The recorded run.
+    """
+    config = get_config()
+    previous = RecommendationRun.objects.order_by("-id").first()
+    full = full or previous is None
+    # Read first: favorites added while the build runs are seen again next time.
+    watermark = UserFavoriteAlbum.objects.aggregate(last=Max("id"))["last"] or 0
+    favorites = UserFavoriteAlbum.objects.order_by("user_id", "album_id")
+
+    if full:
+        rows = favorites.values_list("user_id", "album_id").iterator(chunk_size=CHUNK_SIZE)
+        rankings = _rankings(rows, None, config)
+        # Albums that lost all of their neighbours.
+        for album_id in AlbumRecommendation.objects.values_list("album_id", flat=True).distinct():
+            rankings.setdefault(album_id, [])
+    elif watermark > previous.last_favorite_id:
+        new_fans = UserFavoriteAlbum.objects.filter(
+            id__gt=previous.last_favorite_id, id__lte=watermark
+        ).values("user_id")
+        touched = UserFavoriteAlbum.objects.filter(user_id__in=new_fans).values("album_id")
+        albums = set(touched.values_list("album_id", flat=True))
+        related_fans = UserFavoriteAlbum.objects.filter(album_id__in=touched).values("user_id")
+        rows = favorites.filter(user_id__in=related_fans).values_list("user_id", "album_id")
+        rankings = _rankings(rows.iterator(chunk_size=CHUNK_SIZE), albums, config)
+        for album_id in albums:
+            rankings.setdefault(album_id, [])
+    else:
+        rankings = {}
+
+    changed = _store(rankings)
+    return RecommendationRun.objects.create(full=full, last_favorite_id=watermark, albums_changed=len(changed))
+
+
+def for_album(album_id, limit=None):
+    """
+    Return the albums recommended on an album's page.
+
+    Args:
+        album_id (int): The album's primary key.
+        limit (int): Most albums to return; defaults to ``TOP_K``.
+
+    Returns:
+        list: Albums, best first, each with a ``score`` attribute.
+    """
+    limit = get_config()["TOP_K"] if limit is None else limit
+    rows = (
+        AlbumRecommendation.objects.filter(album_id=album_id)
+        .select_related("recommended")
+        .order_by("rank")[:limit]
+    )
+    albums = []
+    for row in rows:
+        row.recommended.score = row.score
+        albums.append(row.recommended)
+    return albums
+
+
+def for_user(user, limit=None):
+    """
+    Return albums recommended for a user from the albums they favorite.
+
+    The neighbours of all of the user's favorites are summed by score,
+    leaving out albums the user already favorites. Results are memoized
+    against the album data version, which favoriting and rebuilding the
+    recommendations both bump.
+
+    Args:
+        user (User): The user.
+        limit (int): Most albums to return; defaults to ``USER_LIMIT``.
+
+    Returns:
+        list: Albums, best first, each with a ``score`` attribute.
+    """
+    config = get_config()
+    limit = config["USER_LIMIT"] if limit is None else limit
+    (version,) = data_versions.get_many([Album._meta.label])
+    key = f"{USER_KEY_PREFIX}{user.pk}:{limit}|{version}"
+    albums = page_cache.get(key)
+    if albums is None:
+        albums = list(
+            Album.objects.filter(recommended_by__album__favorited_by__user=user)
+            .exclude(favorited_by__user=user)
+            .annotate(score=Sum("recommended_by__score"))
+            .order_by("-score", "id")[:limit]
+        )
+        page_cache.set(key, albums, config["USER_TIMEOUT"])
+    return albums
@@ -0,0 +1,201 @@
+"""Primary/replica database routing.
+
+:class:`PrimaryReplicaRouter` sends reads of the catalog models (by
+default ``Event`` and ``Album``) to the replica aliases listed in
+``ECHOPULSE_REPLICAS["ALIASES"]``, round-robin, and everything else
+(every write, and every read of users, sessions and favorites) to
+``default``. Catalog reads fall back to ``default`` when
+
+* no replica is healthy. A replica that fails a connection check is
+  skipped for ``RETRY_SECONDS``.
+* the code runs inside a transaction on ``default``, which must see its
+  own uncommitted rows.
+* the request is *pinned*. A request that writes is pinned from the write
+  on, and :class:`ReplicaPinningMiddleware` sets a short-lived cookie
+  so the client's next requests, for ``PIN_SECONDS``, also read from the
+  primary (read-your-writes while the replicas catch up).
+* the code runs under :func:`use_primary`. The page cache renders pages
+  it is about to store this way, so a lagging replica can never be
+  cached under a new data version.
+
+Without any replica aliases every query goes to ``default`` and the
+router has no effect.
+"""
+
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+DEFAULTS = {
+    "ALIASES": [],
+    "MODELS": ["website.Event", "website.Album"],
+    "PIN_SECONDS": 5,
+    "RETRY_SECONDS": 30,
+}
+
+PIN_COOKIE = "echopulse_primary"
+
+_pinned = contextvars.ContextVar("echopulse_primary_pinned", default=None)
+
+
+def get_config():
+    """
+    Return the replica configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_REPLICAS`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_REPLICAS", {})}
+
+
+def pin_to_primary():
+    """Send the rest of the current request's catalog reads to the primary."""
+    state = _pinned.get()
+    while state is not None:
+        state["value"] = state["wrote"] = True
+        state = state["parent"]
+
+
+def is_pinned():
+    """
+    Return whether the current request reads from the primary.
+
+    Returns:
+        bool: True once the request has written or was pinned by cookie.
+    """
+    pinned = _pinned.get()
+    return bool(pinned and pinned["value"])
+
+
+@contextmanager
+def use_primary():
+    """Read everything from the primary inside the ``with`` block."""
+    token = _pinned.set({"value": True, "wrote": False, "parent": _pinned.get()})
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Routes catalog reads to healthy replicas and everything else to the primary."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._down_until = {}
+
+    def _replicated(self, model):
+        return model._meta.label in get_config()["MODELS"]
+
+    def healthy(self, alias):
+        """
+        Return whether a replica can be used, checking its connection.
+
+        Args:
+            alias (str): The replica's database alias.
+
+        Returns:
+            bool: False while a failed replica is in its retry period.
+        """
+        if self._down_until.get(alias, 0) > time.monotonic():
+            return False
+        try:
+            # A no-op once connected; stale persistent connections are
+            # replaced at request start by CONN_HEALTH_CHECKS.
+            connections[alias].ensure_connection()
+        except Exception:
+            with self._lock:
+                self._down_until[alias] = time.monotonic() + get_config()["RETRY_SECONDS"]
+            return False
+        return True
+
+    def db_for_read(self, model, **hints):
+        if not self._replicated(model) or is_pinned():
+            return DEFAULT_DB_ALIAS
+        if transaction.get_connection(DEFAULT_DB_ALIAS).in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        aliases = get_config()["ALIASES"]
+        if not aliases:
+            return DEFAULT_DB_ALIAS
+        start = next(self._turn)
+        for offset in range(len(aliases)):
+            alias = aliases[(start + offset) % len(aliases)]
+            if self.healthy(alias):
+                return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema through replication.
+        return db not in get_config()["ALIASES"]
+
+
+class ReplicaPinningMiddleware:
+    """
+    Tracks whether each request may read from replicas.
+
+    A request arriving with the pin cookie reads from the primary. A
+    request that writes sets the cookie, so the same client keeps reading
+    from the primary for ``PIN_SECONDS``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        pinned = {"value": PIN_COOKIE in request.COOKIES, "wrote": False, "parent": None}
+        return pinned, _pinned.set(pinned)
+
+    def _finish(self, request, response, pinned):
+        if pinned["wrote"] and get_config()["ALIASES"]:
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=get_config()["PIN_SECONDS"], httponly=True, samesite="Lax"
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pinned, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._finish(request, response, pinned)
+
+    async def __acall__(self, request):
+        """
+        Track replica pinning for a request on the async path.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The downstream response.
+        """
+        pinned, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._finish(request, response, pinned)
@@ -0,0 +1,250 @@
+"""Full-text search over events and albums.
+
+Searchable text is kept in a single ``website_search_index`` table that
+is created by migration ``0008_search_index``:
+
+* On SQLite it is an FTS5 virtual table ranked with ``bm25()``.
+* On PostgreSQL it is a plain table with a generated, weighted
+  ``tsvector`` column behind a GIN index, ranked with ``ts_rank_cd()``.
+
+Each row's ``rowid``/``id`` encodes the source object (see
+:func:`index_key`), so updates and deletes are primary-key operations.
+The index is kept in sync by the receivers in :mod:`website.signals`
+and can be rebuilt with ``manage.py rebuild_search_index``. On any
+other database, searches fall back to unindexed ``icontains`` scans.
+"""
+
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from website.models import Album, Event
+
+
+TABLE = "website_search_index"
+
+# kind -> (model, key offset). Keys interleave kinds: id * 2 + offset.
+KINDS = {
+    "event": (Event, 0),
+    "album": (Album, 1),
+}
+
+MAX_TERMS = 8
+REBUILD_BATCH_SIZE = 1000
+
+
+def index_key(kind, object_id):
+    """
+    Return the index row key for an object.
+
+    Args:
+        kind (str): ``"event"`` or ``"album"``.
+        object_id (int): The primary key of the object.
+
+    Returns:
+        int: The search index row key.
+    """
+    return object_id * len(KINDS) + KINDS[kind][1]
+
+
+def document_for(obj):
+    """
+    Return the indexed ``(kind, title, body)`` text for an event or album.
+
+    Args:
+        obj (Event or Album): The object to index.
+
+    Returns:
+        tuple: ``(kind, title, body)``.
+    """
+    if isinstance(obj, Event):
+        return "event", obj.title, f"{obj.venue} {obj.description}"
+    return "album", obj.title, f"{obj.artist} {obj.genre}"
+
+
+_available = set()
+
+
+def is_available():
+    """
+    Return whether the current database has a full-text search index.
+
+    A positive answer is remembered per database, so the check costs a
+    catalog query only until the index exists.
+
+    Returns:
+        bool: True on SQLite (with FTS5) and PostgreSQL once migrated.
+    """
+    if connection.vendor not in ("sqlite", "postgresql"):
+        return False
+    database = (connection.alias, str(connection.settings_dict["NAME"]))
+    if database not in _available:
+        with connection.cursor() as cursor:
+            if TABLE not in connection.introspection.table_names(cursor):
+                return False
+        _available.add(database)
+    return True
+
+
+def _upsert_sql():
+    if connection.vendor == "postgresql":
+        return (
+            f"INSERT INTO {TABLE} (id, kind, object_id, title, body) VALUES (%s, %s, %s, %s, %s) "
+            "ON CONFLICT (id) DO UPDATE SET title = EXCLUDED.title, body = EXCLUDED.body"
+        )
+    return f"INSERT OR REPLACE INTO {TABLE} (rowid, kind, object_id, title, body) VALUES (%s, %s, %s, %s, %s)"
+
+
+def _key_column():
+    return "id" if connection.vendor == "postgresql" else "rowid"
+
+
+def index_objects(objects):
+    """
+    Add or refresh the search index rows for events and albums.
+
+    Args:
+        objects (iterable): Event and/or Album instances.
+    """
+    rows = []
+    for obj in objects:
+        kind, title, body = document_for(obj)
+        rows.append((index_key(kind, obj.pk), kind, obj.pk, title, body))
+    if rows and is_available():
+        with connection.cursor() as cursor:
+            cursor.executemany(_upsert_sql(), rows)
+
+
+def remove_object(kind, object_id):
+    """
+    Remove an object from the search index.
+
+    Args:
+        kind (str): ``"event"`` or ``"album"``.
+        object_id (int): The primary key of the removed object.
+    """
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE {_key_column()} = %s",
+                [index_key(kind, object_id)],
+            )
+
+
+def rebuild():
+    """
+    Rebuild the whole search index from the Event and Album tables.
+
+    Returns:
+        int: The number of objects indexed.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+    total = 0
+    for model, _offset in KINDS.values():
+        batch = []
+        for obj in model.objects.order_by("pk").iterator(chunk_size=REBUILD_BATCH_SIZE):
+            batch.append(obj)
+            if len(batch) == REBUILD_BATCH_SIZE:
+                total += _index_batch(batch)
+                batch = []
+        total += _index_batch(batch)
+    return total
+
+
+def _index_batch(batch):
+    # One transaction per batch; in autocommit mode SQLite would commit
+    # (and sync to disk) after every row.
+    with transaction.atomic():
+        index_objects(batch)
+    return len(batch)
+
+
+def _terms(query):
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def _ranked_keys(terms, limit, kind=None):
+    kind_filter = " AND kind = %s" if kind else ""
+    if connection.vendor == "postgresql":
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        sql = (
+            f"SELECT kind, object_id FROM {TABLE}, to_tsquery('simple', %s) query "
+            f"WHERE document @@ query{kind_filter} ORDER BY ts_rank_cd(document, query) DESC LIMIT %s"
+        )
+        params = [tsquery]
+    else:
+        match = " ".join(f'"{term}"*' for term in terms)
+        sql = (
+            f"SELECT kind, object_id FROM {TABLE} WHERE {TABLE} MATCH %s{kind_filter} "
+            f"ORDER BY bm25({TABLE}, 0.0, 0.0, 10.0, 1.0) LIMIT %s"
+        )
+        params = [match]
+    params += [kind, limit] if kind else [limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _scan(terms, limit):
+    # Fallback for databases without a search index.
+    results = []
+    fields = {"event": ("title", "venue__name", "venue__city", "description"), "album": ("title", "artist", "genre")}
+    for kind, (model, _offset) in KINDS.items():
+        condition = Q()
+        for term in terms:
+            condition &= Q(*[Q(**{f"{field}__icontains": term}) for field in fields[kind]], _connector=Q.OR)
+        results += [(kind, pk) for pk in model.objects.filter(condition).values_list("pk", flat=True)[:limit]]
+    return results[:limit]
+
+
+def search(query, limit=20):
+    """
+    Search events and albums, best matches first.
+
+    Every word in ``query`` must match, and the last characters of each
+    word may be omitted (prefix matching). Title matches rank highest.
+
+    Args:
+        query (str): The user's search text.
+        limit (int): Maximum number of results.
+
+    Returns:
+        list: ``(kind, object)`` tuples, where kind is ``"event"`` or ``"album"``.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+    keys = _ranked_keys(terms, limit) if is_available() else _scan(terms, limit)
+
+    wanted = {}
+    for kind, object_id in keys:
+        wanted.setdefault(kind, []).append(object_id)
+    objects = {
+        kind: KINDS[kind][0].objects.in_bulk(ids)
+        for kind, ids in wanted.items()
+    }
+    return [
+        (kind, objects[kind][object_id])
+        for kind, object_id in keys
+        if object_id in objects[kind]
+    ]
+
+
+def matching_ids(kind, query, limit=1000):
+    """
+    Return the IDs of the best-matching objects of one kind.
+
+    Args:
+        kind (str): ``"event"`` or ``"album"``.
+        query (str): The search text.
+        limit (int): Maximum number of IDs.
+
+    Returns:
+        list: Object primary keys, best matches first.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+    return [object_id for _kind, object_id in _ranked_keys(terms, limit, kind=kind)]
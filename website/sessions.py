@@ -0,0 +1,281 @@
+"""Cached sessions and user lookups.
+
+With the stock database session backend and ``ModelBackend`` every
+request that carries a session cookie costs a session ``SELECT`` and a
+``User`` ``SELECT`` before the view runs. This module puts a cache in
+front of both:
+
+* :class:`SessionStore` (``SESSION_ENGINE = "website.sessions"``) reads
+  sessions from the cache and falls back to the database on a miss.
+  Writes go through to the database, except when the only keys that
+  changed are listed in ``WRITE_BEHIND_KEYS`` (such as the
+  ``last_activity`` stamp kept by :class:`SessionActivityMiddleware`):
+  those are written to the cache only and reach the database with the
+  next real write, or after ``WRITE_BEHIND_SECONDS`` at the latest.
+  Logging in also writes the rotated session once instead of twice.
+* :class:`CachedModelBackend` caches the users it loads. Saving or
+  deleting a user, and logging out, evicts the entry (see
+  :mod:`website.signals`), and Django still checks the session's
+  password hash against the cached user on every request.
+
+On a cache hit an authenticated page view therefore runs no queries
+for the session or the user. Entries live in an in-process LRU, or in
+the Django cache named by ``SHARED_ALIAS``. Without a shared cache
+each worker process has its own entries, so another process can take
+up to ``LOCAL_TIMEOUT`` seconds to notice a logout or password change;
+configure a shared cache when running more than one worker.
+"""
+
+import pickle
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+
+from website.cache import LRUCache
+
+
+DEFAULTS = {
+    "SHARED_ALIAS": None,
+    "TIMEOUT": 300,
+    "LOCAL_TIMEOUT": 30,
+    "MAX_ENTRIES": 10000,
+    "WRITE_BEHIND_KEYS": ["last_activity"],
+    "WRITE_BEHIND_SECONDS": 300,
+    "ACTIVITY_INTERVAL": 60,
+}
+
+SESSION_KEY_PREFIX = "echopulse:session:"
+USER_KEY_PREFIX = "echopulse:user:"
+
+
+def get_config():
+    """
+    Return the session cache configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_SESSIONS`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_SESSIONS", {})}
+
+
+_local = LRUCache(get_config()["MAX_ENTRIES"])
+
+
+def _shared():
+    alias = get_config()["SHARED_ALIAS"]
+    return caches[alias] if alias else None
+
+
+def cache_get(key):
+    """
+    Return the value cached under ``key``, or None.
+
+    Args:
+        key (str): The cache key.
+
+    Returns:
+        object: A private copy of the cached value, or None.
+    """
+    shared = _shared()
+    if shared is not None:
+        return shared.get(key)
+    # Local entries are pickled so that callers never share one mutable
+    # session dict or user instance between requests.
+    blob = _local.get(key)
+    return None if blob is None else pickle.loads(blob)
+
+
+def cache_set(key, value, timeout=None):
+    """
+    Cache ``value`` under ``key``.
+
+    Args:
+        key (str): The cache key.
+        value (object): A picklable value.
+        timeout (int): Lifetime in seconds, capped by the configured
+            ``TIMEOUT`` (or ``LOCAL_TIMEOUT`` without a shared cache).
+    """
+    config = get_config()
+    shared = _shared()
+    limit = config["TIMEOUT"] if shared is not None else config["LOCAL_TIMEOUT"]
+    lifetime = limit if timeout is None else min(timeout, limit)
+    if shared is not None:
+        shared.set(key, value, lifetime)
+    else:
+        _local.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), lifetime)
+
+
+def cache_delete(key):
+    """
+    Evict ``key`` from the cache.
+
+    Args:
+        key (str): The cache key.
+    """
+    shared = _shared()
+    if shared is not None:
+        shared.delete(key)
+    _local.delete(key)
+
+
+def forget_user(user_id):
+    """
+    Evict a user from the lookup cache.
+
+    Args:
+        user_id (int): The user's primary key.
+    """
+    cache_delete(f"{USER_KEY_PREFIX}{user_id}")
+
+
+class SessionStore(DBStore):
+    """
+    Database-backed sessions read through a cache, with write-behind for
+    the ``WRITE_BEHIND_KEYS``.
+    """
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._persisted = None
+        self._saved_at = 0.0
+        self._pending_create = False
+
+    @property
+    def cache_key(self):
+        return SESSION_KEY_PREFIX + self._get_or_create_session_key()
+
+    def _durable(self, data):
+        # Everything but the write-behind keys, in a comparable form.
+        keys = get_config()["WRITE_BEHIND_KEYS"]
+        return pickle.dumps({key: value for key, value in data.items() if key not in keys})
+
+    def _remember(self, data, saved_at):
+        self._persisted = self._durable(data)
+        self._saved_at = saved_at
+        cache_set(self.cache_key, (data, saved_at), self.get_expiry_age(expiry=data.get("_session_expiry")))
+
+    def load(self):
+        entry = cache_get(SESSION_KEY_PREFIX + self.session_key)
+        if entry is not None:
+            data, saved_at = entry
+            self._persisted = self._durable(data)
+            self._saved_at = saved_at
+            return data
+        data = super().load()
+        # The database drops the key of a missing or expired session.
+        if self.session_key is not None:
+            self._remember(data, time.time())
+        return data
+
+    def exists(self, session_key):
+        return cache_get(SESSION_KEY_PREFIX + session_key) is not None or super().exists(session_key)
+
+    def save(self, must_create=False):
+        """
+        Save the session, skipping the database for write-behind changes.
+
+        Args:
+            must_create (bool): Insert a new row rather than update one.
+        """
+        if self._pending_create:
+            must_create = True
+        data = self._get_session(no_load=must_create)
+        if (
+            not must_create
+            and self.session_key is not None
+            and self._persisted == self._durable(data)
+            and time.time() - self._saved_at < get_config()["WRITE_BEHIND_SECONDS"]
+        ):
+            self._remember(data, self._saved_at)
+            return
+        super().save(must_create=must_create)
+        self._pending_create = False
+        self._remember(data, time.time())
+
+    def cycle_key(self):
+        """
+        Move the session to a new key, as ``login()`` does.
+
+        The new row is inserted when the response saves the session, so
+        a login costs one write instead of an insert and an update.
+        """
+        data = self._session
+        key = self.session_key
+        self._session_key = self._get_new_session_key()
+        self._session_cache = data
+        self._pending_create = True
+        self.modified = True
+        if key:
+            self.delete(key)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        super().delete(session_key)
+        cache_delete(SESSION_KEY_PREFIX + session_key)
+
+
+class CachedModelBackend(ModelBackend):
+    """``ModelBackend`` whose per-request user lookups are served from the cache."""
+
+    def get_user(self, user_id):
+        key = f"{USER_KEY_PREFIX}{user_id}"
+        user = cache_get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache_set(key, user)
+        return user
+
+
+class SessionActivityMiddleware:
+    """
+    Stamps ``last_activity`` into authenticated sessions.
+
+    The stamp is refreshed at most every ``ACTIVITY_INTERVAL`` seconds
+    and, being a write-behind key, normally touches only the cache.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _touch(self, request):
+        if not request.user.is_authenticated:
+            return
+        now = int(time.time())
+        if now - request.session.get("last_activity", 0) >= get_config()["ACTIVITY_INTERVAL"]:
+            request.session["last_activity"] = now
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            self._touch(request)
+        return response
+
+    async def __acall__(self, request):
+        """
+        Refresh the activity stamp on the async path.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The downstream response.
+        """
+        response = await self.get_response(request)
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            await sync_to_async(self._touch)(request)
+        return response
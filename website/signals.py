@@ -0,0 +1,194 @@
+"""Signal receivers for the EchoPulse website application.
+
+Connected when the app registry is ready (see :class:`website.apps.WebsiteConfig`).
+"""
+
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from website import favorites, instrumentation, search, sessions, snapshots, sqlite, voting
+from website.cache import data_versions
+from website.models import Album, Event, Venue
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Album)
+@receiver(post_delete, sender=Album)
+@receiver(post_save, sender=Venue)
+@receiver(post_delete, sender=Venue)
+def bump_data_version(sender, **kwargs):
+    """
+    Invalidate cached pages built from the saved or deleted model.
+
+    The version is bumped again once the surrounding transaction commits,
+    so a page rendered from pre-commit data in the meantime is not served
+    under the new version.
+
+    Args:
+        sender (Model): The model class that was saved or deleted.
+        **kwargs: Signal arguments, unused.
+    """
+    label = sender._meta.label
+    data_versions.bump(label)
+    transaction.on_commit(lambda: data_versions.bump(label))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Album)
+@receiver(post_delete, sender=Album)
+def rerender_snapshots(sender, **kwargs):
+    """
+    Re-render the static page snapshots once the change is committed.
+
+    Args:
+        sender (Model): The model class that was saved or deleted.
+        **kwargs: Signal arguments, unused.
+    """
+    transaction.on_commit(snapshots.schedule_render)
+
+
+@receiver(post_save, sender=Venue)
+def refresh_venue_events(sender, instance, created, **kwargs):
+    """
+    Carry a venue's changes over to its events.
+
+    Pages, snapshots and the search index show events with their venue,
+    so the events are marked modified (keeping ETags and the live feed
+    right), event pages are invalidated and the events are re-indexed.
+
+    Args:
+        sender (Model): The Venue model class.
+        instance (Venue): The saved venue.
+        created (bool): Whether the venue is new, and so has no events yet.
+        **kwargs: Signal arguments, unused.
+    """
+    if created:
+        return
+    events = Event.objects.filter(venue=instance)
+    if not events.update(updated_at=timezone.now()):
+        return
+    bump_data_version(Event)
+    rerender_snapshots(Event)
+    search.index_objects(events.iterator(chunk_size=search.REBUILD_BATCH_SIZE))
+
+
+@receiver(pre_delete, sender=User)
+def release_deleted_user_counters(sender, instance, **kwargs):
+    """
+    Keep album counters right when a user's favorites and votes are cascaded away.
+
+    Args:
+        sender (Model): The User model class.
+        instance (User): The user being deleted.
+        **kwargs: Signal arguments, unused.
+    """
+    favorites.release_user_favorites(instance)
+    voting.release_user_votes(instance)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Album)
+def update_search_index(sender, instance, **kwargs):
+    """
+    Refresh the full-text search entry for a saved event or album.
+
+    Args:
+        sender (Model): The model class that was saved.
+        instance (Event or Album): The saved object.
+        **kwargs: Signal arguments, unused.
+    """
+    search.index_objects([instance])
+
+
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=Album)
+def remove_from_search_index(sender, instance, **kwargs):
+    """
+    Drop the full-text search entry for a deleted event or album.
+
+    Args:
+        sender (Model): The model class that was deleted.
+        instance (Event or Album): The deleted object.
+        **kwargs: Signal arguments, unused.
+    """
+    search.remove_object(sender._meta.model_name, instance.pk)
+
+
+@receiver(connection_created)
+def record_queries(sender, connection, **kwargs):
+    """
+    Report every new database connection's queries to the request instrumentation.
+
+    Args:
+        sender (type): The database wrapper class.
+        connection (BaseDatabaseWrapper): The new connection.
+        **kwargs: Signal arguments, unused.
+    """
+    instrumentation.install_query_recorder(connection)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """
+    Apply the SQLite production pragmas to a new connection.
+
+    Args:
+        sender (type): The database wrapper class.
+        connection (BaseDatabaseWrapper): The new connection.
+        **kwargs: Signal arguments, unused.
+    """
+    sqlite.configure_connection(connection)
+
+
+@receiver(request_finished)
+def maintain_sqlite(sender, **kwargs):
+    """
+    Periodically optimize and checkpoint persistent SQLite connections.
+
+    Args:
+        sender (type): The request handler class.
+        **kwargs: Signal arguments, unused.
+    """
+    sqlite.maintain_if_due()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """
+    Evict a saved or deleted user from the session user cache.
+
+    The entry is evicted again once the surrounding transaction commits,
+    so a lookup that cached the old row in the meantime does not survive.
+
+    Args:
+        sender (Model): The User model class.
+        instance (User): The saved or deleted user.
+        **kwargs: Signal arguments, unused.
+    """
+    user_id = instance.pk
+    sessions.forget_user(user_id)
+    transaction.on_commit(lambda: sessions.forget_user(user_id))
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    """
+    Evict a user who logs out from the session user cache.
+
+    Args:
+        sender (type): The user's model class.
+        request (HttpRequest): The logout request.
+        user (User): The user, or None if nobody was logged in.
+        **kwargs: Signal arguments, unused.
+    """
+    if user is not None:
+        sessions.forget_user(user.pk)
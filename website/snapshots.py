@@ -0,0 +1,305 @@
+"""Pre-rendered snapshots of the public pages.
+
+The landing, artists, albums and events pages look the same to every
+anonymous visitor. With ``ECHOPULSE_SNAPSHOTS["ENABLED"]`` on, they are
+rendered to HTML files, with gzip (and, if ``brotli`` is installed,
+Brotli) versions next to them, and :class:`website.middleware.WhiteNoiseMiddleware`
+serves those files to anonymous ``GET`` and ``HEAD`` requests without
+a query string. Such requests never reach a view or the database.
+
+Each render writes every page into a new *generation* directory under
+``DIRECTORY`` and then replaces the ``CURRENT`` pointer file, so the
+switch to the new pages is atomic and a request never sees a
+half-written page. Older generations are pruned, keeping the newest
+``KEEP_GENERATIONS``.
+
+Pages are re-rendered
+
+* by ``manage.py render_snapshots`` (run it after deploys and imports),
+* ``DEBOUNCE`` seconds after an ``Event`` or ``Album`` is saved or
+  deleted (see :mod:`website.signals`), and
+* once a page is older than its maximum age in ``PAGES``. Until the new
+  render is done, requests for that page fall through to the view.
+  This bounds how stale a page can get from bulk updates, which send no
+  signals, and from the clock (the events page moves past events off
+  its upcoming list).
+
+Pages that set cookies or need a CSRF token, or that do not answer 200,
+are not snapshotted.
+"""
+
+import io
+import logging
+import os
+import shutil
+import threading
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler, WSGIRequest
+from django.db import connections
+from django.urls import reverse
+from whitenoise.compress import Compressor
+from whitenoise.responders import MissingFileError, StaticFile
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    "DIRECTORY": "snapshots",
+    # URL name -> maximum age of its snapshot in seconds.
+    "PAGES": {"landing": 3600, "artists": 3600, "album_list": 300, "events": 60},
+    "DEBOUNCE": 2.0,
+    "CHECK_INTERVAL": 1.0,
+    "KEEP_GENERATIONS": 3,
+    "HOST": None,
+}
+
+POINTER = "CURRENT"
+
+# Set in the WSGI environ of snapshot renders, so they reach the views.
+RENDER_FLAG = "echopulse.snapshot"
+
+
+def get_config():
+    """
+    Return the snapshot configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_SNAPSHOTS`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_SNAPSHOTS", {})}
+
+
+def snapshot_directory():
+    """
+    Return the directory holding the snapshot generations.
+
+    Returns:
+        str: The absolute path of ``DIRECTORY``.
+    """
+    return os.path.abspath(get_config()["DIRECTORY"])
+
+
+def current_generation():
+    """
+    Return the name of the generation being served.
+
+    Returns:
+        str: The generation directory name, or None before the first render.
+    """
+    try:
+        with open(os.path.join(snapshot_directory(), POINTER)) as pointer:
+            return pointer.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _rendered_at(generation):
+    # Generation names start with the render time in nanoseconds.
+    return int(generation.split("-", 1)[0]) / 1e9
+
+
+def _page_file(root, path):
+    return os.path.join(root, *path.strip("/").split("/"), "index.html")
+
+
+def _host():
+    host = get_config()["HOST"]
+    if host:
+        return host
+    for allowed in settings.ALLOWED_HOSTS:
+        if allowed != "*":
+            return allowed.lstrip(".")
+    return "localhost"
+
+
+def _fetch(handler, path):
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "SCRIPT_NAME": "",
+        "QUERY_STRING": "",
+        "SERVER_NAME": _host(),
+        "SERVER_PORT": "443" if settings.SECURE_SSL_REDIRECT else "80",
+        "HTTP_HOST": _host(),
+        "wsgi.url_scheme": "https" if settings.SECURE_SSL_REDIRECT else "http",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": io.StringIO(),
+        RENDER_FLAG: True,
+    }
+    return handler.get_response(WSGIRequest(environ))
+
+
+def _snapshottable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and response.get("Content-Type", "").startswith("text/html")
+    )
+
+
+def render():
+    """
+    Render every page in ``PAGES`` into a new generation and serve it.
+
+    Returns:
+        dict: URL name to the bytes written, or to the reason the page
+        was skipped.
+    """
+    config = get_config()
+    directory = snapshot_directory()
+    generation = f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}"
+    root = os.path.join(directory, generation)
+    os.makedirs(root)
+    compressor = Compressor(quiet=True)
+    handler = WSGIHandler()
+    results = {}
+    for name in config["PAGES"]:
+        response = _fetch(handler, reverse(name))
+        if not _snapshottable(response):
+            results[name] = f"not snapshottable (status {response.status_code})"
+            continue
+        path = _page_file(root, reverse(name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as page:
+            page.write(response.content)
+        compressor.compress(path)
+        results[name] = len(response.content)
+
+    temporary = os.path.join(directory, f"{POINTER}.{generation}")
+    with open(temporary, "w") as pointer:
+        pointer.write(generation)
+    os.replace(temporary, os.path.join(directory, POINTER))
+    _prune(directory, generation, config["KEEP_GENERATIONS"])
+    return results
+
+
+def _prune(directory, current, keep):
+    generations = sorted(
+        (
+            entry
+            for entry in os.listdir(directory)
+            if entry.split("-", 1)[0].isdigit() and os.path.isdir(os.path.join(directory, entry))
+        ),
+        key=_rendered_at,
+        reverse=True,
+    )
+    for generation in generations[keep:]:
+        if generation != current:
+            shutil.rmtree(os.path.join(directory, generation), ignore_errors=True)
+
+
+_schedule_lock = threading.Lock()
+_schedule = {"pending": False, "running": False, "again": False}
+
+
+def schedule_render():
+    """
+    Re-render the snapshots in the background after ``DEBOUNCE`` seconds.
+
+    Calls made before a scheduled render starts are folded into it; a
+    call made while it runs schedules one more render afterwards.
+    """
+    if not get_config()["ENABLED"]:
+        return
+    with _schedule_lock:
+        if _schedule["pending"]:
+            _schedule["again"] = _schedule["running"]
+            return
+        _schedule["pending"] = True
+    timer = threading.Timer(get_config()["DEBOUNCE"], _render_in_background)
+    timer.daemon = True
+    timer.start()
+
+
+def _render_in_background():
+    with _schedule_lock:
+        _schedule["running"] = True
+    try:
+        render()
+    except Exception:
+        logger.exception("Rendering the page snapshots failed.")
+    finally:
+        connections.close_all()
+        with _schedule_lock:
+            again = _schedule["again"]
+            _schedule.update(pending=False, running=False, again=False)
+    if again:
+        schedule_render()
+
+
+class SnapshotFiles:
+    """
+    Looks up the current generation's snapshot for a request.
+
+    The ``CURRENT`` pointer is re-read at most every ``CHECK_INTERVAL``
+    seconds, so each worker picks up a new generation within that time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._generation = None
+        self._files = {}
+
+    def _refresh(self):
+        generation = current_generation()
+        if generation == self._generation:
+            return
+        files = {}
+        if generation is not None:
+            root = os.path.join(snapshot_directory(), generation)
+            for name, max_age in get_config()["PAGES"].items():
+                url = reverse(name)
+                try:
+                    static_file = self._static_file(_page_file(root, url))
+                except MissingFileError:
+                    # Not snapshottable, or pruned by a newer render meanwhile.
+                    continue
+                files[url] = (static_file, _rendered_at(generation) + max_age)
+        self._generation, self._files = generation, files
+
+    def _static_file(self, path):
+        headers = [
+            ("Content-Type", f"text/html; charset={settings.DEFAULT_CHARSET}"),
+            ("Cache-Control", "no-cache"),
+        ]
+        return StaticFile(path, headers, encodings={"gzip": path + ".gz", "br": path + ".br"})
+
+    def find(self, request):
+        """
+        Return the snapshot to serve for ``request``.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            StaticFile: The snapshot, or None if the request must reach
+            the view: it is not an anonymous GET or HEAD without a query
+            string, the page has no snapshot, or the snapshot is too old.
+        """
+        if (
+            request.method not in ("GET", "HEAD")
+            or request.META.get("QUERY_STRING")
+            or request.META.get(RENDER_FLAG)
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+        ):
+            return None
+        now = time.time()
+        if now - self._checked > get_config()["CHECK_INTERVAL"]:
+            with self._lock:
+                self._checked = now
+                self._refresh()
+            if self._generation is None:
+                schedule_render()
+        entry = self._files.get(request.path_info)
+        if entry is None:
+            return None
+        static_file, expires = entry
+        if now > expires:
+            schedule_render()
+            return None
+        return static_file
@@ -0,0 +1,118 @@
+"""SQLite production profile.
+
+Small deployments run on a single SQLite file. With
+``ECHOPULSE_SQLITE["PRODUCTION"]`` on, every new SQLite connection is
+tuned through ``connection_created`` (see :mod:`website.signals`):
+
+* ``journal_mode=WAL``: readers no longer block the writer or each other.
+* ``synchronous=NORMAL``: in WAL mode this is still crash-safe and only
+  a power loss can drop the last commits.
+* ``busy_timeout``: writers wait for the lock instead of failing at once
+  with "database is locked".
+* ``cache_size``, ``mmap_size`` and ``temp_store``: keep the hot pages
+  and temporary B-trees in memory.
+
+The settings module also makes connections persistent, so the pragmas
+are paid once per thread rather than per request. Persistent
+connections never close, so the maintenance SQLite normally does at
+close time is done here every ``MAINTENANCE_INTERVAL`` seconds after a
+request finishes: ``PRAGMA optimize`` refreshes the planner statistics
+and a passive WAL checkpoint keeps the ``-wal`` file from growing.
+``manage.py sqlite_maintenance`` runs the same steps, plus a truncating
+checkpoint, from cron.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "PRODUCTION": False,
+    "PRAGMAS": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+    "MAINTENANCE_INTERVAL": 600,
+}
+
+
+def get_config():
+    """
+    Return the SQLite profile configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_SQLITE`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_SQLITE", {})}
+
+
+def configure_connection(connection):
+    """
+    Apply the configured pragmas to a new SQLite connection.
+
+    Args:
+        connection (BaseDatabaseWrapper): The new connection.
+    """
+    config = get_config()
+    if connection.vendor != "sqlite" or not config["PRODUCTION"]:
+        return
+    with connection.cursor() as cursor:
+        for name, value in config["PRAGMAS"].items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def maintain(connection, mode="PASSIVE"):
+    """
+    Refresh planner statistics and checkpoint the WAL.
+
+    Args:
+        connection (BaseDatabaseWrapper): An SQLite connection.
+        mode (str): ``PASSIVE`` never waits for readers or writers;
+            ``TRUNCATE`` waits and then empties the ``-wal`` file.
+
+    Returns:
+        tuple: ``(busy, wal_frames, checkpointed_frames)`` as reported by
+        ``wal_checkpoint``.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA optimize")
+        cursor.execute(f"PRAGMA wal_checkpoint({mode})")
+        return cursor.fetchone()
+
+
+_last_run = {}
+_lock = threading.Lock()
+
+
+def maintain_if_due(**kwargs):
+    """
+    Run :func:`maintain` on this thread's open SQLite connections once per interval.
+
+    Connected to ``request_finished``. The work happens after the
+    response has gone out, so no request waits on it.
+    """
+    config = get_config()
+    if not config["PRODUCTION"]:
+        return
+    now = time.monotonic()
+    for connection in connections.all(initialized_only=True):
+        if connection.vendor != "sqlite" or connection.connection is None or connection.in_atomic_block:
+            continue
+        with _lock:
+            if now - _last_run.get(connection.alias, 0) < config["MAINTENANCE_INTERVAL"]:
+                continue
+            _last_run[connection.alias] = now
+        try:
+            maintain(connection)
+        except DatabaseError:
+            logger.exception("SQLite maintenance failed on %s.", connection.alias)
@@ -1,3 +1,1619 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import hashlib
+import json
+import socketserver
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from whitenoise.middleware import WhiteNoiseFileResponse
+
+from website import (
+    api, benchmark, favorites, instrumentation, live, middleware, newsletter, objects, pagination, profiling,
+    recommendations, routers, search, sessions, snapshots, sqlite, throttling, trending, venues, views, voting,
+)
+from website.cache import LRUCache, data_versions, page_cache
+from website.conditional import object_validators
+from website.models import Album, Event, FanVote, NewsletterIssue, Subscriber, UserFavoriteAlbum, Venue
+from website.pagination import encode_cursor, paginate_keyset
+
+
+BENCH_SCALE = 200
+
+
+def seed(**options):
+    call_command("seed_bench", scale=BENCH_SCALE, anchor=datetime.date(2026, 1, 1), stdout=StringIO(), **options)
+
+
+# The manifest storage needs collectstatic to have run.
+PLAIN_STATIC_STORAGE = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        venue = Venue.objects.create(name="Hall")
+        start = timezone.now() + datetime.timedelta(days=1)
+        # Pairs of events share a start time, so the id breaks ties.
+        Event.objects.bulk_create(
+            Event(title=f"Show {number}", date=start + datetime.timedelta(days=number // 2), venue=venue)
+            for number in range(-10, 11)
+        )
+
+    def walk(self, queryset, descending=False):
+        pages, cursor = [], None
+        while True:
+            page = paginate_keyset(queryset, ("date", "id"), cursor=cursor, per_page=4, descending=descending)
+            pages.append(page)
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once_in_order(self):
+        upcoming = Event.objects.filter(date__gte=timezone.now())
+        pages = self.walk(upcoming)
+        rows = [event for page in pages for event in page]
+        self.assertEqual(rows, list(upcoming.order_by("date", "id")))
+        self.assertFalse(pages[0].has_previous)
+        self.assertTrue(all(len(page) == 4 for page in pages[:-1]))
+
+        past = Event.objects.filter(date__lt=timezone.now())
+        rows = [event for page in self.walk(past, descending=True) for event in page]
+        self.assertEqual(rows, list(past.order_by("-date", "-id")))
+
+    def test_previous_cursor_returns_the_previous_page(self):
+        first, second = self.walk(Event.objects.all())[:2]
+        back = paginate_keyset(Event.objects.all(), ("date", "id"), cursor=second.previous_cursor, per_page=4)
+        self.assertEqual(list(back), list(first))
+        self.assertEqual(back.next_cursor, first.next_cursor)
+        self.assertFalse(back.has_previous)
+
+    def test_bad_cursors_give_the_first_page(self):
+        first = list(paginate_keyset(Event.objects.all(), ("date", "id"), per_page=4))
+        for cursor in ("garbage!", encode_cursor([1]), encode_cursor(["tomorrow", 1]), "bnVsbA", encode_cursor([1, 2], "x")):
+            page = paginate_keyset(Event.objects.all(), ("date", "id"), cursor=cursor, per_page=4)
+            self.assertEqual(list(page), first, cursor)
+            self.assertEqual(self.client.get(reverse("events"), {"cursor": cursor}).status_code, 200)
+
+    def test_listing_seeks_on_the_date_index(self):
+        page = paginate_keyset(Event.objects.filter(date__gte=timezone.now()), ("date", "id"), per_page=4)
+        seek = Event.objects.filter(date__gte=timezone.now()).filter(
+            pagination._seek_filter(("date", "id"), [page.object_list[-1].date, page.object_list[-1].id], "gt")
+        )
+        self.assertIn("website_event_date_id_idx", seek.order_by("date", "id").explain())
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        page_cache.clear()
+        caches["default"].clear()
+        venue = Venue.objects.create(name="Hall")
+        self.event = Event.objects.create(title="Opening Night", date=timezone.now() + datetime.timedelta(days=3), venue=venue)
+
+    def test_anonymous_pages_are_cached_until_the_model_changes(self):
+        self.assertEqual(self.client.get(reverse("events"))["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("events"))
+        self.assertEqual(response["X-Page-Cache"], "hit")
+
+        self.event.title = "Closing Night"
+        self.event.save()
+        response = self.client.get(reverse("events"))
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Closing Night")
+
+    def test_other_models_do_not_invalidate(self):
+        self.client.get(reverse("events"))
+        Album.objects.create(title="Unrelated", artist="Band", release_date=datetime.date(2024, 1, 1))
+        self.assertEqual(self.client.get(reverse("events"))["X-Page-Cache"], "hit")
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get(reverse("events"))
+        self.assertEqual(self.client.get(reverse("events"), {"when": "past"})["X-Page-Cache"], "miss")
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.force_login(User.objects.create_user("fan", password="pw"))
+        self.client.get(reverse("events"))
+        self.assertNotIn("X-Page-Cache", self.client.get(reverse("events")))
+
+    def test_shared_versions_are_seen_by_every_worker(self):
+        with override_settings(ECHOPULSE_PAGE_CACHE={"SHARED_ALIAS": "default"}):
+            (before,) = data_versions.get_many(["website.Event"])
+            # Another worker bumps the version; this process's counter is untouched.
+            caches["default"].incr("echopulse:version:website.Event")
+            self.assertEqual(data_versions.get_many(["website.Event"]), [before + 1])
+            self.assertEqual(self.client.get(reverse("events"))["X-Page-Cache"], "miss")
+            page_cache.clear()
+            # A second worker, with an empty local LRU, is served from the shared cache.
+            self.assertEqual(self.client.get(reverse("events"))["X-Page-Cache"], "hit")
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(2)
+        lru.set("a", 1, 60)
+        lru.set("b", 2, 60)
+        lru.get("a")
+        lru.set("c", 3, 60)
+        self.assertEqual((lru.get("a"), lru.get("b"), lru.get("c")), (1, None, 3))
+
+    def test_expired_entries_are_not_returned(self):
+        lru = LRUCache(2)
+        lru.set("a", 1, 60)
+        with mock.patch("website.cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(lru.get("a"))
+        self.assertEqual(len(lru), 0)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        page_cache.clear()
+        objects.object_cache.clear()
+        self.addCleanup(trending.interest.clear)
+        venue = Venue.objects.create(name="Hall")
+        start = timezone.now() + datetime.timedelta(days=3)
+        self.event = Event.objects.create(title="Opening Night", date=start, venue=venue)
+        self.other = Event.objects.create(title="Encore", date=start + datetime.timedelta(days=1), venue=venue)
+
+    def test_matching_etag_is_answered_without_queries(self):
+        response = self.client.get(reverse("events"))
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(reverse("events"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+        revalidated = self.client.get(reverse("events"), HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_detail_page_revalidates_without_queries(self):
+        url = reverse("event_detail", args=[self.event.id])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.event.title = "Closing Night"
+        self.event.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Closing Night")
+
+    def test_saving_the_object_changes_its_etag(self):
+        validators = object_validators(Event)
+        etag, last_modified = validators(None, self.event.id)
+        self.assertEqual(validators(None, self.event.id), (etag, last_modified))
+        self.event.title = "Closing Night"
+        self.event.save()
+        self.assertNotEqual(validators(None, self.event.id)[0], etag)
+        self.assertEqual(validators(None, 0), (None, None))
+
+    def test_changes_change_the_listing_etag(self):
+        etag = self.client.get(reverse("events"))["ETag"]
+        self.other.title = "Second Encore"
+        self.other.save()
+        response = self.client.get(reverse("events"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Second Encore")
+
+        etag = response["ETag"]
+        self.event.delete()
+        # The newest updated_at is unchanged; only the row count moved.
+        self.assertEqual(self.client.get(reverse("events"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class AlbumCatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.albums = Album.objects.bulk_create(
+            Album(
+                title=f"Record {number:02}",
+                artist="Band" if number % 2 else "Other Band",
+                genre="Rock" if number % 3 else "Jazz",
+                release_date=datetime.date(2000 + number % 4, 1 + number % 12, 1),
+                favorite_count=number % 5,
+            )
+            for number in range(40)
+        )
+
+    def setUp(self):
+        page_cache.clear()
+
+    def listing(self, **params):
+        albums, cursor = [], None
+        while True:
+            response = self.client.get(reverse("album_list"), {**params, **({"cursor": cursor} if cursor else {})})
+            page = response.context["page"]
+            albums.extend(page)
+            if not page.has_next:
+                return albums
+            cursor = page.next_cursor
+
+    def test_filters(self):
+        albums = self.listing(artist="Band", genre="Rock", year="2001")
+        expected = Album.objects.filter(artist="Band", genre="Rock", release_date__year=2001)
+        self.assertTrue(albums)
+        self.assertEqual(sorted(album.id for album in albums), sorted(expected.values_list("id", flat=True)))
+
+    def test_sorts_page_through_the_whole_catalog(self):
+        catalog = Album.objects.filter(artist__in=["Band", "Other Band"])
+        orderings = {
+            "newest": ("-release_date", "-id"),
+            "oldest": ("release_date", "id"),
+            "title": ("title", "id"),
+            "popular": ("-favorite_count", "-id"),
+        }
+        for sort, ordering in orderings.items():
+            with self.subTest(sort=sort):
+                albums = [album for album in self.listing(sort=sort) if album.artist in ("Band", "Other Band")]
+                self.assertEqual(albums, list(catalog.order_by(*ordering)))
+
+    def test_unknown_sort_and_year_are_ignored(self):
+        response = self.client.get(reverse("album_list"), {"sort": "loudest", "year": "soon"})
+        self.assertEqual(response.context["sort"], "newest")
+        self.assertEqual(len(response.context["page"]), views.ALBUMS_PER_PAGE)
+
+    def test_album_detail(self):
+        album = self.albums[0]
+        self.assertContains(self.client.get(reverse("album_detail", args=[album.id])), album.title)
+        missing = Album.objects.order_by("-id").values_list("id", flat=True).first() + 1
+        self.assertEqual(self.client.get(reverse("album_detail", args=[missing])).status_code, 404)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(reverse("album_list"))["Last-Modified"]
+        response = self.client.get(reverse("album_list"), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        venue = Venue.objects.create(name="Hall", city="Sydney")
+        start = timezone.now()
+        Event.objects.bulk_create(
+            Event(title=f"Show {number}", date=start + datetime.timedelta(days=number), venue=venue)
+            for number in range(20)
+        )
+
+    def setUp(self):
+        page_cache.clear()
+
+    def test_pages_follow_next_cursors(self):
+        ids, cursor = [], None
+        while True:
+            params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+            body = self.client.get(reverse("api_event_list"), params).json()
+            self.assertLessEqual(len(body["results"]), 7)
+            ids.extend(row["id"] for row in body["results"])
+            cursor = body["next"]
+            if cursor is None:
+                break
+        self.assertEqual(ids, list(Event.objects.order_by("id").values_list("id", flat=True)))
+        self.assertEqual(set(body["results"][0]), set(api.EVENT_FIELDS))
+        self.assertEqual(body["results"][0]["venue"], "Hall")
+
+    def test_limit_is_clamped(self):
+        for limit, expected in (("0", 1), ("abc", api.DEFAULT_PAGE_SIZE), ("5", 5)):
+            with self.subTest(limit=limit):
+                body = self.client.get(reverse("api_album_list"), {"limit": limit}).json()
+                self.assertEqual(len(body["results"]), min(expected, Album.objects.count()))
+        with mock.patch.object(api, "MAX_PAGE_SIZE", 3):
+            page_cache.clear()
+            body = self.client.get(reverse("api_event_list"), {"limit": 100}).json()
+        self.assertEqual(len(body["results"]), 3)
+
+    def test_exports_stream_every_row(self):
+        ids = list(Event.objects.order_by("id").values_list("id", flat=True))
+        with mock.patch.object(api, "EXPORT_CHUNK_SIZE", 6):
+            response = self.client.get(reverse("api_event_export"))
+            ndjson = b"".join(response.streaming_content).decode()
+            array = b"".join(self.client.get(reverse("api_event_export"), {"format": "json"}).streaming_content)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([json.loads(line)["id"] for line in ndjson.splitlines()], ids)
+        self.assertEqual([row["id"] for row in json.loads(array)], ids)
+
+    def test_exports_of_an_empty_table(self):
+        Event.objects.all().delete()
+        self.assertEqual(b"".join(self.client.get(reverse("api_event_export")).streaming_content), b"")
+        response = self.client.get(reverse("api_event_export"), {"format": "json"})
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), [])
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class SearchTests(TestCase):
+    def setUp(self):
+        if not search.is_available():
+            self.skipTest("No full-text search index on this database.")
+        venue = Venue.objects.create(name="Opera House", city="Sydney")
+        self.event = Event.objects.create(
+            title="Symphony Night", date=timezone.now(), venue=venue, description="An evening of jazz standards."
+        )
+        self.jazz = Album.objects.create(
+            title="Jazz Hands", artist="Quartet", genre="Jazz", release_date=datetime.date(2020, 1, 1)
+        )
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(search.search("jazz"), [("album", self.jazz), ("event", self.event)])
+
+    def test_every_term_must_match_and_prefixes_match(self):
+        self.assertEqual(search.search("symph sydney"), [("event", self.event)])
+        self.assertEqual(search.search("symphony quartet"), [])
+        self.assertEqual(search.matching_ids("album", "jaz"), [self.jazz.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.jazz.title = "Blue Notes"
+        self.jazz.save()
+        self.assertEqual(search.search("blue"), [("album", self.jazz)])
+        self.assertEqual(search.matching_ids("album", "hands"), [])
+        self.event.delete()
+        self.assertEqual(search.matching_ids("event", "symphony"), [])
+
+    def test_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.TABLE}")
+        self.assertEqual(search.search("symphony"), [])
+        self.assertEqual(search.rebuild(), Event.objects.count() + Album.objects.count())
+        self.assertEqual(search.search("symphony"), [("event", self.event)])
+
+    def test_query_syntax_is_not_interpreted(self):
+        for query in ('"', "jazz OR", "NEAR(", "*", "-jazz"):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(reverse("search"), {"q": query}).status_code, 200)
+        self.assertEqual(search.search("!!!"), [])
+
+    def test_scan_fallback(self):
+        with mock.patch.object(search, "is_available", return_value=False):
+            self.assertEqual(search.search("symphony sydney"), [("event", self.event)])
+
+
+class FavoriteCounterTests(TestCase):
+    def setUp(self):
+        self.fan = User.objects.create_user("fan", password="pw")
+        self.albums = [
+            Album.objects.create(title=f"Record {number}", artist="Band", release_date=datetime.date(2020, 1, 1))
+            for number in range(3)
+        ]
+        self.ids = [album.id for album in self.albums]
+
+    def counts(self):
+        return list(Album.objects.filter(id__in=self.ids).order_by("id").values_list("favorite_count", flat=True))
+
+    def test_add_and_remove_keep_counters_in_step(self):
+        self.assertEqual(favorites.add_favorites(self.fan, self.ids[:2] + [self.ids[0], 0]), self.ids[:2])
+        self.assertEqual(favorites.add_favorites(self.fan, self.ids), self.ids[2:])
+        self.assertEqual(self.counts(), [1, 1, 1])
+        self.assertEqual(favorites.remove_favorites(self.fan, [self.ids[1], self.ids[1]]), [self.ids[1]])
+        self.assertEqual(favorites.remove_favorites(self.fan, [self.ids[1]]), [])
+        self.assertEqual(self.counts(), [1, 0, 1])
+
+    def test_bulk_toggle_view(self):
+        self.client.force_login(self.fan)
+        favorites.add_favorites(self.fan, [self.ids[0]])
+        response = self.client.post(
+            reverse("favorite_albums"), {"add": self.ids[1:], "remove": [self.ids[0]]}, content_type="application/json"
+        )
+        self.assertEqual(response.json(), {"added": self.ids[1:], "removed": [self.ids[0]]})
+        response = self.client.post(reverse("favorite_albums"), {"add": [self.ids[0]], "remove": self.ids[1:2]})
+        self.assertEqual(response.json(), {"added": [self.ids[0]], "removed": [self.ids[1]]})
+        self.assertEqual(self.counts(), [1, 0, 1])
+        self.assertEqual(self.client.post(reverse("favorite_albums"), {"add": ["x"]}).status_code, 400)
+        with mock.patch.object(favorites, "MAX_ALBUMS_PER_REQUEST", 2):
+            self.assertEqual(self.client.post(reverse("favorite_albums"), {"add": self.ids}).status_code, 400)
+
+    def test_deleting_a_user_releases_their_favorites(self):
+        favorites.add_favorites(self.fan, self.ids)
+        self.fan.delete()
+        self.assertEqual(self.counts(), [0, 0, 0])
+
+    def test_reconcile_repairs_drift(self):
+        favorites.add_favorites(self.fan, self.ids[:2])
+        Album.objects.filter(id=self.ids[0]).update(favorite_count=7)
+        Album.objects.filter(id=self.ids[2]).update(favorite_count=2)
+        out = StringIO()
+        call_command("reconcile_favorite_counts", batch_size=2, stdout=out)
+        self.assertIn("Repaired 2", out.getvalue())
+        self.assertEqual(self.counts(), [1, 1, 0])
+        with self.assertRaises(CommandError):
+            call_command("reconcile_favorite_counts", batch_size=0)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE, ECHOPULSE_INSTRUMENTATION={"METRICS_TOKEN": "s3cret"})
+class MetricsTests(TestCase):
+    def setUp(self):
+        page_cache.clear()
+        instrumentation.registry.clear()
+        self.addCleanup(instrumentation.registry.clear)
+
+    def test_metrics_need_staff_or_the_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3crét").status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+        self.client.force_login(User.objects.create_user("fan", password="pw"))
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.client.force_login(User.objects.create_user("admin", password="pw", is_staff=True))
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+    def test_no_token_configured_means_staff_only(self):
+        with override_settings(ECHOPULSE_INSTRUMENTATION={"METRICS_TOKEN": None}):
+            self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer ").status_code, 403)
+
+    def test_requests_are_measured(self):
+        response = self.client.get(reverse("events"))
+        self.assertIn('desc="', response["Server-Timing"])
+        page = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret").content.decode()
+        self.assertIn('echopulse_requests_total{view="events",status="200"} 1', page)
+        self.assertIn('echopulse_db_queries_count{view="events"} 1', page)
+
+    def test_budget_overruns_are_logged_and_counted(self):
+        with override_settings(ECHOPULSE_INSTRUMENTATION={"BUDGETS": {"events": {"queries": 0}}}):
+            with self.assertLogs("website.instrumentation", "WARNING") as logs:
+                self.client.get(reverse("events"))
+        self.assertIn("events ran", logs.output[0])
+        self.assertIn(
+            'echopulse_budget_exceeded_total{view="events",budget="queries"} 1', instrumentation.render_metrics()
+        )
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.enable()
+
+    def enable(self, **config):
+        settings_override = override_settings(
+            ECHOPULSE_PROFILING={"ENABLED": True, "DIRECTORY": str(self.directory), "INTERVAL": 0.001, **config}
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_staff_can_profile_a_request(self):
+        self.assertNotIn("X-Profile", self.client.get(reverse("landing"), {"_profile": "1"}))
+        self.client.force_login(User.objects.create_user("admin", password="pw", is_staff=True))
+        name = self.client.get(reverse("album_list"), {"_profile": "1"})["X-Profile"]
+        self.assertTrue((self.directory / f"{name}.prof").exists())
+        capture = json.loads((self.directory / f"{name}.json").read_text())
+        self.assertEqual((capture["view"], capture["status"]), ("album_list", 200))
+
+        out = StringIO()
+        call_command("profiles", "list", stdout=out)
+        self.assertIn(name, out.getvalue())
+        call_command("profiles", "show", name, stdout=out)
+        with self.assertRaises(CommandError):
+            call_command("profiles", "show", "missing", stdout=out)
+
+    def test_tokens_are_signed_and_scoped_to_a_path(self):
+        token = profiling.make_token(reverse("landing"))
+        self.assertIn("X-Profile", self.client.get(reverse("landing"), HTTP_X_PROFILE_TOKEN=token))
+        self.assertNotIn("X-Profile", self.client.get(reverse("album_list"), HTTP_X_PROFILE_TOKEN=token))
+        self.assertNotIn("X-Profile", self.client.get(reverse("landing"), {"_profile": token + "x"}))
+        self.assertIn("X-Profile", self.client.get(reverse("album_list"), {"_profile": profiling.make_token()}))
+
+    def test_sampling_profiler_and_pruning(self):
+        self.enable(PROFILER="sampling", SAMPLE_EVERY=2, MAX_CAPTURES=2)
+        names = [self.client.get(reverse("landing")).get("X-Profile") for _ in range(6)]
+        self.assertEqual([name is not None for name in names], [False, True] * 3)
+        self.assertEqual(sorted(path.stem for path in self.directory.glob("*.json")), sorted(names[3::2]))
+        self.assertEqual(list(self.directory.glob("*.prof")), [])
+
+    def test_disabled_by_default(self):
+        self.enable(ENABLED=False)
+        self.client.force_login(User.objects.create_user("admin", password="pw", is_staff=True))
+        self.assertNotIn("X-Profile", self.client.get(reverse("landing"), {"_profile": "1"}))
+
+
+class AsyncServingTests(TestCase):
+    def test_asgi_stack_runs_without_thread_hops(self):
+        self.assertNotIn("whitenoise.middleware.WhiteNoiseMiddleware", settings.MIDDLEWARE)
+        # Django logs each sync-only middleware it has to adapt.
+        with self.assertNoLogs("django.request", "DEBUG"):
+            ASGIHandler()
+
+    async def test_exports_stream_from_an_async_iterator(self):
+        venue = await Venue.objects.acreate(name="Hall")
+        for number in range(5):
+            await Event.objects.acreate(title=f"Show {number}", date=timezone.now(), venue=venue, description="")
+        client = AsyncClient()
+        with mock.patch("website.api.EXPORT_CHUNK_SIZE", 2):
+            for query in ("", "?format=json"):
+                response = await client.get(reverse("api_event_export") + query)
+                self.assertTrue(response.is_async)
+                chunks = [chunk async for chunk in response.streaming_content]
+                expected = await sync_to_async(
+                    lambda: b"".join(self.client.get(reverse("api_event_export") + query).streaming_content)
+                )()
+                self.assertEqual(b"".join(chunks), expected)
+                self.assertGreaterEqual(len(chunks), 3)
+        self.assertEqual(len(json.loads(b"".join(chunks))), 5)
+
+
+class ImportCatalogTests(TestCase):
+    def run_import(self, content, suffix, model="event"):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, encoding="utf-8") as handle:
+            handle.write(content)
+            handle.flush()
+            stdout, stderr = StringIO(), StringIO()
+            call_command("import_catalog", handle.name, model=model, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_rows_are_upserted_on_the_natural_key(self):
+        rows = [
+            {"title": "Opening", "date": "2026-05-01T20:00:00+00:00", "venue": "Hall, Sydney", "description": "v1"},
+            {"title": "Closing", "date": "2026-05-02T20:00:00+00:00", "venue": "Hall, Sydney", "description": "v1"},
+        ]
+        self.run_import(json.dumps(rows), ".json")
+        rows[0]["description"] = "v2"
+        stdout, _stderr = self.run_import("\n".join(json.dumps(row) for row in rows), ".ndjson")
+        self.assertIn("Imported 2 events", stdout)
+        self.assertEqual(
+            sorted(Event.objects.values_list("title", "description")), [("Closing", "v1"), ("Opening", "v2")]
+        )
+        self.assertEqual(Venue.objects.count(), 1)
+
+        albums = "title,artist,release_date,genre\nLive,Band,2020-01-01,Rock\nLive,Band,2021-01-01,Jazz\n"
+        self.run_import(albums, ".csv", "album")
+        self.assertEqual(list(Album.objects.filter(artist="Band").values_list("title", "genre")), [("Live", "Jazz")])
+
+    def test_malformed_records_are_reported_and_skipped(self):
+        good = json.dumps({"title": "Opening", "date": "2026-05-01T20:00:00", "venue": "Hall", "description": "x"})
+        stdout, stderr = self.run_import(f"{good}\n{{not json\n\n{good.replace('Opening', 'Encore')}\n", ".ndjson")
+        self.assertIn("Imported 2 events (1 skipped)", stdout)
+        self.assertIn("Line 2: invalid JSON", stderr)
+
+        Event.objects.all().delete()
+        content = f"[\n{good},\n{{\"title\": oops, \"x\": [1, \"]\"]}},\n{good.replace('Opening', 'Encore')}\n]"
+        stdout, stderr = self.run_import(content, ".json")
+        self.assertIn("Imported 2 events (1 skipped)", stdout)
+        self.assertIn("Line 3: invalid JSON", stderr)
+        self.assertEqual(sorted(Event.objects.values_list("title", flat=True)), ["Encore", "Opening"])
+
+
+    def test_search_index_re_read_is_bounded_by_the_batch(self):
+        if not search.is_available():
+            self.skipTest("No full-text search index on this database.")
+        rows = [
+            {"title": "Show", "date": f"2026-05-0{day}T20:00:00+00:00", "venue": "Hall", "description": "x"}
+            for day in range(1, 4)
+        ]
+        indexed = []
+        with tempfile.NamedTemporaryFile("w", suffix=".json", encoding="utf-8") as handle:
+            handle.write(json.dumps(rows))
+            handle.flush()
+            with mock.patch.object(search, "index_objects", side_effect=lambda objs: indexed.append(list(objs))):
+                with CaptureQueriesContext(connection) as queries:
+                    call_command("import_catalog", handle.name, model="event", batch_size=1, stdout=StringIO())
+        self.assertEqual([[event.date.day for event in batch] for batch in indexed], [[1], [2], [3]])
+        # Rows sharing a title are not re-read with every later batch.
+        self.assertFalse([query for query in queries.captured_queries if '"title" IN' in query["sql"]])
+
+class NaturalKeyMigrationTests(TransactionTestCase):
+    def test_duplicates_are_merged_before_the_constraints(self):
+        from django.db.migrations.executor import MigrationExecutor
+
+        before, after = [("website", "0008_search_index")], [("website", "0009_natural_keys")]
+        executor = MigrationExecutor(connection)
+        executor.migrate(before)
+        old = executor.loader.project_state(before).apps
+        OldAlbum, OldEvent = old.get_model("website", "Album"), old.get_model("website", "Event")
+        OldFavorite, OldUser = old.get_model("website", "UserFavoriteAlbum"), old.get_model("auth", "User")
+        kept, copy, other = (
+            OldAlbum.objects.create(title=title, artist="Band", release_date=datetime.date(2020, 1, 1), genre="Rock")
+            for title in ("Live", "Live", "Studio")
+        )
+        both, only_copy = OldUser.objects.create(username="both"), OldUser.objects.create(username="copy")
+        OldFavorite.objects.create(user=both, album=kept)
+        OldFavorite.objects.create(user=both, album=copy)
+        OldFavorite.objects.create(user=only_copy, album=copy)
+        date = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        for _ in range(2):
+            OldEvent.objects.create(title="Show", date=date, venue="Hall", description="")
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(after)
+        new = executor.loader.project_state(after).apps
+        self.assertEqual(
+            sorted(new.get_model("website", "Album").objects.filter(artist="Band").values_list("id", flat=True)),
+            [kept.id, other.id],
+        )
+        self.assertEqual(
+            sorted(new.get_model("website", "UserFavoriteAlbum").objects.values_list("user__username", "album_id")),
+            [("both", kept.id), ("copy", kept.id)],
+        )
+        self.assertEqual(new.get_model("website", "Event").objects.count(), 1)
+
+    def tearDown(self):
+        from django.db.migrations.executor import MigrationExecutor
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class VotingTests(TestCase):
+    def setUp(self):
+        # A buffer without its background thread, flushed by the tests.
+        self.buffer = voting.VoteBuffer(flush_interval=3600, max_pending=10000, batch_size=1000)
+        self.buffer._stopping.set()
+        patcher = mock.patch.object(voting, "buffer", self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.album = Album.objects.create(
+            title="Live", artist="Band", release_date=datetime.date(2020, 1, 1), genre="Rock"
+        )
+        self.fans = [User.objects.create_user(f"fan{number}") for number in range(3)]
+
+    def vote(self, user):
+        self.client.force_login(user)
+        return self.client.post(reverse("vote_album", args=[self.album.id])).json()
+
+    def test_votes_are_buffered_then_flushed_in_one_batch(self):
+        self.assertEqual(self.vote(self.fans[0]), {"accepted": True, "votes": 1})
+        self.assertEqual(self.vote(self.fans[0]), {"accepted": False, "votes": 1})
+        self.assertEqual(self.vote(self.fans[1]), {"accepted": True, "votes": 2})
+        self.assertEqual(FanVote.objects.count(), 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.buffer.flush(), 2)
+        # Counts move by the batch's own rows; no album's votes are recounted.
+        self.assertEqual(len(queries), 8)
+        self.assertFalse([query for query in queries.captured_queries if "COUNT(" in query["sql"]])
+        self.album.refresh_from_db()
+        self.assertEqual((self.album.vote_count, FanVote.objects.count()), (2, 2))
+        self.assertEqual(voting.live_tallies([self.album.id]), {self.album.id: 2})
+
+    def test_failed_flush_keeps_the_votes(self):
+        self.vote(self.fans[0])
+        with mock.patch.object(FanVote.objects, "bulk_create", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_persisted_votes_are_refused(self):
+        self.vote(self.fans[0])
+        self.buffer.flush()
+        self.assertEqual(self.vote(self.fans[0]), {"accepted": False, "votes": 1})
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_votes_pending_in_another_process_are_refused(self):
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+        with override_settings(ECHOPULSE_PAGE_CACHE={"SHARED_ALIAS": "default"}):
+            self.assertTrue(voting.cast_vote(self.fans[0], self.album.id))
+            other = voting.VoteBuffer(flush_interval=3600, max_pending=10000, batch_size=1000)
+            with mock.patch.object(voting, "buffer", other):
+                self.assertFalse(voting.cast_vote(self.fans[0], self.album.id))
+            self.assertEqual(len(other), 0)
+
+    def test_votes_written_by_another_process_are_not_counted_twice(self):
+        for fan in self.fans[:2]:
+            voting.cast_vote(fan, self.album.id)
+        bulk_create = FanVote.objects.bulk_create
+
+        def race(votes, **kwargs):
+            # Another process writes one of the same votes, and counts it, first.
+            FanVote.objects.create(user=self.fans[0], album=self.album)
+            Album.objects.filter(id=self.album.id).update(vote_count=F("vote_count") + 1)
+            return bulk_create(votes, **kwargs)
+
+        with mock.patch.object(FanVote.objects, "bulk_create", side_effect=race):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.album.refresh_from_db()
+        self.assertEqual((self.album.vote_count, FanVote.objects.count()), (2, 2))
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class QueryBudgetTests(TestCase):
+    """Every route stays within its configured query budget on a seeded catalog."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed()
+
+    def setUp(self):
+        # Measure the uncached path; a page cache hit costs no queries at all.
+        page_cache.clear()
+        objects.object_cache.clear()
+        self.addCleanup(trending.interest.clear)
+
+    def test_every_route_has_a_budget(self):
+        routes, _skipped = benchmark.discover_routes()
+        budgets = instrumentation.get_config()["BUDGETS"]
+        missing = sorted(name for name in routes if "queries" not in budgets.get(name, {}))
+        self.assertEqual(missing, [], "Add query budgets to ECHOPULSE_INSTRUMENTATION['BUDGETS'].")
+
+    def test_routes_within_query_budget(self):
+        routes, _skipped = benchmark.discover_routes()
+        budgets = instrumentation.get_config()["BUDGETS"]
+        for name, paths in routes.items():
+            budget = budgets.get(name, {}).get("queries")
+            if budget is None:
+                continue
+            for path in paths:
+                with self.subTest(route=name, path=path):
+                    page_cache.clear()
+                    objects.object_cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(path)
+                        if response.streaming:
+                            b"".join(response.streaming_content)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(
+                        len(queries),
+                        budget,
+                        "\n".join(query["sql"] for query in queries.captured_queries),
+                    )
+
+    def test_logged_in_home_within_query_budget(self):
+        fan = User.objects.filter(favorite_albums__isnull=False).first()
+        call_command("refresh_trending", full=True, stdout=StringIO())
+        self.client.force_login(fan)
+        sessions._local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("home_authenticated"))
+        self.assertTrue(response.context["recommendations"] or response.context["trending"]["albums"])
+        self.assertLessEqual(
+            len(queries),
+            instrumentation.get_config()["BUDGETS"]["home_authenticated"]["queries"],
+            "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+
+
+class SeedBenchTests(TestCase):
+    def fingerprint(self):
+        digest = hashlib.sha256()
+        for row in Event.objects.order_by("title").values_list(
+            "title", "date", "venue__name", "venue__city", "description"
+        ):
+            digest.update(repr(row).encode())
+        for row in Album.objects.order_by("title").values_list("title", "artist", "release_date", "genre", "favorite_count"):
+            digest.update(repr(row).encode())
+        for row in UserFavoriteAlbum.objects.order_by("user__username", "album__title").values_list(
+            "user__username", "album__title"
+        ):
+            digest.update(repr(row).encode())
+        return digest.hexdigest()
+
+    def test_seeding_is_deterministic(self):
+        seed(skip_search_index=True)
+        first = self.fingerprint()
+        seed(skip_search_index=True, replace=True)
+        self.assertEqual(self.fingerprint(), first)
+        self.assertEqual(Event.objects.count(), BENCH_SCALE)
+        self.assertEqual(Album.objects.filter(title__startswith="Bench Album ").count(), BENCH_SCALE)
+
+    def test_favorite_counts_match_favorites(self):
+        seed(skip_search_index=True)
+        for album in Album.objects.filter(favorite_count__gt=0)[:20]:
+            self.assertEqual(album.favorite_count, album.favorited_by.count())
+
+    def test_refuses_to_seed_twice(self):
+        seed(skip_search_index=True)
+        with self.assertRaises(CommandError):
+            seed(skip_search_index=True)
+
+
+class PercentileTests(TestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.50), 50)
+        self.assertEqual(benchmark.percentile(values, 0.95), 95)
+        self.assertEqual(benchmark.percentile(values, 0.99), 99)
+        self.assertEqual(benchmark.percentile([], 0.5), 0.0)
+
+
+@override_settings(ECHOPULSE_INSTRUMENTATION={"BUDGETS": {"landing": {"queries": 2, "ms": 100}}})
+class RunBenchBudgetTests(TestCase):
+    def result(self, **values):
+        return {
+            "throughput_rps": 500.0, "p50_ms": 1.0, "p95_ms": 2.0, "p99_ms": 3.0, "mean_bytes": 100, "max_queries": 1,
+            **values,
+        }
+
+    def bench(self, result, output):
+        with mock.patch.object(benchmark, "run", return_value={"landing": result}):
+            call_command(
+                "run_bench", url="http://bench.invalid", routes=["landing"], output=output,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+
+    def test_fails_when_a_route_is_over_budget(self):
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            self.bench(self.result(), output.name)
+            for result, message in (
+                (self.result(max_queries=3), "landing ran 3 queries (budget 2)."),
+                (self.result(p95_ms=150.0), "landing p95 was 150.0ms (budget 100ms)."),
+            ):
+                with self.subTest(message=message):
+                    with self.assertRaisesMessage(CommandError, message):
+                        self.bench(result, output.name)
+                    # The report is still written.
+                    with open(output.name) as handle:
+                        self.assertEqual(json.load(handle)["budget_violations"], [message])
+
+    def test_query_counts_come_from_server_timing(self):
+        headers = {"Server-Timing": 'db;dur=1.5;desc="3 queries", tpl;dur=0.2, total;dur=4.0'}
+        self.assertEqual(benchmark._queries(headers), 3)
+        self.assertIsNone(benchmark._queries({}))
+        unmeasured = {"landing": self.result(max_queries=None)}
+        self.assertEqual(benchmark.budget_violations(unmeasured, {"landing": {"queries": 0}}), [])
+
+
+class StubHealthRouter(routers.PrimaryReplicaRouter):
+    down = ()
+
+    def healthy(self, alias):
+        return alias not in self.down
+
+
+REPLICAS = {"ALIASES": ["replica_a", "replica_b"]}
+
+
+@override_settings(ECHOPULSE_REPLICAS=REPLICAS)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = StubHealthRouter()
+
+    def read(self, model=Event):
+        return self.router.db_for_read(model)
+
+    def test_catalog_reads_rotate_over_replicas(self):
+        self.assertEqual({self.read(), self.read()}, {"replica_a", "replica_b"})
+
+    def test_other_models_read_from_primary(self):
+        self.assertEqual(self.read(User), "default")
+
+    def test_unhealthy_replicas_are_skipped(self):
+        self.router.down = ("replica_a",)
+        self.assertEqual({self.read() for _ in range(4)}, {"replica_b"})
+        self.router.down = ("replica_a", "replica_b")
+        self.assertEqual(self.read(), "default")
+
+    def test_writes_pin_the_request_to_the_primary(self):
+        self.assertTrue(self.read().startswith("replica"))
+        with routers.use_primary():
+            self.assertEqual(self.read(), "default")
+        state = {"value": False, "wrote": False, "parent": None}
+        token = routers._pinned.set(state)
+        try:
+            self.assertEqual(self.router.db_for_write(Album), "default")
+            self.assertEqual(self.read(), "default")
+            self.assertTrue(state["wrote"])
+        finally:
+            routers._pinned.reset(token)
+
+
+@override_settings(ECHOPULSE_REPLICAS=REPLICAS)
+class PrimaryReplicaTransactionTests(TestCase):
+    def test_reads_inside_a_transaction_use_the_primary(self):
+        # TestCase runs every test inside a transaction on default.
+        self.assertEqual(StubHealthRouter().db_for_read(Event), "default")
+
+
+class SQLiteProfileTests(TransactionTestCase):
+    # Some pragmas cannot be changed inside the transaction TestCase opens.
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_apply_only_in_production_mode(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only.")
+        with override_settings(ECHOPULSE_SQLITE={"PRODUCTION": False}):
+            sqlite.configure_connection(connection)
+        self.assertNotEqual(self.pragma("cache_size"), -64000)
+        with override_settings(ECHOPULSE_SQLITE={"PRODUCTION": True}):
+            sqlite.configure_connection(connection)
+        self.assertEqual(self.pragma("cache_size"), -64000)
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class SessionCacheTests(TestCase):
+    def setUp(self):
+        sessions._local.clear()
+        self.user = User.objects.create_user("fan", password="fan-password")
+        self.client.login(username="fan", password="fan-password")
+
+    def test_authenticated_page_view_runs_no_queries_on_a_cache_hit(self):
+        self.client.get(reverse("home_authenticated"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home_authenticated"))
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+
+    def test_saving_the_user_evicts_the_cached_user(self):
+        self.client.get(reverse("home_authenticated"))
+        self.user.set_password("changed-password")
+        self.user.save()
+        response = self.client.get(reverse("home_authenticated"))
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_logout_evicts_the_session(self):
+        key = self.client.session.session_key
+        self.client.get(reverse("logout"))
+        self.assertFalse(sessions.SessionStore().exists(key))
+
+    def test_write_behind_keys_skip_the_database(self):
+        key = self.client.session.session_key
+        store = sessions.SessionStore(key)
+        store["last_activity"] = 5
+        with self.assertNumQueries(0):
+            store.save()
+        self.assertNotIn("last_activity", Session.objects.get(pk=key).get_decoded())
+
+        store = sessions.SessionStore(key)
+        store["theme"] = "dark"
+        store.save()
+        stored = Session.objects.get(pk=key).get_decoded()
+        self.assertEqual((stored["theme"], stored["last_activity"]), ("dark", 5))
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_bucket_allows_its_capacity_then_rejects(self):
+        buckets = throttling.TokenBuckets(10)
+        self.assertEqual(buckets.take("k", 2, 60), (True, 0.0))
+        self.assertEqual(buckets.take("k", 2, 60), (True, 0.0))
+        allowed, wait = buckets.take("k", 2, 60)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 1.0, places=1)
+
+    def test_short_waits_are_delayed_instead_of_rejected(self):
+        buckets = throttling.TokenBuckets(10)
+        buckets.take("k", 1, 600)
+        allowed, wait = buckets.take("k", 1, 600, max_delay=0.5)
+        self.assertTrue(allowed)
+        self.assertAlmostEqual(wait, 0.1, places=2)
+
+
+THROTTLING = {"RATES": {"ip": {"capacity": 10, "per_minute": 1}, "username": {"capacity": 2, "per_minute": 1}}}
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE, ECHOPULSE_THROTTLING=THROTTLING)
+class LoginThrottlingTests(TestCase):
+    def setUp(self):
+        throttling.buckets.clear()
+        instrumentation.registry.clear()
+
+    def test_repeated_logins_for_one_username_are_rejected(self):
+        for _ in range(2):
+            response = self.client.post(reverse("login"), {"username": "Fan", "password": "wrong"})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse("login"), {"username": "fan", "password": "wrong"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertIn(
+            'echopulse_throttled_requests_total{bucket="username",outcome="rejected"} 1',
+            instrumentation.render_metrics(),
+        )
+
+    def test_registrations_share_the_ip_bucket(self):
+        for _ in range(10):
+            self.client.post(reverse("register"), {"username": ""})
+        self.assertEqual(self.client.post(reverse("register"), {"username": ""}).status_code, 429)
+
+
+class CountingObjectCache(objects.ObjectCache):
+    def __init__(self):
+        super().__init__(10, 10)
+        self.queries = 0
+
+    def _query(self, model, pk, key):
+        self.queries += 1
+        time.sleep(0.05)
+        self._remember(key, objects.MISSING)
+        return objects.MISSING
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        objects.object_cache.clear()
+
+    def test_missing_ids_are_404s_and_cached(self):
+        url = reverse("event_detail", args=[987654])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_saving_invalidates_the_entry(self):
+        event = Event.objects.create(
+            title="Opening Night",
+            date=datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc),
+            venue=Venue.objects.create(name="Hall"),
+            description="",
+        )
+        self.assertEqual(objects.object_cache.get(Event, event.pk).title, "Opening Night")
+        with self.assertNumQueries(0):
+            objects.object_cache.get(Event, event.pk)
+        event.title = "Closing Night"
+        event.save()
+        self.assertEqual(objects.object_cache.get(Event, event.pk).title, "Closing Night")
+
+    def test_creating_a_row_invalidates_its_miss(self):
+        self.assertIsNone(objects.object_cache.get(Album, 424242))
+        Album.objects.create(
+            id=424242, title="Late Arrival", artist="Someone", release_date=datetime.date(2020, 1, 1), genre="Jazz"
+        )
+        self.assertEqual(objects.object_cache.get(Album, 424242).title, "Late Arrival")
+
+    def test_concurrent_misses_query_once(self):
+        cache = CountingObjectCache()
+        threads = [threading.Thread(target=cache.get, args=(Event, 1)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.queries, 1)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class SnapshotTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        config = {"ENABLED": True, "DIRECTORY": directory.name, "CHECK_INTERVAL": 0}
+        overrides = override_settings(ECHOPULSE_SNAPSHOTS=config)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.results = snapshots.render()
+
+    def test_anonymous_pages_are_served_from_snapshots(self):
+        self.assertEqual(set(self.results), {"landing", "artists", "album_list", "events"})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("events"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Cookie", response["Vary"])
+
+    def test_snapshots_carry_the_security_headers_of_rendered_pages(self):
+        rendered = self.client.get(reverse("events"), {"when": "past"})
+        snapshot = self.client.get(reverse("events"))
+        self.assertIsInstance(snapshot, WhiteNoiseFileResponse)
+        for header in ("X-Frame-Options", "X-Content-Type-Options", "Referrer-Policy", "Cross-Origin-Opener-Policy"):
+            with self.subTest(header=header):
+                self.assertEqual(snapshot.get(header), rendered[header])
+        with override_settings(X_FRAME_OPTIONS="SAMEORIGIN"):
+            self.assertEqual(self.client.get(reverse("events"))["X-Frame-Options"], "SAMEORIGIN")
+
+    def test_other_requests_reach_the_views(self):
+        response = self.client.get(reverse("events"), {"when": "past"})
+        self.assertNotIsInstance(response, WhiteNoiseFileResponse)
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "anything"
+        self.assertNotIsInstance(self.client.get(reverse("events")), WhiteNoiseFileResponse)
+
+    def test_render_swaps_generations(self):
+        first = snapshots.current_generation()
+        snapshots.render()
+        self.assertNotEqual(snapshots.current_generation(), first)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class StylesheetAndCompressionTests(TestCase):
+    def test_pages_link_the_shared_stylesheet(self):
+        for name in ("landing", "login", "artists", "album_list", "events"):
+            response = self.client.get(reverse(name))
+            self.assertContains(response, '<link rel="stylesheet" href="/static/website/echopulse.css">')
+            self.assertNotContains(response, "<style")
+
+    def test_html_responses_are_gzipped(self):
+        response = self.client.get(reverse("artists"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertIn(b"Our Artists", gzip.decompress(response.content))
+
+    def test_pages_with_a_csrf_token_use_gzip(self):
+        response = self.client.get(reverse("login"), HTTP_ACCEPT_ENCODING="br, gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    @skipUnless(middleware.brotli, "brotli is not installed")
+    def test_brotli_is_preferred(self):
+        response = self.client.get(reverse("artists"), HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertIn(b"Our Artists", middleware.brotli.decompress(response.content))
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE, ECHOPULSE_RECOMMENDATIONS={"MIN_TOGETHER": 1})
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.albums = {
+            title: Album.objects.create(title=title, artist="Band", release_date=datetime.date(2020, 1, 1), genre="Rock")
+            for title in "ABCDE"
+        }
+        self.users = {}
+        for name, titles in (("u1", "AB"), ("u2", "ABC"), ("u3", "CD")):
+            self.favorite(name, titles)
+
+    def favorite(self, name, titles):
+        user = self.users.get(name) or User.objects.create_user(name)
+        self.users[name] = user
+        favorites.add_favorites(user, [self.albums[title].id for title in titles])
+
+    def titles(self, albums):
+        return [album.title for album in albums]
+
+    def test_full_build_ranks_by_cosine_similarity(self):
+        run = recommendations.build()
+        self.assertTrue(run.full)
+        picks = recommendations.for_album(self.albums["A"].id)
+        self.assertEqual(self.titles(picks), ["B", "C"])
+        self.assertEqual([round(pick.score, 3) for pick in picks], [1.0, 0.5])
+
+    def test_incremental_build_recomputes_touched_albums(self):
+        recommendations.build()
+        self.favorite("u4", "DE")
+        run = recommendations.build()
+        self.assertFalse(run.full)
+        self.assertEqual(run.albums_changed, 2)
+        self.assertEqual(self.titles(recommendations.for_album(self.albums["E"].id)), ["D"])
+        self.assertEqual(recommendations.build().albums_changed, 0)
+
+    def test_user_recommendations_skip_their_favorites(self):
+        recommendations.build()
+        self.assertEqual(self.titles(recommendations.for_user(self.users["u1"])), ["C"])
+
+    def test_album_page_lists_recommendations(self):
+        recommendations.build()
+        response = self.client.get(reverse("album_detail", args=[self.albums["A"].id]))
+        self.assertContains(response, "Fans Also Liked")
+        self.assertEqual(self.titles(response.context["recommendations"]), ["B", "C"])
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.albums = {
+            title: Album.objects.create(title=title, artist="Band", release_date=datetime.date(2020, 1, 1), genre="Rock")
+            for title in "AB"
+        }
+        self.addCleanup(trending.interest.clear)
+
+    def favorite(self, title, ago, name=None):
+        user = User.objects.create_user(name or f"fan{User.objects.count()}")
+        favorites.add_favorites(user, [self.albums[title].id])
+        UserFavoriteAlbum.objects.filter(user=user).update(created_at=self.now - ago)
+
+    def refresh(self, at, full=False):
+        with mock.patch("website.trending.timezone.now", return_value=at):
+            return trending.refresh(full=full)
+
+    def titles(self, kind, window):
+        return [row.title for row in trending.top(kind, window)]
+
+    def test_older_activity_decays(self):
+        self.favorite("A", datetime.timedelta(days=3))
+        self.favorite("A", datetime.timedelta(days=3))
+        self.favorite("B", datetime.timedelta(hours=1))
+        self.refresh(self.now)
+        self.assertEqual(self.titles("album", "7d"), ["B", "A"])
+        self.assertEqual(self.titles("album", "all"), ["A", "B"])
+        self.assertEqual(self.titles("album", "24h"), ["B"])
+
+    @override_settings(ECHOPULSE_TRENDING={"WINDOWS": {"1h": {"SECONDS": 3600, "HALF_LIFE": 600}}})
+    def test_incremental_refresh_matches_a_full_one(self):
+        self.favorite("A", datetime.timedelta(minutes=50))
+        self.refresh(self.now)
+        self.assertEqual(self.titles("album", "1h"), ["A"])
+        self.favorite("B", -datetime.timedelta(minutes=5))
+        self.refresh(self.now + datetime.timedelta(minutes=15))
+        incremental = {row.title: row.score for row in trending.top("album", "1h")}
+        self.assertEqual(list(incremental), ["B"])
+        self.refresh(self.now + datetime.timedelta(minutes=15), full=True)
+        full = {row.title: row.score for row in trending.top("album", "1h")}
+        # The same score, against an epoch moved on by 1.5 half-lives.
+        self.assertAlmostEqual(incremental["B"] / full["B"], 2 ** 1.5)
+
+    def test_event_page_views_count_as_interest(self):
+        event = Event.objects.create(
+            title="Opening Night", date=self.now, venue=Venue.objects.create(name="Hall"), description=""
+        )
+        for _ in range(3):
+            self.client.get(reverse("event_detail", args=[event.id]))
+        self.client.get(reverse("event_detail", args=[event.id + 1]))
+        self.assertEqual(trending.interest.flush(), 3)
+        self.refresh(self.now + datetime.timedelta(seconds=1))
+        (row,) = trending.top("event", "all")
+        self.assertEqual((row.title, round(row.score, 3)), ("Opening Night", 0.3))
+
+    def test_home_page_shows_trending_albums(self):
+        self.favorite("A", datetime.timedelta(hours=1))
+        self.refresh(self.now)
+        page_cache.clear()
+        self.assertContains(self.client.get(reverse("home_authenticated")), "Trending Now")
+
+
+LIVE = {"POLL_INTERVAL": 0.01, "HEARTBEAT": 0.05, "MAX_AGE": 5.0}
+
+
+@override_settings(ECHOPULSE_LIVE=LIVE)
+class LiveFeedTests(TestCase):
+    def setUp(self):
+        live.broadcaster.reset()
+        self.addCleanup(live.broadcaster.reset)
+
+    def create_event(self, title):
+        venue, _created = Venue.objects.get_or_create(name="Hall")
+        return Event.objects.create(title=title, date=timezone.now(), venue=venue, description="")
+
+    def test_feed_reports_saved_and_deleted_events(self):
+        feed = live.ChangeFeed()
+        self.assertEqual(feed.poll(), [])
+        event = self.create_event("Encore")
+        ((name, events),) = feed.poll()
+        self.assertEqual((name, [row["title"] for row in events]), ("events", ["Encore"]))
+        self.assertEqual(feed.poll(), [])
+        event.delete()
+        self.assertEqual(feed.poll(), [("events", [])])
+
+    def test_feed_reports_tallies_of_voted_albums(self):
+        album = Album.objects.create(title="Live", artist="Band", release_date=datetime.date(2020, 1, 1), genre="Rock")
+        user = User.objects.create_user("voter")
+        feed = live.ChangeFeed()
+        feed.poll()
+        albums_before = data_versions.get_many(["website.Album"])
+        voting.cast_vote(user, album.id)
+        voting.buffer.flush()
+        # Votes move their own version, leaving cached album pages alone.
+        self.assertEqual(data_versions.get_many(["website.Album"]), albums_before)
+        self.assertEqual(feed.poll(), [("votes", {str(album.id): 1})])
+        album.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(feed.poll(), [])
+
+    async def next_frame(self, stream):
+        while True:
+            chunk = await asyncio.wait_for(anext(stream), 2)
+            if chunk != live.KEEPALIVE:
+                return chunk
+
+    async def test_stream_is_served_as_server_sent_events(self):
+        response = await AsyncClient().get(reverse("live_feed"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(await anext(aiter(response.streaming_content)), b"retry: 3000\n\n")
+
+    async def test_changes_reach_every_stream_from_one_poll(self):
+        streams = [live.broadcaster.stream() for _ in range(3)]
+        for stream in streams:
+            await anext(stream)
+        self.assertEqual(live.broadcaster.clients, 3)
+        while live.broadcaster.backend().feed.state is None:
+            await asyncio.sleep(0.01)
+        await sync_to_async(self.create_event)("Encore")
+        chunks = [await self.next_frame(stream) for stream in streams]
+        self.assertEqual(len(set(chunks)), 1)
+        self.assertRegex(chunks[0], rb"^id: \d+\nevent: events\ndata: .*Encore")
+        for stream in streams:
+            await stream.aclose()
+        self.assertEqual(live.broadcaster.clients, 0)
+
+    async def test_reconnecting_streams_resume_or_reload(self):
+        live.broadcaster.publish([(7, "votes", {"1": 1}), (8, "votes", {"1": 2})])
+        resumed = live.broadcaster.stream(last_event_id=7)
+        await anext(resumed)
+        self.assertEqual(await anext(resumed), live.frame(8, "votes", {"1": 2}))
+        await resumed.aclose()
+        stale = live.broadcaster.stream(last_event_id=3)
+        await anext(stale)
+        self.assertEqual(await anext(stale), live.frame(None, "reload", {}))
+        await stale.aclose()
+
+    def test_cache_backend_shares_one_poller_between_processes(self):
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+        with override_settings(ECHOPULSE_PAGE_CACHE={"SHARED_ALIAS": "default"}):
+            leader, follower = live.CacheBackend(), live.CacheBackend()
+            self.assertEqual(leader.receive() + follower.receive(), [])
+            self.create_event("Encore")
+            with mock.patch.object(follower.feed, "poll") as poll:
+                published = leader.receive()
+                self.assertEqual(follower.receive(), published)
+            poll.assert_not_called()
+        (message,) = published
+        self.assertEqual(message[1], "events")
+
+    def test_feed_is_not_served_under_wsgi(self):
+        self.assertEqual(self.client.get(reverse("live_feed")).status_code, 204)
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """A local SMTP server that records the recipients of each message it accepts."""
+
+    daemon_threads = True
+
+    def __init__(self, refuse=()):
+        super().__init__(("127.0.0.1", 0), SMTPStandInHandler)
+        self.refuse = set(refuse)
+        self.fail_next = 0
+        self.connections = 0
+        self.delivered = []
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 stand-in")
+        recipients = []
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "MAIL":
+                if server.fail_next:
+                    server.fail_next -= 1
+                    self.reply("421 Try again later")
+                    return
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip(" <>")
+                if address in server.refuse:
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                server.delivered.extend(recipients)
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+NEWSLETTER = {"BATCH_SIZE": 10, "RATE": 1000.0, "MAX_RETRIES": 1, "RETRY_DELAY": 0, "SITE_URL": "https://echopulse.test"}
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE, ECHOPULSE_NEWSLETTER=NEWSLETTER)
+class NewsletterTests(TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn(refuse={"refused@example.com"})
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        overrides = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=self.smtp.server_address[1],
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def subscribers(self, count):
+        for number in range(count):
+            newsletter.subscribe(f"fan{number}@example.com")
+        newsletter.subscribe("refused@example.com")
+        newsletter.subscribe("gone@example.com")
+        newsletter.unsubscribe("gone@example.com")
+
+    def queue(self):
+        with mock.patch.object(newsletter.worker, "wake") as wake, self.captureOnCommitCallbacks(execute=True):
+            issue = newsletter.queue_issue("Tour dates", "We're back on the road.")
+        wake.assert_called_once()
+        return issue
+
+    def test_subscriptions_are_normalized_and_idempotent(self):
+        newsletter.subscribe("  Fan@Example.COM ")
+        newsletter.subscribe("fan@example.com")
+        self.assertEqual(Subscriber.objects.get().email, "fan@example.com")
+        self.assertTrue(newsletter.unsubscribe("FAN@example.com"))
+        self.assertFalse(newsletter.unsubscribe("fan@example.com"))
+        newsletter.subscribe("fan@example.com")
+        self.assertIsNone(Subscriber.objects.get().unsubscribed_at)
+        with self.assertRaises(ValidationError):
+            newsletter.subscribe("not an address")
+
+    def test_views_store_subscriptions(self):
+        self.client.force_login(User.objects.create_user("fan"))
+        self.client.post(reverse("subscribe"), {"email": "Fan@Example.com"})
+        self.assertTrue(Subscriber.objects.filter(email="fan@example.com", unsubscribed_at=None).exists())
+        self.assertEqual(self.client.post(reverse("subscribe"), {"email": "nope"}).status_code, 400)
+        link = newsletter.unsubscribe_url("fan@example.com").removeprefix("https://echopulse.test")
+        self.assertContains(self.client.get(link), "fan@example.com")
+        self.assertContains(self.client.post(link), "successfully unsubscribed")
+        self.assertIsNotNone(Subscriber.objects.get().unsubscribed_at)
+        self.assertContains(self.client.get(reverse("unsubscribe") + "?token=forged"), "not valid")
+
+    def test_delivery_sends_batches_over_one_connection(self):
+        self.subscribers(24)
+        issue = self.queue()
+        with mock.patch("website.newsletter.render_to_string", wraps=newsletter.render_to_string) as render:
+            self.assertEqual(newsletter.work(), [issue])
+        issue.refresh_from_db()
+        self.assertEqual((issue.status, issue.sent_count, issue.failed_count), (NewsletterIssue.SENT, 24, 1))
+        self.assertEqual(sorted(self.smtp.delivered), sorted(f"fan{number}@example.com" for number in range(24)))
+        self.assertEqual(self.smtp.connections, 1)
+        # A text and an HTML rendering for each batch of 10.
+        self.assertEqual(render.call_count, 6)
+
+    def test_failed_delivery_retries_and_resumes_where_it_stopped(self):
+        self.subscribers(15)
+        issue = self.queue()
+        self.smtp.fail_next = 1
+        with self.assertLogs("website.newsletter", "WARNING"):
+            newsletter.work()
+        self.assertEqual(self.smtp.connections, 2)
+        self.assertEqual(len(self.smtp.delivered), 15)
+
+        second = self.queue()
+        newsletter.subscribe("late@example.com")
+        self.smtp.fail_next = 2
+        with self.assertLogs("website.newsletter", "ERROR"):
+            self.assertEqual(newsletter.work(), [second])
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.sent_count), (NewsletterIssue.FAILED, 0))
+        call_command("send_newsletter", retry=second.pk, stdout=StringIO())
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.sent_count), (NewsletterIssue.SENT, 16))
+        self.assertEqual(len(self.smtp.delivered), 31)
+        issue.refresh_from_db()
+        self.assertEqual(issue.status, NewsletterIssue.SENT)
+
+
+class VenueTests(TestCase):
+    def setUp(self):
+        page_cache.clear()
+        objects.object_cache.clear()
+        self.addCleanup(trending.interest.clear)
+        self.soon = timezone.now() + datetime.timedelta(days=7)
+        self.opera = Venue.objects.create(name="Opera House", city="Sydney", latitude=-33.8568, longitude=151.2153)
+        self.arena = Venue.objects.create(name="Arena", city="Sydney", latitude=-33.8470, longitude=151.0634)
+        self.dome = Venue.objects.create(name="Dome", city="Tokyo", latitude=35.7056, longitude=139.7519)
+        for venue in (self.opera, self.arena, self.dome):
+            Event.objects.create(title=f"Live at {venue.name}", date=self.soon, venue=venue, description="")
+
+    def titles(self, response):
+        return sorted(row["title"] for row in response.json()["results"])
+
+    def test_parse_splits_names_cities_and_countries(self):
+        self.assertEqual(venues.parse("  Opera   House "), ("Opera House", "", ""))
+        self.assertEqual(venues.parse("Opera House, Sydney"), ("Opera House", "Sydney", ""))
+        self.assertEqual(
+            venues.parse("Hall, Opera House, Sydney, Australia"), ("Hall, Opera House", "Sydney", "Australia")
+        )
+
+    def test_listings_filter_by_venue_and_city(self):
+        response = self.client.get(reverse("events") + f"?venue={self.opera.id}")
+        self.assertContains(response, "Live at Opera House")
+        self.assertNotContains(response, "Live at Arena")
+        self.assertContains(response, f"?when=past&amp;venue={self.opera.id}")
+        response = self.client.get(reverse("events") + "?city=sydney")
+        self.assertContains(response, "Live at Arena")
+        self.assertNotContains(response, "Live at Dome")
+
+        api = reverse("api_event_list")
+        self.assertEqual(self.titles(self.client.get(api + "?city=Tokyo")), ["Live at Dome"])
+        (row,) = self.client.get(api + f"?venue={self.arena.id}").json()["results"]
+        self.assertEqual((row["venue"], row["venue_id"], row["city"]), ("Arena", self.arena.id, "Sydney"))
+        self.assertEqual(self.client.get(api + "?venue=nope").json()["results"], [])
+        names = [row["name"] for row in self.client.get(reverse("api_venue_list") + "?city=SYDNEY").json()["results"]]
+        self.assertEqual(names, ["Opera House", "Arena"])
+
+    def test_filters_and_bounding_box_use_the_indexes(self):
+        by_venue = Event.objects.filter(venue_id=self.opera.id, date__gte=timezone.now()).order_by("date", "id")
+        self.assertIn("website_event_venue_date_idx", by_venue.explain())
+        nearby = Venue.objects.filter(venues.bounding_box(-33.87, 151.21, 20))
+        self.assertIn("website_venue_location_idx", nearby.explain())
+        request = mock.Mock(GET={"city": "Sydney"})
+        in_city = Venue.objects.filter(id__in=venues.listing_filters(request)["venue__in"])
+        self.assertIn("website_venue_city_key_idx", in_city.explain())
+
+    def test_names_and_cities_match_whatever_their_case(self):
+        resolver = venues.VenueResolver()
+        self.assertEqual(resolver.resolve("opera  HOUSE", "sydney"), self.opera.id)
+        strasse = Venue.objects.create(name="Halle", city="Straße")
+        self.assertEqual(venues.VenueResolver().resolve("HALLE", "STRASSE"), strasse.id)
+        self.assertEqual(Venue.objects.count(), 4)
+
+    def test_nearby_events_are_within_the_radius(self):
+        url = reverse("api_event_nearby")
+        self.assertEqual(self.titles(self.client.get(url + "?lat=-33.87&lon=151.21&km=5")), ["Live at Opera House"])
+        self.assertEqual(
+            self.titles(self.client.get(url + "?lat=-33.87&lon=151.21&km=30")),
+            ["Live at Arena", "Live at Opera House"],
+        )
+        self.assertEqual(self.client.get(url + "?lat=0&lon=0").json(), {"results": []})
+        for query in ("", "?lat=north&lon=0", "?lat=91&lon=0", "?lat=0&lon=0&km=-1"):
+            self.assertEqual(self.client.get(url + query).status_code, 400)
+
+    def test_bounding_box_wraps_around_the_antimeridian(self):
+        fiji = Venue.objects.create(name="Stadium", city="Suva", latitude=-18.1, longitude=179.9)
+        samoa = Venue.objects.create(name="Park", city="Apia", latitude=-18.1, longitude=-179.9)
+        self.assertEqual(set(venues.nearby_venues(-18.1, 179.95, 50)), {fiji.id, samoa.id})
+
+    def test_editing_a_venue_refreshes_its_events(self):
+        event = Event.objects.get(venue=self.opera)
+        page = reverse("event_detail", args=[event.id])
+        self.assertContains(self.client.get(page), "Opera House")
+        self.opera.name = "Sydney Opera House"
+        self.opera.save()
+        self.assertGreater(Event.objects.get(pk=event.pk).updated_at, event.updated_at)
+        self.assertContains(self.client.get(page), "Sydney Opera House")
+        self.assertEqual(self.titles(self.client.get(reverse("api_event_list") + "?city=Sydney")), [
+            "Live at Arena", "Live at Opera House",
+        ])
+
+
+class VenueMigrationTests(TransactionTestCase):
+    before, after = [("website", "0014_newsletter")], [("website", "0015_venues")]
+
+    def migrate(self, target):
+        from django.db.migrations.executor import MigrationExecutor
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(target)
+        return executor.loader.project_state(target).apps
+
+    def test_free_text_venues_become_deduplicated_venues(self):
+        OldEvent = self.migrate(self.before).get_model("website", "Event")
+        date = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        for number, text in enumerate(("Opera House, Sydney", "opera house,  sydney", "Dome, Tokyo, Japan", "Hall")):
+            OldEvent.objects.create(title=f"Show {number}", date=date, venue=text, description="")
+
+        new = self.migrate(self.after)
+        NewEvent, NewVenue = new.get_model("website", "Event"), new.get_model("website", "Venue")
+        self.assertEqual(
+            sorted(NewVenue.objects.values_list("name", "city", "country")),
+            [("Dome", "Tokyo", "Japan"), ("Hall", "", ""), ("Opera House", "Sydney", "")],
+        )
+        self.assertEqual(NewEvent.objects.filter(venue__name="Opera House").count(), 2)
+
+    def test_events_whose_venues_differ_in_case_are_merged(self):
+        old = self.migrate(self.before)
+        OldEvent, OldInterest = old.get_model("website", "Event"), old.get_model("website", "EventInterest")
+        date = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        kept = OldEvent.objects.create(title="Show", date=date, venue="Hall, Oslo", description="")
+        duplicate = OldEvent.objects.create(title="Show", date=date, venue="hall, oslo", description="")
+        OldInterest.objects.create(event_id=duplicate.id, views=3)
+
+        new = self.migrate(self.after)
+        NewEvent, NewInterest = new.get_model("website", "Event"), new.get_model("website", "EventInterest")
+        self.assertEqual(
+            list(NewEvent.objects.values_list("id", "venue__name", "venue__city")), [(kept.id, "Hall", "Oslo")]
+        )
+        self.assertEqual(list(NewInterest.objects.values_list("event_id", "views")), [(kept.id, 3)])
+
+    def test_lookup_keys_are_filled_in(self):
+        OldVenue = self.migrate(self.after).get_model("website", "Venue")
+        OldVenue.objects.create(name="Opera  House", city="SYDNEY")
+        NewVenue = self.migrate([("website", "0016_venue_lookup_keys")]).get_model("website", "Venue")
+        self.assertEqual(list(NewVenue.objects.values_list("name_key", "city_key")), [("opera house", "sydney")])
+
+    def tearDown(self):
+        from django.db.migrations.executor import MigrationExecutor
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
@@ -0,0 +1,185 @@
+"""Token-bucket throttling for password checks.
+
+Logging in and registering hash a password with PBKDF2, which is slow on
+purpose, so a credential-stuffing burst can keep every worker busy. The
+views call :func:`check` before any form validation reaches the hasher.
+It takes one token from the client IP's bucket and, for logins, one from
+the username's bucket:
+
+* with a token available the request goes ahead at once;
+* if the bucket refills within ``MAX_DELAY`` seconds the request waits
+  for that token and then goes ahead, which evens out short bursts;
+* otherwise it is rejected, and the view answers ``429 Too Many
+  Requests`` with a ``Retry-After`` header.
+
+Each bucket holds up to ``capacity`` tokens and refills at
+``per_minute`` tokens a minute (see ``RATES``). Buckets are kept in the
+Django cache named by ``SHARED_ALIAS``, so every worker enforces the
+same limits, and in an in-process LRU when no shared cache is configured
+or it cannot be reached. Rejected and delayed attempts are counted in
+``echopulse_throttled_requests_total`` on ``/metrics/``.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from website import instrumentation
+from website.cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "SHARED_ALIAS": None,
+    "RATES": {
+        "ip": {"capacity": 20, "per_minute": 10},
+        "username": {"capacity": 5, "per_minute": 1},
+    },
+    "MAX_DELAY": 0.5,
+    "CLIENT_IP_HEADER": None,
+    "MAX_ENTRIES": 100000,
+}
+
+KEY_PREFIX = "echopulse:throttle:"
+
+
+def get_config():
+    """
+    Return the throttling configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_THROTTLING`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_THROTTLING", {})}
+
+
+def client_ip(request):
+    """
+    Return the address the request came from.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        str: ``REMOTE_ADDR``, or the last address in ``CLIENT_IP_HEADER``
+        (such as ``HTTP_X_FORWARDED_FOR``) when the site runs behind a
+        proxy that appends the client's address to that header.
+    """
+    header = get_config()["CLIENT_IP_HEADER"]
+    if header and request.META.get(header):
+        return request.META[header].split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+class TokenBuckets:
+    """
+    Token buckets stored in a shared cache, or in memory as a fallback.
+
+    Against a shared cache the read-modify-write is not atomic, so
+    concurrent requests from one client can occasionally each spend the
+    same token; the limits still hold to within the number of workers.
+    """
+
+    def __init__(self, max_entries):
+        self._local = LRUCache(max_entries)
+        self._lock = threading.Lock()
+
+    def _shared(self):
+        alias = get_config()["SHARED_ALIAS"]
+        return caches[alias] if alias else None
+
+    def take(self, key, capacity, per_minute, max_delay=0.0):
+        """
+        Take one token from the bucket ``key``.
+
+        Args:
+            key (str): The bucket's cache key.
+            capacity (int): Tokens a full bucket holds.
+            per_minute (float): Refill rate.
+            max_delay (float): Longest wait, in seconds, for a token that
+                is not yet available.
+
+        Returns:
+            tuple: ``(allowed, wait)``. If allowed, the caller must sleep
+            ``wait`` seconds before proceeding; if not, ``wait`` is the
+            time until a token is available.
+        """
+        shared = self._shared()
+        if shared is not None:
+            try:
+                return self._take(shared.get, shared.set, key, capacity, per_minute, max_delay)
+            except Exception:
+                logger.warning("Shared throttle cache unavailable; using in-memory buckets.", exc_info=True)
+        with self._lock:
+            return self._take(self._local.get, self._local.set, key, capacity, per_minute, max_delay)
+
+    def _take(self, load, store, key, capacity, per_minute, max_delay):
+        rate = per_minute / 60
+        now = time.time()
+        tokens, stamp = load(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - stamp) * rate) - 1
+        wait = -tokens / rate if tokens < 0 else 0.0
+        if wait > max_delay:
+            return False, wait
+        # A granted delay leaves the bucket in debt until the token arrives.
+        # An idle bucket is full again after ``capacity / rate`` seconds,
+        # when its entry can simply expire.
+        store(key, (tokens, now), int((capacity - tokens) / rate) + 1)
+        return True, wait
+
+    def clear(self):
+        """Empty the in-memory buckets."""
+        self._local.clear()
+
+
+buckets = TokenBuckets(get_config()["MAX_ENTRIES"])
+
+
+def _key(kind, value):
+    digest = hashlib.sha256(value.encode()).hexdigest()
+    return f"{KEY_PREFIX}{kind}:{digest}"
+
+
+def check(request, username=None):
+    """
+    Throttle a request that is about to check or set a password.
+
+    Sleeps through any granted delay before returning.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        username (str): The submitted username, for logins.
+
+    Returns:
+        float: Seconds until the client may retry if the request is
+        rejected, otherwise None.
+    """
+    config = get_config()
+    if not config["ENABLED"]:
+        return None
+    subjects = [("ip", client_ip(request))]
+    if username:
+        subjects.append(("username", username.strip().lower()))
+    delay = 0.0
+    for kind, value in subjects:
+        rate = config["RATES"][kind]
+        allowed, wait = buckets.take(_key(kind, value), rate["capacity"], rate["per_minute"], config["MAX_DELAY"])
+        if not allowed:
+            instrumentation.registry.increment(
+                "echopulse_throttled_requests_total", (("bucket", kind), ("outcome", "rejected"))
+            )
+            return wait
+        if wait:
+            instrumentation.registry.increment(
+                "echopulse_throttled_requests_total", (("bucket", kind), ("outcome", "delayed"))
+            )
+            delay = max(delay, wait)
+    if delay:
+        time.sleep(delay)
+    return None
@@ -0,0 +1,400 @@
+"""Time-decayed "trending now" rankings of albums and events.
+
+Activity is read from three append-mostly tables:
+
+* ``UserFavoriteAlbum`` and ``FanVote`` rows for albums, and
+* ``EventInterest`` rows for events: views of an event's page, counted
+  in memory by :func:`counts_interest` and written in batches by a
+  background thread, like votes (see :mod:`website.voting`).
+
+Each activity counts its weight in ``WEIGHTS``, halved every
+``HALF_LIFE`` seconds of age, for as long as it is within its window's
+``SECONDS``. The ``WINDOWS`` setting names the rankings to keep (by
+default ``24h``, ``7d`` and an undecayed ``all``) and ``HOME_WINDOW``
+picks the one shown on the home page.
+
+Scores are materialized in ``TrendingScore`` by ``manage.py
+refresh_trending``, run from cron every minute or so. They are stored
+scaled to a per-window *epoch*: an activity at time ``t`` adds
+``weight * 2 ** ((t - epoch) / HALF_LIFE)``. Decay multiplies every
+score by the same factor, so it never changes the order, and a refresh
+only has to add the activity since the previous refresh and subtract
+the activity that has just left the window. Once the scaling grows too
+large the window is rebuilt from scratch against a new epoch, as it is
+by ``refresh_trending --full``. Favorites removed since the last full
+refresh still count until the next one, so run that nightly.
+
+The home page reads the top ``HOME_LIMIT`` rows of each kind with one
+query per kind, a range scan of the ``(kind, window, -score,
+object_id)`` index that stops after ``HOME_LIMIT`` rows, and memoizes
+both for ``HOME_TIMEOUT`` seconds.
+"""
+
+import atexit
+import datetime
+import logging
+import threading
+from collections import Counter, defaultdict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from website.cache import data_versions, page_cache
+from website.models import Album, Event, EventInterest, FanVote, TrendingScore, TrendingWindow, UserFavoriteAlbum
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "WINDOWS": {
+        "24h": {"SECONDS": 24 * 3600, "HALF_LIFE": 6 * 3600},
+        "7d": {"SECONDS": 7 * 24 * 3600, "HALF_LIFE": 2 * 24 * 3600},
+        "all": {"SECONDS": None, "HALF_LIFE": None},
+    },
+    "WEIGHTS": {"favorite": 1.0, "vote": 1.0, "event_view": 0.1},
+    "HOME_WINDOW": "7d",
+    "HOME_LIMIT": 5,
+    "HOME_TIMEOUT": 60,
+    "INTEREST_FLUSH_INTERVAL": 10.0,
+    "INTEREST_MAX_PENDING": 10000,
+}
+
+HOME_KEY_PREFIX = "echopulse:trending:home:"
+
+# Rebuild a window before 2 ** exponent gets anywhere near float overflow.
+MAX_DOUBLINGS = 500
+
+BATCH_SIZE = 500
+
+# kind -> model the rankings link to.
+KINDS = {
+    "album": Album,
+    "event": Event,
+}
+
+# (kind, weight, model, object field, amount field or None for one per row)
+SIGNALS = (
+    ("album", "favorite", UserFavoriteAlbum, "album_id", None),
+    ("album", "vote", FanVote, "album_id", None),
+    ("event", "event_view", EventInterest, "event_id", "views"),
+)
+
+
+def get_config():
+    """
+    Return the trending configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_TRENDING`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_TRENDING", {})}
+
+
+def _batches(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class InterestBuffer:
+    """
+    Counts event page views in memory and writes them in batches.
+
+    A background thread writes the counts as ``EventInterest`` rows
+    every ``flush_interval`` seconds, or sooner once ``max_pending``
+    views are waiting. Counts from a failed write are kept for the next
+    one, and the buffer is flushed one last time at interpreter exit.
+
+    Attributes:
+        flush_interval (float): Seconds between background flushes.
+        max_pending (int): Pending view count that triggers an early flush.
+    """
+
+    def __init__(self, flush_interval, max_pending):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add(self, event_id):
+        """
+        Count one view of an event's page.
+
+        Args:
+            event_id (int): The event viewed.
+        """
+        with self._lock:
+            self._pending[event_id] += 1
+            size = self._pending.total()
+        self._ensure_started()
+        if size >= self.max_pending:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Write all pending views to the database.
+
+        Views of events that no longer exist are discarded. On error the
+        views are returned to the buffer and the exception is re-raised.
+
+        Returns:
+            int: The number of views written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, Counter()
+            if not pending:
+                return 0
+            try:
+                existing = Event.objects.filter(id__in=list(pending)).values_list("id", flat=True)
+                rows = [EventInterest(event_id=event_id, views=pending[event_id]) for event_id in existing]
+                EventInterest.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            except Exception:
+                with self._lock:
+                    self._pending.update(pending)
+                raise
+        return sum(row.views for row in rows)
+
+    def clear(self):
+        """Drop every pending view."""
+        with self._lock:
+            self._pending.clear()
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopping.is_set():
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="interest-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Event interest flush failed; views kept for retry.")
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        """Stop the background thread and flush whatever is still pending."""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+def _build_buffer():
+    config = get_config()
+    return InterestBuffer(config["INTEREST_FLUSH_INTERVAL"], config["INTEREST_MAX_PENDING"])
+
+
+interest = _build_buffer()
+atexit.register(interest.stop)
+
+
+def counts_interest(view):
+    """
+    Count successful ``GET`` requests to an event page as interest.
+
+    Apply it outside the caching decorators so that cache hits and
+    ``304 Not Modified`` answers are counted too. Both regular and
+    ``async def`` views can be decorated.
+
+    Args:
+        view (callable): A view taking the event's ``id``.
+
+    Returns:
+        callable: The wrapped view.
+    """
+    def record(request, id, response):
+        if request.method == "GET" and response.status_code in (200, 304):
+            interest.add(id)
+        return response
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapped(request, id, *args, **kwargs):
+            return record(request, id, await view(request, id, *args, **kwargs))
+
+        return async_wrapped
+
+    @wraps(view)
+    def wrapped(request, id, *args, **kwargs):
+        return record(request, id, view(request, id, *args, **kwargs))
+
+    return wrapped
+
+
+def _doublings(spec, moment, epoch):
+    if not spec["HALF_LIFE"]:
+        return 0.0
+    return (moment - epoch).total_seconds() / spec["HALF_LIFE"]
+
+
+def _activity(spec, weights, epoch, start, end):
+    """Sum each object's scaled activity with ``start < created_at <= end``."""
+    scores = defaultdict(float)
+    for kind, weight_name, model, field, amount in SIGNALS:
+        weight = weights[weight_name]
+        rows = model.objects.all()
+        if start is not None:
+            rows = rows.filter(created_at__gt=start)
+        if end is not None:
+            until = Q(created_at__lte=end)
+            if start is None and not spec["HALF_LIFE"]:
+                # Activity from before times were recorded counts in all-time totals.
+                until |= Q(created_at__isnull=True)
+            rows = rows.filter(until)
+        if not spec["HALF_LIFE"]:
+            # Undecayed: let the database add it up.
+            totals = rows.order_by().values(field).annotate(total=Sum(amount) if amount else Count("id"))
+            for total in totals:
+                scores[kind, total[field]] += weight * total["total"]
+            continue
+        columns = (field, "created_at", amount) if amount else (field, "created_at")
+        for object_id, created_at, *counted in rows.values_list(*columns).iterator(chunk_size=5000):
+            scaled = 2 ** _doublings(spec, created_at, epoch)
+            scores[kind, object_id] += weight * (counted[0] if counted else 1) * scaled
+    return scores
+
+
+def _titles(keys):
+    by_kind = defaultdict(list)
+    for kind, object_id in keys:
+        by_kind[kind].append(object_id)
+    titles = {}
+    for kind, object_ids in by_kind.items():
+        for batch in _batches(object_ids):
+            for object_id, title in KINDS[kind].objects.filter(id__in=batch).values_list("id", "title"):
+                titles[kind, object_id] = title
+    return titles
+
+
+def _write(name, scores, replace):
+    """Store ``scores`` for window ``name``, adding to the stored ones unless ``replace``."""
+    if replace:
+        TrendingScore.objects.filter(window=name).delete()
+    else:
+        for kind in KINDS:
+            keys = [object_id for row_kind, object_id in scores if row_kind == kind]
+            for batch in _batches(keys):
+                stored = TrendingScore.objects.filter(kind=kind, window=name, object_id__in=batch)
+                for object_id, score in stored.values_list("object_id", "score"):
+                    scores[kind, object_id] += score
+    titles = _titles(scores)
+    # Nothing left but rounding error once activity has left the window.
+    gone = [key for key, score in scores.items() if score <= 1e-9 or key not in titles]
+    for kind in KINDS:
+        for batch in _batches(object_id for row_kind, object_id in gone if row_kind == kind):
+            TrendingScore.objects.filter(kind=kind, window=name, object_id__in=batch).delete()
+    rows = [
+        TrendingScore(kind=kind, window=name, object_id=object_id, title=titles[kind, object_id], score=score)
+        for (kind, object_id), score in scores.items()
+        if score > 1e-9 and (kind, object_id) in titles
+    ]
+    TrendingScore.objects.bulk_create(
+        rows,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["kind", "window", "object_id"],
+        update_fields=["title", "score"],
+    )
+    return len(rows)
+
+
+def _refresh_window(name, spec, weights, now, full):
+    state = TrendingWindow.objects.filter(name=name).first()
+    if state is not None and not full and _doublings(spec, now, state.epoch) > MAX_DOUBLINGS:
+        full = True
+    if state is None or full:
+        with transaction.atomic():
+            start = now - datetime.timedelta(seconds=spec["SECONDS"]) if spec["SECONDS"] else None
+            written = _write(name, _activity(spec, weights, now, start, now), replace=True)
+            TrendingWindow.objects.update_or_create(name=name, defaults={"epoch": now, "refreshed_at": now})
+        return written
+
+    with transaction.atomic():
+        # Claim the interval first, so overlapping refreshes cannot count it twice.
+        if not TrendingWindow.objects.filter(name=name, refreshed_at=state.refreshed_at).update(refreshed_at=now):
+            return 0
+        scores = _activity(spec, weights, state.epoch, state.refreshed_at, now)
+        if spec["SECONDS"]:
+            window = datetime.timedelta(seconds=spec["SECONDS"])
+            expired = _activity(spec, weights, state.epoch, state.refreshed_at - window, now - window)
+            for key, score in expired.items():
+                scores[key] -= score
+        return _write(name, scores, replace=False)
+
+
+def refresh(full=False, windows=None):
+    """
+    Bring the materialized rankings up to date.
+
+    Args:
+        full (bool): Rebuild every window from scratch instead of
+            applying the activity since the last refresh.
+        windows (iterable): Names of the windows to refresh; all if None.
+
+    Returns:
+        dict: Window name to the number of rows written.
+    """
+    config = get_config()
+    now = timezone.now()
+    results = {}
+    for name, spec in config["WINDOWS"].items():
+        if windows is None or name in windows:
+            results[name] = _refresh_window(name, spec, config["WEIGHTS"], now, full)
+    transaction.on_commit(lambda: data_versions.bump(TrendingScore._meta.label))
+    return results
+
+
+def top(kind, window=None, limit=None):
+    """
+    Return the top of a ranking.
+
+    Args:
+        kind (str): ``"album"`` or ``"event"``.
+        window (str): Window name; defaults to ``HOME_WINDOW``.
+        limit (int): Number of rows; defaults to ``HOME_LIMIT``.
+
+    Returns:
+        list: ``TrendingScore`` rows, highest first.
+    """
+    config = get_config()
+    window = config["HOME_WINDOW"] if window is None else window
+    limit = config["HOME_LIMIT"] if limit is None else limit
+    return list(TrendingScore.objects.filter(kind=kind, window=window).order_by("-score", "object_id")[:limit])
+
+
+def home_rankings():
+    """
+    Return the rankings shown on the home page.
+
+    Memoized for ``HOME_TIMEOUT`` seconds, and until the next refresh
+    in this process.
+
+    Returns:
+        dict: ``{"albums": [...], "events": [...]}`` of ``TrendingScore`` rows.
+    """
+    (version,) = data_versions.get_many([TrendingScore._meta.label])
+    key = f"{HOME_KEY_PREFIX}{get_config()['HOME_WINDOW']}|{version}"
+    rankings = page_cache.get(key)
+    if rankings is None:
+        rankings = {"albums": top("album"), "events": top("event")}
+        page_cache.set(key, rankings, get_config()["HOME_TIMEOUT"])
+    return rankings
+
@@ -5,20 +5,36 @@ Each route is associated with a named view, which can be referenced
 through Django's URL reversing functions.
 """
 
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
+
+# Under ASGI the read-heavy pages are served by their async versions.
+pages = async_views if settings.ECHOPULSE_ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.echo_pulse_landing, name='landing'),
+    path('', pages.echo_pulse_landing, name='landing'),
     path('home/', views.home, name='home_authenticated'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('register/', views.register, name='register'),
-    path('albums/', views.albums, name='album_list'),
+    path('albums/', pages.album_list, name='album_list'),
+    path('albums/favorites/', views.favorite_albums, name='favorite_albums'),
     path('artist/', views.artists, name='artists'),
-    path('event/', views.events, name='events'),
+    path('event/', pages.events, name='events'),
+    path('search/', views.search, name='search'),
     path('subscribe/', views.subscribe, name='subscribe'),
     path('unsubscribe/', views.unsubscribe, name='unsubscribe'),
     path('album/<int:id>/', views.album_detail, name='album_detail'),
-    path('event/<int:id>/', views.event_detail, name='event_detail'),
-]
\ No newline at end of file
+    path('album/<int:id>/vote/', views.vote_album, name='vote_album'),
+    path('albums/votes/', views.vote_tallies, name='vote_tallies'),
+    path('event/<int:id>/', pages.event_detail, name='event_detail'),
+    path('event/live/', async_views.live_feed, name='live_feed'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('api/events/', api.event_list, name='api_event_list'),
+    path('api/events/export/', api.event_export, name='api_event_export'),
+    path('api/events/nearby/', api.event_nearby, name='api_event_nearby'),
+    path('api/albums/', api.album_list, name='api_album_list'),
+    path('api/albums/export/', api.album_export, name='api_album_export'),
+    path('api/venues/', api.venue_list, name='api_venue_list'),
+]
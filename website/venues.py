@@ -0,0 +1,221 @@
+"""Venues: parsing free-text venues, filters and nearby-event lookups.
+
+Events point at a :class:`~website.models.Venue`. Catalog imports and
+the ``0015_venues`` migration turn free text such as ``"Opera House,
+Sydney, Australia"`` into one venue per (name, city) with :func:`parse`.
+
+Listings can be narrowed to one venue (``?venue=<id>``), served by the
+``(venue, date, id)`` event index, or to one city (``?city=<name>``),
+whose venues are found through the ``(city_key, name_key)`` index first.
+Names and cities are matched on those stored keys, case-folded by
+:func:`~website.models.venue_lookup_key`: the normalization the
+``0015_venues`` migration deduplicated on.
+
+:func:`nearby_events` finds upcoming events around a point. Venues are
+first narrowed to the latitude/longitude bounding box of the search
+radius, a range scan on the ``(latitude, longitude)`` index whose cost
+grows with the venues near the point rather than with the events table,
+and then filtered by great-circle distance. Venues without coordinates
+are never nearby.
+"""
+
+import math
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from website.models import Event, Venue, venue_lookup_key
+
+
+DEFAULTS = {
+    "NEARBY_KM": 50.0,
+    "MAX_NEARBY_KM": 500.0,
+    "NEARBY_LIMIT": 20,
+}
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def get_config():
+    """
+    Return the venue configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_VENUES`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_VENUES", {})}
+
+
+def parse(text):
+    """
+    Split a free-text venue into its parts.
+
+    "Name", "Name, City" and "Name, City, Country" are recognized; with
+    more commas the extra leading parts stay in the name. Whitespace is
+    collapsed.
+
+    Args:
+        text (str): The venue as entered.
+
+    Returns:
+        tuple: ``(name, city, country)``, with blanks for missing parts.
+    """
+    parts = [" ".join(part.split()) for part in (text or "").split(",")]
+    if len(parts) == 1:
+        return parts[0], "", ""
+    if len(parts) == 2:
+        return parts[0], parts[1], ""
+    return ", ".join(parts[:-2]), parts[-2], parts[-1]
+
+
+class VenueResolver:
+    """
+    Maps venue names and cities to venue IDs, creating missing venues.
+
+    Each distinct venue costs at most one lookup per resolver, so a
+    catalog import with many events per venue stays cheap.
+    """
+
+    def __init__(self):
+        self._ids = {}
+
+    def resolve(self, name, city="", country=""):
+        """
+        Return the ID of a venue, matching name and city case-insensitively.
+
+        Args:
+            name (str): The venue's name.
+            city (str): The city, if known.
+            country (str): The country, stored on newly created venues.
+
+        Returns:
+            int: The venue's primary key.
+        """
+        key = (venue_lookup_key(name), venue_lookup_key(city))
+        if key not in self._ids:
+            venue = Venue.objects.filter(name_key=key[0], city_key=key[1]).first()
+            if venue is None:
+                venue, _created = Venue.objects.get_or_create(name=name, city=city, defaults={"country": country})
+            self._ids[key] = venue.pk
+        return self._ids[key]
+
+
+def listing_filters(request):
+    """
+    Return the event filters selected by the ``venue`` and ``city`` parameters.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        dict: Keyword arguments for ``Event.objects.filter``; empty when
+        neither parameter is given. An unusable ``venue`` matches nothing.
+    """
+    filters = {}
+    venue = request.GET.get("venue", "").strip()
+    city = request.GET.get("city", "").strip()
+    if venue:
+        filters["venue_id"] = int(venue) if venue.isdigit() else 0
+    if city:
+        filters["venue__in"] = Venue.objects.filter(city_key=venue_lookup_key(city)).values("id")
+    return filters
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """
+    Return the great-circle distance between two points.
+
+    Args:
+        lat1 (float): Latitude of the first point, in degrees.
+        lon1 (float): Longitude of the first point, in degrees.
+        lat2 (float): Latitude of the second point, in degrees.
+        lon2 (float): Longitude of the second point, in degrees.
+
+    Returns:
+        float: The distance in kilometres (haversine formula).
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlambda = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, km):
+    """
+    Return a filter for the points that may lie within ``km`` of a point.
+
+    Args:
+        lat (float): Latitude in degrees.
+        lon (float): Longitude in degrees.
+        km (float): The radius.
+
+    Returns:
+        Q: Latitude and longitude ranges for ``Venue``. Boxes crossing
+        the antimeridian are split in two; boxes reaching a pole span
+        every longitude.
+    """
+    dlat = km / KM_PER_DEGREE
+    south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    box = Q(latitude__range=(south, north))
+    widest = max(abs(south), abs(north))
+    if widest >= 90.0:
+        return box & Q(longitude__isnull=False)
+    dlon = dlat / math.cos(math.radians(widest))
+    if dlon >= 180.0:
+        return box & Q(longitude__isnull=False)
+    west, east = lon - dlon, lon + dlon
+    if west < -180.0:
+        return box & (Q(longitude__gte=west + 360.0) | Q(longitude__lte=east))
+    if east > 180.0:
+        return box & (Q(longitude__gte=west) | Q(longitude__lte=east - 360.0))
+    return box & Q(longitude__range=(west, east))
+
+
+def nearby_venues(lat, lon, km):
+    """
+    Return the venues within ``km`` of a point.
+
+    Args:
+        lat (float): Latitude in degrees.
+        lon (float): Longitude in degrees.
+        km (float): The radius.
+
+    Returns:
+        dict: Venue ID to its distance in kilometres.
+    """
+    candidates = Venue.objects.filter(bounding_box(lat, lon, km)).values_list("id", "latitude", "longitude")
+    found = {}
+    for venue_id, venue_lat, venue_lon in candidates:
+        distance = distance_km(lat, lon, venue_lat, venue_lon)
+        if distance <= km:
+            found[venue_id] = distance
+    return found
+
+
+def nearby_events(lat, lon, km=None, limit=None):
+    """
+    Return the upcoming events within ``km`` of a point, soonest first.
+
+    Args:
+        lat (float): Latitude in degrees.
+        lon (float): Longitude in degrees.
+        km (float): The radius; ``NEARBY_KM`` if omitted, at most ``MAX_NEARBY_KM``.
+        limit (int): Most events to return; ``NEARBY_LIMIT`` if omitted.
+
+    Returns:
+        list: Events, each with a ``distance_km`` attribute.
+    """
+    config = get_config()
+    km = min(config["NEARBY_KM"] if km is None else km, config["MAX_NEARBY_KM"])
+    limit = config["NEARBY_LIMIT"] if limit is None else limit
+    venues = nearby_venues(lat, lon, km)
+    if not venues:
+        return []
+    events = list(
+        Event.objects.filter(venue_id__in=list(venues), date__gte=timezone.now()).order_by("date", "id")[:limit]
+    )
+    for event in events:
+        event.distance_km = venues[event.venue_id]
+    return events
@@ -1,53 +1,168 @@
 """Views for the EchoPulse website Django application."""
 
+import hmac
+import json
+import math
+
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, QueryDict
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from .models import Event
+from website import (
+    favorites, instrumentation, newsletter, objects, recommendations, throttling, trending, venues, voting,
+)
+from website.cache import cache_page_for
+from website.conditional import conditional, event_listing_validators, object_validators, table_validators
 from website.models import Album, Event, UserFavoriteAlbum
+from website.pagination import paginate_keyset
+from website.search import search as search_catalog
 
+EVENTS_PER_PAGE = 20
+ALBUMS_PER_PAGE = 24
+SEARCH_RESULTS = 30
+MAX_TALLIES = 100
 
-def home(request):
+# Catalog sort options: (keyset keys, descending).
+ALBUM_SORTS = {
+    "popular": (("favorite_count", "id"), True),
+    "newest": (("release_date", "id"), True),
+    "oldest": (("release_date", "id"), False),
+    "title": (("title", "id"), False),
+}
+
+
+def event_listing(request):
     """
-    Render the authenticated home page.
+    Select upcoming or past events from the ``when``, ``venue`` and ``city`` query parameters.
 
     Args:
         request (HttpRequest): The HTTP request object.
 
     Returns:
-        HttpResponse: The rendered home page template.
+        tuple: ``(queryset, when, context)``, where ``when`` is ``"upcoming"``
+        or ``"past"`` and ``context`` describes the venue and city filters.
     """
-    return render(request, "home.html")
+    filters = venues.listing_filters(request)
+    query = QueryDict(mutable=True)
+    for name in ("venue", "city"):
+        if request.GET.get(name, "").strip():
+            query[name] = request.GET[name].strip()
+    context = {"venue_id": filters.get("venue_id"), "city": query.get("city", ""), "filters": query.urlencode()}
 
+    now = timezone.now()
+    if request.GET.get("when") == "past":
+        return Event.objects.filter(date__lt=now, **filters), "past", context
+    return Event.objects.filter(date__gte=now, **filters), "upcoming", context
 
-def events(request):
+
+def event_page_options(request, when):
     """
-    Render the events page with a list of all events.
+    Return the keyset pagination options for the events listing.
 
     Args:
         request (HttpRequest): The HTTP request object.
+        when (str): ``"upcoming"`` or ``"past"``.
 
     Returns:
-        HttpResponse: The rendered events page template with event data.
+        dict: Keyword arguments for :func:`~website.pagination.paginate_keyset`.
+    """
+    return {
+        "cursor": request.GET.get("cursor"),
+        "per_page": EVENTS_PER_PAGE,
+        "descending": when == "past",
+    }
+
+
+def album_listing(request):
+    """
+    Build the album catalog query from the request's filters and sort.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        tuple: ``(queryset, options, context)``: the filtered albums, the
+        keyword arguments for :func:`~website.pagination.paginate_keyset`
+        and the template context describing the active filters.
+    """
+    filters = {}
+    artist = request.GET.get("artist", "").strip()
+    genre = request.GET.get("genre", "").strip()
+    year = request.GET.get("year", "").strip()
+    if artist:
+        filters["artist"] = artist
+    if genre:
+        filters["genre"] = genre
+    if year.isdigit():
+        filters["release_date__year"] = int(year)
+
+    sort = request.GET.get("sort")
+    if sort not in ALBUM_SORTS:
+        sort = "newest"
+    keys, descending = ALBUM_SORTS[sort]
+
+    query = request.GET.copy()
+    query.pop("cursor", None)
+    options = {
+        "keys": keys,
+        "cursor": request.GET.get("cursor"),
+        "per_page": ALBUMS_PER_PAGE,
+        "descending": descending,
+    }
+    context = {
+        "sort": sort,
+        "artist": artist,
+        "genre": genre,
+        "year": year,
+        "query": query.urlencode(),
+    }
+    return Album.objects.filter(**filters), options, context
+
+
+def home(request):
+    """
+    Render the authenticated home page.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: The rendered home page template, with what is
+        trending and album recommendations for logged-in users.
     """
-    events = Event.objects.all()
-    return render(request, "events.html", {"events": events})
+    picks = recommendations.for_user(request.user) if request.user.is_authenticated else []
+    return render(request, "home.html", {"recommendations": picks, "trending": trending.home_rankings()})
 
 
-def albums(request):
+@conditional(event_listing_validators)
+@cache_page_for(Event, timeout=60)
+def events(request):
     """
-    Render the albums page.
+    Render one page of upcoming or past events.
+
+    Events are keyset-paginated on (date, id): upcoming events are listed
+    soonest first, past events most recent first. The ``when`` query
+    parameter selects ``upcoming`` (default) or ``past``, ``venue`` (an ID)
+    and ``city`` narrow the listing, and ``cursor`` selects the page.
 
     Args:
         request (HttpRequest): The HTTP request object.
 
     Returns:
-        HttpResponse: The rendered albums page template.
+        HttpResponse: The rendered events page template with event data.
     """
-    return render(request, "albums.html")
+    queryset, when, context = event_listing(request)
+    page = paginate_keyset(queryset, ("date", "id"), **event_page_options(request, when))
+    return render(request, "events.html", {"events": page, "page": page, "when": when, **context})
 
 
+@cache_page_for(Album)
 def artists(request):
     """
     Render the artists page.
@@ -61,20 +176,43 @@ def artists(request):
     return render(request, "artists.html")
 
 
+def search(request):
+    """
+    Render ranked search results across events and albums.
+
+    Args:
+        request (HttpRequest): The HTTP request object. The search text is
+            read from the ``q`` query parameter.
+
+    Returns:
+        HttpResponse: The rendered search page with matching events and albums.
+    """
+    query = request.GET.get("q", "").strip()
+    results = search_catalog(query, limit=SEARCH_RESULTS) if query else []
+    return render(request, "search.html", {"query": query, "results": results})
+
+
 def subscribe(request):
     """
-    Render the subscribe page for authenticated users.
+    Subscribe an authenticated user's email address to the newsletter.
+
+    Subscribing an address that is already subscribed changes nothing.
 
     Args:
-        request (HttpRequest): The HTTP request object.
+        request (HttpRequest): The HTTP request object. A POST should include 'email'.
 
     Returns:
-        HttpResponse: The rendered subscribe page if authenticated, otherwise the home page.
+        HttpResponse: The rendered subscribe page if authenticated, with an
+        error for an invalid address, otherwise the home page.
     """
-    if request.user.is_authenticated:
-        return render(request, "subscribe.html")
-    else:
+    if not request.user.is_authenticated:
         return render(request, "home.html")
+    if request.method == "POST":
+        try:
+            newsletter.subscribe(request.POST.get("email"))
+        except ValidationError:
+            return render(request, "subscribe.html", {"error": "Please provide a valid email."}, status=400)
+    return render(request, "subscribe.html")
 
 
 @csrf_exempt
@@ -82,28 +220,43 @@ def unsubscribe(request):
     """
     Allow users to unsubscribe from the email list.
 
+    Newsletter emails link here with a signed ``token`` naming the
+    address, and mail clients may POST to that link to unsubscribe in
+    one click (RFC 8058), which is why the view is CSRF exempt.
+    Unsubscribing an address that is not subscribed reports success
+    too, so the form does not reveal who is subscribed.
+
     Args:
-        request (HttpRequest): The HTTP request object. Should include 'email' in POST data.
+        request (HttpRequest): The HTTP request object. Should include 'email'
+            in POST data, or 'token' in the query string.
 
     Returns:
         HttpResponse: The rendered unsubscribe page with a message about the operation status.
     """
     message = ""
     message_type = ""
-    if request.method == "POST":
-        email = request.POST.get("email")
-        if email:
-            message = f"{email} has been successfully unsubscribed from EchoPulse."
-            message_type = "success"
-        else:
+    token_email = newsletter.email_from_token(request.GET["token"]) if "token" in request.GET else None
+    if "token" in request.GET and token_email is None:
+        message = "This unsubscribe link is not valid. Please enter your email below."
+        message_type = "error"
+    elif request.method == "POST":
+        email = token_email or request.POST.get("email")
+        try:
+            newsletter.unsubscribe(email)
+        except ValidationError:
             message = "Please provide a valid email."
             message_type = "error"
+        else:
+            message = f"{email} has been successfully unsubscribed from EchoPulse."
+            message_type = "success"
     return render(request, "unsubscribe.html", {
         "message": message,
-        "message_type": message_type
+        "message_type": message_type,
+        "token_email": token_email,
     })
 
 
+@conditional(object_validators(Album))
 def album_detail(request, id):
     """
     Render the album detail page.
@@ -113,11 +266,22 @@ def album_detail(request, id):
         id (int): The ID of the album.
 
     Returns:
-        HttpResponse: The rendered album detail page.
+        HttpResponse: The rendered album detail page, with the albums its
+        fans also liked.
+
+    Raises:
+        Http404: If no album exists with the given ID.
     """
-    return render(request, "album_detail.html", {"id": id})
+    album = objects.get_object_or_404(Album, id)
+    return render(request, "album_detail.html", {
+        "album": album,
+        "recommendations": recommendations.for_album(album.id),
+    })
 
 
+@trending.counts_interest
+@conditional(object_validators(Event))
+@cache_page_for(Event)
 def event_detail(request, id):
     """
     Render the event detail page.
@@ -128,11 +292,15 @@ def event_detail(request, id):
 
     Returns:
         HttpResponse: The rendered event detail page with the specific event.
+
+    Raises:
+        Http404: If no event exists with the given ID.
     """
-    event = Event.objects.get(id=id)
+    event = objects.get_object_or_404(Event, id)
     return render(request, "event_detail.html", {"event": event})
 
 
+@cache_page_for()
 def echo_pulse_landing(request):
     """
     Render the public landing page.
@@ -148,6 +316,28 @@ def echo_pulse_landing(request):
     return render(request, "landing.html")
 
 
+def throttled(request, template, form, retry_after):
+    """
+    Re-render a login or registration form for a throttled request.
+
+    The form is unbound, so rendering it never validates the submitted
+    password.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        template (str): The form's template.
+        form (Form): An unbound form.
+        retry_after (float): Seconds until the client may try again.
+
+    Returns:
+        HttpResponse: The form with a 429 status and a Retry-After header.
+    """
+    seconds = math.ceil(retry_after)
+    response = render(request, template, {'form': form, 'retry_after': seconds}, status=429)
+    response['Retry-After'] = str(seconds)
+    return response
+
+
 def login_view(request):
     """
     Handle user login.
@@ -162,6 +352,9 @@ def login_view(request):
         return redirect('home_authenticated')
 
     if request.method == 'POST':
+        retry_after = throttling.check(request, username=request.POST.get('username'))
+        if retry_after is not None:
+            return throttled(request, 'login.html', AuthenticationForm(), retry_after)
         form = AuthenticationForm(data=request.POST)
         if form.is_valid():
             user = form.get_user()
@@ -200,6 +393,9 @@ def register(request):
         return redirect('home_authenticated')
 
     if request.method == 'POST':
+        retry_after = throttling.check(request)
+        if retry_after is not None:
+            return throttled(request, 'register.html', UserCreationForm(), retry_after)
         form = UserCreationForm(request.POST)
         if form.is_valid():
             user = form.save()
@@ -210,52 +406,124 @@ def register(request):
     return render(request, 'register.html', {'form': form})
 
 
+@conditional(table_validators(Album))
+@cache_page_for(Album)
 def album_list(request):
     """
-    Render a static list of albums.
+    Render one page of the album catalog.
+
+    Albums can be filtered by ``artist``, ``genre`` and release ``year``
+    and sorted by ``sort`` (``newest``, ``oldest``, ``title`` or
+    ``popular``). Pages are keyset-paginated with ``cursor``.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: The rendered albums page with the requested page of albums.
+    """
+    queryset, options, context = album_listing(request)
+    page = paginate_keyset(queryset, **options)
+    return render(request, "albums.html", {"albums": page, "page": page, **context})
+
+
+@login_required
+@require_POST
+def favorite_albums(request):
+    """
+    Favorite and/or unfavorite several albums for the current user at once.
+
+    Accepts either a JSON body ``{"add": [ids], "remove": [ids]}`` or form
+    fields ``add`` and ``remove`` repeated once per album ID.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse or HttpResponseBadRequest: The IDs that were actually
+        added and removed, or an error for malformed input.
+    """
+    try:
+        if request.content_type == "application/json":
+            payload = json.loads(request.body or b"{}")
+            add, remove = payload.get("add", []), payload.get("remove", [])
+        else:
+            add, remove = request.POST.getlist("add"), request.POST.getlist("remove")
+        add, remove = [int(i) for i in add], [int(i) for i in remove]
+    except (AttributeError, TypeError, ValueError):
+        return HttpResponseBadRequest("Expected lists of album IDs in 'add' and 'remove'.")
+    if len(add) + len(remove) > favorites.MAX_ALBUMS_PER_REQUEST:
+        return HttpResponseBadRequest(
+            f"At most {favorites.MAX_ALBUMS_PER_REQUEST} albums can be changed per request."
+        )
+
+    return JsonResponse({
+        "added": favorites.add_favorites(request.user, add),
+        "removed": favorites.remove_favorites(request.user, remove),
+    })
+
+
+@login_required
+@require_POST
+def vote_album(request, id):
+    """
+    Cast the current user's fan vote for an album.
+
+    The vote is buffered and written to the database in the next batch
+    flush; the returned tally already includes it.
 
     Args:
         request (HttpRequest): The HTTP request object.
+        id (int): The ID of the album.
 
     Returns:
-        HttpResponse: The rendered albums page with a static list of album dictionaries.
-    """
-    albums = [
-        {
-            'title': 'Nevermind',
-            'artist': 'Nirvana',
-            'year': 1991,
-            'cover': 'https://upload.wikimedia.org/wikipedia/en/2/29/NirvanaNevermindalbumcover.jpg'
-        },
-        {
-            'title': 'OK Computer',
-            'artist': 'Radiohead',
-            'year': 1997,
-            'cover': 'https://upload.wikimedia.org/wikipedia/en/e/e4/Radiohead.okcomputer.albumart.jpg'
-        },
-        {
-            'title': 'AM',
-            'artist': 'Arctic Monkeys',
-            'year': 2013,
-            'cover': 'https://upload.wikimedia.org/wikipedia/en/1/17/Arctic_Monkeys_-_AM.png'
-        },
-        {
-            'title': 'Absolution',
-            'artist': 'Muse',
-            'year': 2003,
-            'cover': 'https://upload.wikimedia.org/wikipedia/en/e/e0/Muse_-_Absolution_cover.jpg'
-        },
-        {
-            'title': 'American Idiot',
-            'artist': 'Green Day',
-            'year': 2004,
-            'cover': 'https://upload.wikimedia.org/wikipedia/en/0/07/Green_Day_-_American_Idiot_album_cover.png'
-        },
-        {
-            'title': 'Hybrid Theory',
-            'artist': 'Linkin Park',
-            'year': 2000,
-            'cover': 'https://upload.wikimedia.org/wikipedia/en/f/fc/Linkin_Park_-_Hybrid_Theory_CD_cover.jpg'
-        }
-    ]
-    return render(request, 'albums.html', {'albums': albums})
+        JsonResponse: Whether the vote was accepted and the album's live tally.
+    """
+    tally = voting.live_tallies([id]).get(id)
+    if tally is None:
+        return JsonResponse({"error": "Album not found."}, status=404)
+    accepted = voting.cast_vote(request.user, id)
+    return JsonResponse({"accepted": accepted, "votes": tally + accepted})
+
+
+def vote_tallies(request):
+    """
+    Return live vote tallies for the albums listed in ``ids``.
+
+    Args:
+        request (HttpRequest): The HTTP request object. ``ids`` is a
+            comma-separated list of album IDs.
+
+    Returns:
+        JsonResponse or HttpResponseBadRequest: Album ID to vote count.
+    """
+    try:
+        ids = [int(i) for i in request.GET.get("ids", "").split(",") if i]
+    except ValueError:
+        return HttpResponseBadRequest("'ids' must be a comma-separated list of album IDs.")
+    if len(ids) > MAX_TALLIES:
+        return HttpResponseBadRequest(f"At most {MAX_TALLIES} albums per request.")
+    return JsonResponse({str(album_id): votes for album_id, votes in voting.live_tallies(ids).items()})
+
+
+@require_GET
+def metrics(request):
+    """
+    Expose this process's request metrics in the Prometheus text format.
+
+    Available to staff users, and to scrapers presenting the configured
+    ``METRICS_TOKEN`` as a bearer token.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse or HttpResponseForbidden: The metrics page.
+    """
+    token = instrumentation.get_config()["METRICS_TOKEN"]
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    # compare_digest only accepts ASCII strings; bytes take any header.
+    authorized = (token and hmac.compare_digest(supplied.encode(), token.encode())) or request.user.is_staff
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(instrumentation.render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
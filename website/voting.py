@@ -0,0 +1,300 @@
+"""Write-buffered fan voting.
+
+Launch nights bring bursts of votes far faster than a database (SQLite
+in particular, with its single writer) can take one row at a time. Votes
+are therefore accepted into an in-process :class:`VoteBuffer`, which
+drops repeat votes by the same user, and a background thread flushes the
+buffer every ``FLUSH_INTERVAL`` seconds (or sooner once ``MAX_PENDING``
+votes are waiting) as one batched transaction:
+
+* the new ``FanVote`` rows are inserted with ``bulk_create``, and
+* the rows the batch actually inserted are read back by their
+  ``created_at`` stamps and added to ``Album.vote_count`` with a single
+  ``UPDATE``, so votes another process wrote first are not counted
+  twice.
+
+:func:`cast_vote` refuses a vote that is already in the database. With
+``ECHOPULSE_PAGE_CACHE["SHARED_ALIAS"]`` set it also claims a marker in
+the shared cache, so a vote still pending in another process is refused
+too; without one such duplicates are only dropped when flushed.
+
+If a flush fails its votes are put back into the buffer and retried on
+the next tick, and the buffer is flushed one last time at interpreter
+exit, so a graceful shutdown never loses accepted votes.
+
+Each worker process has its own buffer. The database stays the shared
+source of truth: :func:`live_tallies` adds a process's pending votes to
+the persisted counts, and votes pending in other processes appear there
+once those processes flush.
+"""
+
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+
+from website.cache import data_versions, shared_cache
+from website.models import Album, FanVote
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "FLUSH_INTERVAL": 1.0,
+    "MAX_PENDING": 10000,
+    "BATCH_SIZE": 1000,
+    "MARKER_TIMEOUT": 300,
+}
+
+VOTE_MARKER_PREFIX = "echopulse:vote:"
+
+
+def get_config():
+    """
+    Return the voting configuration merged over the defaults.
+
+    Returns:
+        dict: The effective ``ECHOPULSE_VOTING`` settings.
+    """
+    return {**DEFAULTS, **getattr(settings, "ECHOPULSE_VOTING", {})}
+
+
+def _count_update(deltas):
+    # One UPDATE for every album in the batch, whatever its delta.
+    whens = [When(id=album_id, then=Value(delta)) for album_id, delta in deltas.items()]
+    return Greatest(F("vote_count") + Case(*whens, default=Value(0)), 0)
+
+
+class VoteBuffer:
+    """
+    Accepts votes in memory and writes them to the database in batches.
+
+    Attributes:
+        flush_interval (float): Seconds between background flushes.
+        max_pending (int): Pending vote count that triggers an early flush.
+        batch_size (int): Rows per ``bulk_create`` batch.
+    """
+
+    def __init__(self, flush_interval, max_pending, batch_size):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._pending = defaultdict(set)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add(self, user_id, album_id):
+        """
+        Accept a vote.
+
+        Args:
+            user_id (int): The voting user's ID.
+            album_id (int): The album voted for.
+
+        Returns:
+            bool: False if this user already has a pending vote for the album.
+        """
+        with self._lock:
+            voters = self._pending[album_id]
+            if user_id in voters:
+                return False
+            voters.add(user_id)
+            self._size += 1
+            size = self._size
+        self._ensure_started()
+        if size >= self.max_pending:
+            self._wake.set()
+        return True
+
+    def pending_counts(self, album_ids):
+        """
+        Return the number of pending votes for each of ``album_ids``.
+
+        Args:
+            album_ids (iterable): Album IDs.
+
+        Returns:
+            dict: Album ID to pending vote count.
+        """
+        with self._lock:
+            return {album_id: len(self._pending.get(album_id, ())) for album_id in album_ids}
+
+    def __len__(self):
+        return self._size
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(set)
+            self._size = 0
+        return pending
+
+    def _restore(self, pending):
+        with self._lock:
+            for album_id, voters in pending.items():
+                before = len(self._pending[album_id])
+                self._pending[album_id] |= voters
+                self._size += len(self._pending[album_id]) - before
+
+    def flush(self):
+        """
+        Write all pending votes to the database.
+
+        Votes for albums or users that no longer exist and repeat votes
+        already in the database are discarded. On error the votes are
+        returned to the buffer and the exception is re-raised.
+
+        Returns:
+            int: The number of votes written; a vote another process wrote
+            meanwhile is skipped, and not counted in ``vote_count``.
+        """
+        with self._flush_lock:
+            pending = self._drain()
+            if not pending:
+                return 0
+            try:
+                written = self._write(pending)
+            except Exception:
+                self._restore(pending)
+                raise
+        if written:
+            data_versions.bump(FanVote._meta.label)
+        return written
+
+    def _write(self, pending):
+        with transaction.atomic():
+            album_ids = set(Album.objects.filter(id__in=list(pending)).values_list("id", flat=True))
+            user_ids = set(
+                User.objects.filter(id__in={user for voters in pending.values() for user in voters})
+                .values_list("id", flat=True)
+            )
+            existing = set(
+                FanVote.objects.filter(album_id__in=album_ids, user_id__in=user_ids)
+                .values_list("user_id", "album_id")
+            )
+            votes = [
+                FanVote(user_id=user_id, album_id=album_id)
+                for album_id in album_ids
+                for user_id in pending[album_id]
+                if user_id in user_ids and (user_id, album_id) not in existing
+            ]
+            if not votes:
+                return 0
+            FanVote.objects.bulk_create(votes, batch_size=self.batch_size, ignore_conflicts=True)
+            # Rows skipped as conflicts (written by another process since
+            # ``existing`` was read) must not be counted again. bulk_create
+            # stamped each vote with its own created_at, so a row carrying
+            # that stamp is the one this batch inserted.
+            stamps = {(vote.user_id, vote.album_id): vote.created_at for vote in votes}
+            deltas = defaultdict(int)
+            for user_id, album_id, created_at in FanVote.objects.filter(
+                created_at__gte=min(stamps.values()),
+                album_id__in={vote.album_id for vote in votes},
+                user_id__in={vote.user_id for vote in votes},
+            ).values_list("user_id", "album_id", "created_at"):
+                if stamps.get((user_id, album_id)) == created_at:
+                    deltas[album_id] += 1
+            if deltas:
+                Album.objects.filter(id__in=list(deltas)).update(vote_count=_count_update(deltas))
+        return sum(deltas.values())
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopping.is_set():
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="vote-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Vote flush failed; %d votes kept for retry.", len(self))
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        """Stop the background thread and flush whatever is still pending."""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+def _build_buffer():
+    config = get_config()
+    return VoteBuffer(config["FLUSH_INTERVAL"], config["MAX_PENDING"], config["BATCH_SIZE"])
+
+
+buffer = _build_buffer()
+atexit.register(buffer.stop)
+
+
+def cast_vote(user, album_id):
+    """
+    Record a user's vote for an album.
+
+    Args:
+        user (User): The voting user.
+        album_id (int): The album voted for.
+
+    Returns:
+        bool: False if the user has already voted for the album.
+    """
+    if FanVote.objects.filter(user_id=user.pk, album_id=album_id).exists():
+        return False
+    cache = shared_cache()
+    marker = f"{VOTE_MARKER_PREFIX}{user.pk}:{album_id}"
+    # Another process may hold the vote in its buffer. The marker only
+    # has to outlive the pending vote; once flushed, the row is found above.
+    if cache is not None and not cache.add(marker, 1, get_config()["MARKER_TIMEOUT"]):
+        return False
+    return buffer.add(user.pk, album_id)
+
+
+def live_tallies(album_ids):
+    """
+    Return persisted plus pending vote counts.
+
+    Args:
+        album_ids (iterable): Album IDs.
+
+    Returns:
+        dict: Album ID to vote count, for the albums that exist.
+    """
+    album_ids = list(album_ids)
+    persisted = dict(Album.objects.filter(id__in=album_ids).values_list("id", "vote_count"))
+    pending = buffer.pending_counts(persisted)
+    return {album_id: count + pending[album_id] for album_id, count in persisted.items()}
+
+
+def release_user_votes(user):
+    """
+    Decrement the vote counters of every album a user voted for.
+
+    Called before the user is deleted, since the cascade removes their
+    votes without adjusting ``Album.vote_count``.
+
+    Args:
+        user (User): The user about to be deleted.
+    """
+    deltas = defaultdict(int)
+    for album_id in user.votes.values_list("album_id", flat=True):
+        deltas[album_id] -= 1
+    if deltas:
+        Album.objects.filter(id__in=list(deltas)).update(vote_count=_count_update(deltas))